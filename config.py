@@ -11,11 +11,91 @@ YANDEX_GPT_API_KEY = os.getenv("YANDEX_API_KEY")
 YANDEX_GPT_FOLDER_ID = os.getenv("YANDEX_FOLDER_ID")
 MASCOT_SVG_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "assets", "mascot-template.svg")
 
+# Режим получения обновлений: polling - для разработки, webhook - встроенный aiohttp-сервер
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # Публичный адрес бота; пусто - webhook не регистрируется в Telegram
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+UPDATES_CONCURRENCY = int(os.getenv("UPDATES_CONCURRENCY", "64"))  # Одновременно обрабатываемых обновлений
+SLOW_UPDATE_THRESHOLD = float(os.getenv("SLOW_UPDATE_THRESHOLD", "1.0"))  # Секунд обработки, после которых обновление попадает в лог
+
+# Запуск в несколько процессов (supervisor.py)
+SUPERVISOR_WORKERS = int(os.getenv("SUPERVISOR_WORKERS", str(os.cpu_count() or 1)))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # Обновлений в очереди одного воркера
+WORKER_HEARTBEAT_INTERVAL = float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "2"))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "30"))  # Секунд тишины до перезапуска воркера
+
 # Настройка параметров для модели
 GPT_MODEL_PARAMS = {
     "temperature": 0.6,
     "max_tokens": 1500
 }
+GPT_MODEL_NAME = os.getenv("GPT_MODEL_NAME", "yandexgpt-lite")
+GPT_MAX_CONCURRENCY = int(os.getenv("GPT_MAX_CONCURRENCY", "32"))  # Одновременных запросов к модели
+GPT_TIMEOUT = float(os.getenv("GPT_TIMEOUT", "60"))  # Секунд на один ответ модели
+
+# Кэш ответов модели: memory - LRU в памяти, disk - файлы, переживающие перезапуск
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache", "llm"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+ASSISTANT_CACHE_TTL = int(os.getenv("ASSISTANT_CACHE_TTL", "0"))  # Секунд; 0 - ответы ассистента не кэшируются
+
+# Память диалога с ассистентом
+ASSISTANT_PROMPT_TOKEN_BUDGET = int(os.getenv("ASSISTANT_PROMPT_TOKEN_BUDGET", "2000"))  # Токенов на запрос
+ASSISTANT_SUMMARY_MAX_TOKENS = int(os.getenv("ASSISTANT_SUMMARY_MAX_TOKENS", "300"))  # Длина заметок о разговоре
+ASSISTANT_MAX_HISTORY = int(os.getenv("ASSISTANT_MAX_HISTORY", "50"))  # Реплик, ожидающих сворачивания в заметки
+CHARS_PER_TOKEN = 3  # Оценка для русского текста
+
+# Потоковые ответы ассистента
+ASSISTANT_STREAMING = os.getenv("ASSISTANT_STREAMING", "true").lower() == "true"
+ASSISTANT_EDIT_INTERVAL = float(os.getenv("ASSISTANT_EDIT_INTERVAL", "1.0"))  # Секунд между правками сообщения
+
+# Хранилище состояний пользователей: memory - в памяти процесса, redis - общее для нескольких процессов
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+STATE_TTL = int(os.getenv("STATE_TTL", str(7 * 24 * 3600)))  # Секунд без обращений, после которых состояние забывается
+STATE_MAX_BYTES = int(os.getenv("STATE_MAX_BYTES", str(64 * 1024 * 1024)))  # Лимит памяти для хранилища memory
+
+# Пул заранее сгенерированных рецептов
+RECIPE_POOL_SIZE = int(os.getenv("RECIPE_POOL_SIZE", "10"))
+RECIPE_POOL_REFILL_INTERVAL = float(os.getenv("RECIPE_POOL_REFILL_INTERVAL", "20"))  # Секунд между генерациями
+RECIPE_POOL_HOURLY_BUDGET = int(os.getenv("RECIPE_POOL_HOURLY_BUDGET", "60"))  # Запросов к модели в час
+RECIPE_POOL_MAX_SERVES = int(os.getenv("RECIPE_POOL_MAX_SERVES", "3"))  # Скольким пользователям выдается один рецепт
+RECIPE_POOL_MAX_USERS = int(os.getenv("RECIPE_POOL_MAX_USERS", "10000"))  # Скольких пользователей пул помнит, чтобы не повторять рецепт
+
+# Настройки рейтинга игроков
+TOP_PAGE_SIZE = int(os.getenv("TOP_PAGE_SIZE", "10"))  # Игроков на странице топа
+TOP_AROUND_WINDOW = int(os.getenv("TOP_AROUND_WINDOW", "3"))  # Игроков выше и ниже в окне «рядом со мной»
+TOP_CACHE_TTL = float(os.getenv("TOP_CACHE_TTL", "30"))  # Секунд, сколько живет закэшированная первая страница топа
+RANK_RESYNC_INTERVAL = int(os.getenv("RANK_RESYNC_INTERVAL", "60"))  # Как часто сверять распределение рейтингов с БД, секунд
+
+# Запись выпавших маскотов: direct - каждый бросок своей транзакцией, buffered - пачками раз в интервал
+MASCOT_WRITE_MODE = os.getenv("MASCOT_WRITE_MODE", "direct")
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", "0.05"))  # Секунд между записями пачек
+WRITE_BUFFER_BATCH_SIZE = int(os.getenv("WRITE_BUFFER_BATCH_SIZE", "500"))  # Маскотов, при которых пачка пишется сразу
+WRITE_BUFFER_MAX_SIZE = int(os.getenv("WRITE_BUFFER_MAX_SIZE", "5000"))  # Бросков в буфере, после которых броски ждут записи
+
+# Параметры рендеринга маскотов
+RENDER_MODE = os.getenv("RENDER_MODE", "process")  # process или thread
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "16"))  # Сколько задач может ждать свободного воркера
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "10"))  # Секунд на один рендер
+# cairosvg - растеризация всего SVG, layers - наложение заранее растеризованных слоев
+MASCOT_RENDER_BACKEND = os.getenv("MASCOT_RENDER_BACKEND", "cairosvg")
+
+# Кэш отрисованных маскотов
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache", "mascots"))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RENDER_WARMUP_COUNT = int(os.getenv("RENDER_WARMUP_COUNT", "300"))  # Сколько комбинаций рендерить при старте
+
+# Лист коллекции
+COLLECTION_PAGE_SIZE = int(os.getenv("COLLECTION_PAGE_SIZE", "50"))
+COLLECTION_COLUMNS = int(os.getenv("COLLECTION_COLUMNS", "10"))
+COLLECTION_THUMBNAIL_SIZE = (114, 120)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+COLLECTION_SHEET_CACHE_MAX_BYTES = int(os.getenv("COLLECTION_SHEET_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
 def configure_logging():
     """Настройка логирования"""
@@ -3,8 +3,11 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 
 from keyboards import get_main_keyboard
-from utils.storage import psychologist_active, user_sessions
-from models.yandex_gpt import get_yandex_gpt_response
+from utils.storage import psychologist_active
+from config import ASSISTANT_STREAMING, ASSISTANT_CACHE_TTL
+from models.yandex_gpt import gpt_client, llm_cache, get_yandex_gpt_response, ERROR_RESPONSE
+from utils.streaming import answer_streamed
+from utils.conversation import start_conversation, add_message, build_prompt
 
 router = Router()
 
@@ -17,12 +20,10 @@ SYSTEM_PROMPT = """Ты - карьерный консультант.
 async def start_career_assistant(callback: CallbackQuery):
     """Активация режима карьерного ассистента"""
     user_id = callback.from_user.id
-    psychologist_active[user_id] = True
+    await psychologist_active.set(user_id, True)
 
     # Инициализируем историю диалога с системным промптом
-    user_sessions[user_id] = [
-        {"role": "system", "text": SYSTEM_PROMPT}
-    ]
+    await start_conversation(user_id, SYSTEM_PROMPT)
 
     await callback.message.answer(
         "🧭 Карьерный ассистент активирован. Задайте любой вопрос о карьере, образовании или профессиональном развитии.",
@@ -35,7 +36,7 @@ async def start_career_assistant(callback: CallbackQuery):
 async def stop_career_assistant(callback: CallbackQuery):
     """Деактивация режима карьерного ассистента"""
     user_id = callback.from_user.id
-    psychologist_active[user_id] = False
+    await psychologist_active.set(user_id, False)
 
     await callback.message.answer(
         "🧭 Карьерный ассистент отключен. Вы вернулись в главное меню.",
@@ -44,30 +45,47 @@ async def stop_career_assistant(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.message(lambda message: psychologist_active.get(message.from_user.id, False))
+async def is_assistant_active(message: Message):
+    """Фильтр: у пользователя включен режим карьерного ассистента"""
+    return await psychologist_active.get(message.from_user.id, False)
+
+
+@router.message(is_assistant_active)
 async def handle_assistant_message(message: Message):
     """Обработка сообщений в режиме карьерного ассистента"""
     user_id = message.from_user.id
 
     # Добавляем сообщение пользователя в историю
-    user_sessions[user_id].append(
-        {"role": "user", "text": message.text}
-    )
+    await add_message(user_id, "user", message.text, system_prompt=SYSTEM_PROMPT)
 
-    # Ограничиваем историю диалога
-    if len(user_sessions[user_id]) > 10:
-        # Сохраняем системный промпт, удаляем старые сообщения
-        user_sessions[user_id] = [user_sessions[user_id][0]] + user_sessions[user_id][-9:]
+    # Собираем запрос в пределах бюджета токенов: ранние реплики заменяются заметками
+    history = await build_prompt(user_id)
+    if not history:
+        # История пропала из хранилища сразу после записи: следующее сообщение начнет диалог заново
+        await message.answer(ERROR_RESPONSE)
+        return
 
     # Получаем ответ от модели
-    response = get_yandex_gpt_response(user_sessions[user_id])
+    cached = await llm_cache.get(history) if ASSISTANT_CACHE_TTL else None
+    if cached is not None:
+        response = cached
+        await message.answer(response)
+    elif ASSISTANT_STREAMING:
+        # Показываем ответ по мере генерации, правя сообщение-заглушку
+        response, completed = await answer_streamed(
+            message,
+            gpt_client.stream(history),
+            fallback=lambda: get_yandex_gpt_response(history, cache_ttl=ASSISTANT_CACHE_TTL)
+        )
+        # Прерванный поток и ошибку не кэшируем; ответ fallback кэширует сам get_yandex_gpt_response
+        if completed:
+            await llm_cache.put(history, response, ASSISTANT_CACHE_TTL)
+    else:
+        response = await get_yandex_gpt_response(history, cache_ttl=ASSISTANT_CACHE_TTL)
+        await message.answer(response)
 
     # Добавляем ответ бота в историю
-    user_sessions[user_id].append(
-        {"role": "assistant", "text": response}
-    )
-
-    await message.answer(response)
+    await add_message(user_id, "assistant", response)
 
 
 def register_handlers(dp):
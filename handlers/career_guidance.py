@@ -36,7 +36,7 @@ async def show_profession_info(callback: CallbackQuery):
     profession = callback.data.replace("profession_", "")
 
     # Сохраняем выбранную профессию
-    professions[user_id] = profession
+    await professions.set(user_id, profession)
 
     # Создаем клавиатуру с доступными лекциями
     builder = InlineKeyboardBuilder()
@@ -64,17 +64,17 @@ async def show_lecture(callback: CallbackQuery):
     user_id = callback.from_user.id
     lecture_index = int(callback.data.replace("lecture_", ""))
 
-    if user_id not in professions:
+    profession = await professions.get(user_id)
+    if profession is None:
         # Если пользователь попал сюда необычным путем
         await callback.answer("Произошла ошибка. Вернитесь в главное меню.")
         return
 
-    profession = professions[user_id]
     lecture_name = PROFESSIONS_LECTURES[profession][lecture_index]
 
     # Сохраняем текущую лекцию
-    lectures[user_id] = lecture_name
-    current_lecture[user_id] = lecture_index
+    await lectures.set(user_id, lecture_name)
+    await current_lecture.set(user_id, lecture_index)
 
     # Здесь должно быть содержание лекции
     # Для примера генерируем простой текст
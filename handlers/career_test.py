@@ -16,8 +16,8 @@ async def start_career_test(callback: CallbackQuery):
     user_id = callback.from_user.id
 
     # Инициализируем состояние теста
-    test_state[user_id] = 0
-    test_answers[user_id] = []
+    await test_state.set(user_id, 0)
+    await test_answers.set(user_id, [])
 
     await callback.message.answer(
         "🧩 <b>Профориентационный тест</b>\n\n"
@@ -28,19 +28,26 @@ async def start_career_test(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.message(lambda message: message.from_user.id in test_state and test_state[message.from_user.id] < len(
-    CAREER_TEST_QUESTIONS))
+async def is_taking_test(message: Message):
+    """Фильтр: пользователь проходит тест и еще не ответил на все вопросы"""
+    current_question = await test_state.get(message.from_user.id)
+    return current_question is not None and current_question < len(CAREER_TEST_QUESTIONS)
+
+
+@router.message(is_taking_test)
 async def process_test_answer(message: Message):
     """Обработка ответов на вопросы теста"""
     user_id = message.from_user.id
 
     # Сохраняем ответ
-    test_answers[user_id].append(message.text)
-    test_state[user_id] += 1
+    answers = await test_answers.get(user_id, [])
+    answers.append(message.text)
+    await test_answers.set(user_id, answers)
+    current_question = await test_state.get(user_id, 0) + 1
+    await test_state.set(user_id, current_question)
 
-    if test_state[user_id] < len(CAREER_TEST_QUESTIONS):
+    if current_question < len(CAREER_TEST_QUESTIONS):
         # Задаем следующий вопрос
-        current_question = test_state[user_id]
         await message.answer(
             f"<b>Вопрос {current_question + 1} из {len(CAREER_TEST_QUESTIONS)}:</b>\n"
             f"{CAREER_TEST_QUESTIONS[current_question]}"
@@ -55,7 +62,7 @@ async def analyze_test_results(message: Message, user_id: int):
     # В реальном приложении здесь будет более сложная логика анализа
     # Для примера просто объединяем все ответы и ищем ключевые слова
 
-    all_answers = " ".join(test_answers[user_id]).lower()
+    all_answers = " ".join(await test_answers.get(user_id, [])).lower()
 
     # Определяем направленность по ключевым словам (примитивный алгоритм для примера)
     result_types = []
@@ -94,8 +101,8 @@ async def analyze_test_results(message: Message, user_id: int):
     await message.answer(result_text, reply_markup=builder.as_markup())
 
     # Очищаем состояние теста
-    del test_state[user_id]
-    del test_answers[user_id]
+    await test_state.delete(user_id)
+    await test_answers.delete(user_id)
 
 
 @router.callback_query(F.data == "back_to_menu")
@@ -29,7 +29,9 @@ async def cmd_help(message: Message):
         "/help - Показать справку\n"
         "/menu - Открыть главное меню\n\n"
         "Используйте кнопки меню для навигации по функциям бота.",
-        reply_markup=get_main_keyboard(is_career_assistant_active=psychologist_active.get(message.from_user.id, False))
+        reply_markup=get_main_keyboard(
+            is_career_assistant_active=await psychologist_active.get(message.from_user.id, False)
+        )
     )
 
 @router.message(Command("menu"))
@@ -37,7 +39,9 @@ async def cmd_menu(message: Message):
     """Показать главное меню"""
     await message.answer(
         "📋 Главное меню. Выберите раздел:",
-        reply_markup=get_main_keyboard(is_career_assistant_active=psychologist_active.get(message.from_user.id, False))
+        reply_markup=get_main_keyboard(
+            is_career_assistant_active=await psychologist_active.get(message.from_user.id, False)
+        )
     )
 
 def register_handlers(dp):
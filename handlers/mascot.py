@@ -1,34 +1,41 @@
-from io import BytesIO
 import logging
-import random
-import re
+import math
+from collections import Counter
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
 from aiogram import Router, F, types
 from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-import cairosvg
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from keyboards import get_main_keyboard
-from config import MASCOT_SVG_TEMPLATE_PATH
-from models.database import get_session_ctx
+from config import COLLECTION_PAGE_SIZE, COLLECTION_COLUMNS, TOP_PAGE_SIZE, TOP_AROUND_WINDOW
+from models.ranking import top_snapshot, top_page_cursor, parse_top_page_cursor
 from models.repository import (
-    add_mascot as save_mascot,
-    get_user_mascots,
+    calculate_mascot_score,
     get_user_rating,
-    get_top_users,
-    get_user_position
+    get_top_users_page,
+    get_top_snapshot,
+    get_users_around,
+    get_user_mascots_page,
+    get_collection_version
 )
 
 # Импорт функций из скрипта generate_blin.py
-from utils.generate_blin import (
-    select_by_rarity, modify_svg_colors, replace_hat, load_svg,
-    RARITY_WEIGHTS, COLOR_PALETTES, HAT_VARIANTS, HAT_COLORS
-)
+from utils.generate_blin import roll_mascot_info, mascot_key, trait_sampler, traits_to_mascot_info
+from utils.render_pool import render_service, RenderBusyError, RenderTimeoutError
+from utils.render_cache import get_mascot_png, get_collection_sheet, gather_limited
+from utils.sprite_sheet import compose_grid
+from utils.mascot_media import prepare_mascot_photo, answer_mascot_photo
+from utils.write_buffer import store_mascots
 
 router = Router()
 
+# Сколько маскотов выбивается за один мульти-бросок и сколько столбцов в листе
+MULTI_ROLL_COUNT = 10
+MULTI_ROLL_COLUMNS = 5
+
 # Эмодзи для разных редкостей
 RARITY_EMOJI = {
     "обычный": "⚪",
@@ -40,49 +47,34 @@ RARITY_EMOJI = {
 
 
 @router.callback_query(F.data == "get_mascot")
-async def generate_mascot(callback: CallbackQuery):
+async def generate_mascot(callback: CallbackQuery, session: AsyncSession):
     """Генерация и отправка уникального маскота-блина"""
     await callback.message.answer("🎮 Генерирую уникального блина... Интересно, какая редкость выпадет?")
 
     try:
-        # Загружаем базовый SVG
-        svg_content = load_svg(MASCOT_SVG_TEMPLATE_PATH)
-
-        # Изменяем фон на оранжевый FDBA74
-        svg_content = re.sub(
-            r'<rect width="227" height="227" fill="white"/>',
-            r'<rect width="227" height="227" fill="#FDBA74"/>',
-            svg_content
-        )
-
-        # Модифицируем цвета
-        modified_svg, color_info = modify_svg_colors(svg_content)
-
-        # Выбираем редкость шапки
-        hat_rarity = select_by_rarity()
-
-        # Заменяем шапку специфическими цветами
-        modified_svg, hat_info = replace_hat(modified_svg, hat_rarity)
-
-        # Создаем инфо о маскоте
-        mascot_info = {
-            "hat": hat_info,
-            "body": color_info["body"],
-            "stroke": color_info["stroke"]
-        }
+        # Выбираем шапку, цвет тела и обводки
+        mascot_info = roll_mascot_info()
+        hat_info = mascot_info["hat"]
+        color_info = {"body": mascot_info["body"], "stroke": mascot_info["stroke"]}
+
+        # Берем file_id уже загруженной картинки или PNG из кэша;
+        # при промахе PNG рендерится в пуле, не блокируя event loop
+        key = mascot_key(mascot_info)
+        try:
+            photo = await prepare_mascot_photo(key)
+        except (RenderBusyError, RenderTimeoutError):
+            await callback.message.answer(
+                "🔥 Сейчас слишком много желающих выбить блина. Попробуйте ещё раз через пару секунд!"
+            )
+            await callback.answer()
+            return
 
-        # Сохраняем маскота в базу данных
+        # Сохраняем маскота в базу данных (в режиме buffered - пачкой вместе с другими бросками)
         user_id = callback.from_user.id
-        async with await get_session_ctx() as session:
-            mascot = await save_mascot(session, user_id, mascot_info)
-
-        # Конвертируем SVG в PNG
-        png_buffer = BytesIO()
-        cairosvg.svg2png(bytestring=modified_svg, write_to=png_buffer, scale=2.0)
-        png_buffer.seek(0)
-
-        # Создаем файл для отправки
-        input_file = BufferedInputFile(png_buffer.read(), filename="mascot.png")
+        await store_mascots(user_id, [mascot_info], session)
+        # Маскот сохранен до показа: транзакция с блокировкой строки рейтинга и соединение
+        # освобождаются до загрузки картинки в Telegram
+        await session.commit()
 
         # Создаем описание маскота
         description = (
@@ -95,15 +87,18 @@ async def generate_mascot(callback: CallbackQuery):
         # Создаем кнопки
         builder = InlineKeyboardBuilder()
         builder.add(types.InlineKeyboardButton(text="🎲 Выбить ещё блина", callback_data="get_mascot"))
+        builder.add(types.InlineKeyboardButton(text="🎰 Выбить 10 блинов", callback_data="get_mascot_x10"))
         builder.add(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
         builder.add(types.InlineKeyboardButton(text="🏆 Мой рейтинг", callback_data="my_rating"))
         builder.add(types.InlineKeyboardButton(text="🏅 Топ игроков", callback_data="top_players"))
         builder.add(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
         builder.adjust(1)
 
-        # Отправляем PNG как фото
-        await callback.message.answer_photo(
-            photo=input_file,
+        # Отправляем фото: по file_id, если картинка уже была загружена, иначе загружаем PNG
+        await answer_mascot_photo(
+            callback.message,
+            key,
+            photo,
             caption=description,
             parse_mode="HTML",
             reply_markup=builder.as_markup()
@@ -116,147 +111,439 @@ async def generate_mascot(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "my_collection")
-async def show_collection(callback: CallbackQuery):
-    """Показывает коллекцию маскотов пользователя"""
-    user_id = callback.from_user.id
-
-    async with await get_session_ctx() as session:
-        # Получаем маскотов пользователя из БД
-        mascots = await get_user_mascots(session, user_id)
+@router.callback_query(F.data == "get_mascot_x10")
+async def generate_mascot_batch(callback: CallbackQuery, session: AsyncSession):
+    """Генерация десяти маскотов одним листом и одной транзакцией"""
+    await callback.message.answer(f"🎰 Генерирую {MULTI_ROLL_COUNT} блинов... Посмотрим, кто выпадет!")
 
-        if not mascots:
+    try:
+        # Десять бросков одним вызовом сэмплера
+        mascots_info = [traits_to_mascot_info(traits) for traits in trait_sampler.roll_many(MULTI_ROLL_COUNT)]
+        keys = [mascot_key(mascot_info) for mascot_info in mascots_info]
+
+        # Картинки берем из кэша (одинаковые комбинации рендерятся один раз) и собираем в один лист
+        try:
+            unique_keys = list(dict.fromkeys(keys))
+            pngs = dict(zip(unique_keys, await gather_limited(
+                (get_mascot_png(key) for key in unique_keys), render_service.workers
+            )))
+            sheet_png = await render_service.submit(
+                compose_grid, [pngs[key] for key in keys], MULTI_ROLL_COLUMNS
+            )
+        except (RenderBusyError, RenderTimeoutError):
             await callback.message.answer(
-                "У вас пока нет ни одного блина в коллекции. Давайте выбьем первого!",
-                reply_markup=InlineKeyboardBuilder().add(
-                    types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
-                ).as_markup()
+                "🔥 Сейчас слишком много желающих выбить блина. Попробуйте ещё раз через пару секунд!"
             )
             await callback.answer()
             return
 
-        # Получаем рейтинг пользователя
-        user_rating = await get_user_rating(session, user_id)
-
-        # Статистика по коллекции
-        collection_text = (
-            f"<b>📚 Ваша коллекция блинов</b>\n\n"
-            f"Всего блинов: <b>{len(mascots)}</b>\n\n"
-            f"<b>Статистика редкости:</b>\n"
-            f"⚪ Обычных: {user_rating['common_count']}\n"
-            f"🟢 Необычных: {user_rating['uncommon_count']}\n"
-            f"🔵 Редких: {user_rating['rare_count']}\n"
-            f"🟣 Эпических: {user_rating['epic_count']}\n"
-            f"🟡 Легендарных: {user_rating['legendary_count']}\n\n"
-            f"<b>Текущий рейтинг:</b> {user_rating['rating_score']} очков\n"
-            f"<b>Позиция в общем рейтинге:</b> {user_rating['rating_position']}"
+        # Сохраняем всех маскотов одним запросом вместе с обновлением рейтинга
+        user_id = callback.from_user.id
+        await store_mascots(user_id, mascots_info, session)
+        # Сначала фиксируем броски, потом показываем лист
+        await session.commit()
+
+        # Сводка по выпавшим элементам
+        rarity_counts = Counter(
+            mascot_info[part]["rarity"] for mascot_info in mascots_info for part in ("hat", "body", "stroke")
+        )
+        best_index, best_mascot = max(
+            enumerate(mascots_info), key=lambda item: calculate_mascot_score(item[1])
+        )
+        best_hat = best_mascot["hat"]
+
+        description = f"<b>🎰 Вы выбили {MULTI_ROLL_COUNT} блинов!</b>\n\n<b>Выпавшие элементы:</b>\n"
+        for rarity in reversed(RARITY_EMOJI):
+            if rarity_counts[rarity]:
+                description += f"{RARITY_EMOJI[rarity]} {rarity.capitalize()}: {rarity_counts[rarity]}\n"
+        description += (
+            f"\n<b>🏅 Лучший блин:</b> №{best_index + 1} — {best_hat['name']} "
+            f"{RARITY_EMOJI[best_hat['rarity']]}, {calculate_mascot_score(best_mascot)} очков"
         )
 
-        # Создаем кнопки
         builder = InlineKeyboardBuilder()
-        builder.add(types.InlineKeyboardButton(text="🎲 Выбить ещё блина", callback_data="get_mascot"))
+        builder.add(types.InlineKeyboardButton(text="🎰 Выбить ещё 10 блинов", callback_data="get_mascot_x10"))
+        builder.add(types.InlineKeyboardButton(text="🎲 Выбить одного блина", callback_data="get_mascot"))
+        builder.add(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
         builder.add(types.InlineKeyboardButton(text="🏆 Мой рейтинг", callback_data="my_rating"))
-        builder.add(types.InlineKeyboardButton(text="🏅 Топ игроков", callback_data="top_players"))
         builder.add(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
         builder.adjust(1)
 
-        await callback.message.answer(collection_text, reply_markup=builder.as_markup(), parse_mode="HTML")
+        await callback.message.answer_photo(
+            photo=BufferedInputFile(sheet_png, filename="mascots.png"),
+            caption=description,
+            parse_mode="HTML",
+            reply_markup=builder.as_markup()
+        )
+
+    except Exception as e:
+        logging.error(f"Ошибка при генерации {MULTI_ROLL_COUNT} маскотов: {e}")
+        await callback.message.answer("К сожалению, произошла ошибка при генерации маскотов. Попробуйте снова.")
+
+    await callback.answer()
+
+
+@router.callback_query(F.data == "my_collection")
+async def show_collection(callback: CallbackQuery, session: AsyncSession):
+    """Показывает коллекцию маскотов пользователя"""
+    user_id = callback.from_user.id
+
+    # Рейтинг, счетчики коллекции и место в топе - одним запросом, без загрузки самих маскотов
+    user_rating = await get_user_rating(session, user_id)
+    # Соединение возвращается в пул до ответа
+    await session.commit()
+
+    if not user_rating or not user_rating["total_mascots"]:
+        await callback.message.answer(
+            "У вас пока нет ни одного блина в коллекции. Давайте выбьем первого!",
+            reply_markup=InlineKeyboardBuilder().add(
+                types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
+            ).as_markup()
+        )
+        await callback.answer()
+        return
+
+    # Статистика по коллекции
+    collection_text = (
+        f"<b>📚 Ваша коллекция блинов</b>\n\n"
+        f"Всего блинов: <b>{user_rating['total_mascots']}</b>\n\n"
+        f"<b>Статистика редкости:</b>\n"
+        f"⚪ Обычных: {user_rating['common_count']}\n"
+        f"🟢 Необычных: {user_rating['uncommon_count']}\n"
+        f"🔵 Редких: {user_rating['rare_count']}\n"
+        f"🟣 Эпических: {user_rating['epic_count']}\n"
+        f"🟡 Легендарных: {user_rating['legendary_count']}\n\n"
+        f"<b>Текущий рейтинг:</b> {user_rating['rating_score']} очков\n"
+        f"<b>Позиция в общем рейтинге:</b> {user_rating['rating_position']}"
+    )
+
+    # Создаем кнопки
+    builder = InlineKeyboardBuilder()
+    builder.add(types.InlineKeyboardButton(text="🖼 Посмотреть коллекцию", callback_data="collection_page:0:"))
+    builder.add(types.InlineKeyboardButton(text="🎲 Выбить ещё блина", callback_data="get_mascot"))
+    builder.add(types.InlineKeyboardButton(text="🏆 Мой рейтинг", callback_data="my_rating"))
+    builder.add(types.InlineKeyboardButton(text="🏅 Топ игроков", callback_data="top_players"))
+    builder.add(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
+    builder.adjust(1)
+
+    await callback.message.answer(collection_text, reply_markup=builder.as_markup(), parse_mode="HTML")
+    await callback.answer()
+
+
+# Фильтры коллекции по редкости шапки: в callback_data передается номер редкости
+COLLECTION_FILTERS = list(RARITY_EMOJI)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _encode_cursor(row) -> str:
+    """Курсор маскота для callback_data: микросекунды created_at и id"""
+    return f"{(row.created_at - EPOCH) // timedelta(microseconds=1)}:{row.id}"
+
+
+def _decode_cursor(created_at: str, mascot_id: str):
+    return EPOCH + timedelta(microseconds=int(created_at)), int(mascot_id)
+
+
+def _collection_page_data(page: int, rarity_filter: str, direction: str = "", row=None) -> str:
+    """callback_data страницы коллекции: collection_page:страница:фильтр[:a|b:курсор]"""
+    data = f"collection_page:{page}:{rarity_filter}"
+    if row is not None:
+        data += f":{direction}:{_encode_cursor(row)}"
+    return data
+
+
+@router.callback_query(F.data.startswith("collection_page:"))
+async def show_collection_page(callback: CallbackQuery, session: AsyncSession):
+    """Показывает страницу коллекции одной картинкой-листом"""
+    user_id = callback.from_user.id
+    # Страница читается от курсора соседней: a - после последнего маскота предыдущей, b - перед первым следующей
+    _, page, *rest = callback.data.split(":")
+    page = max(int(page), 0)
+    rarity_filter = rest[0] if rest else ""
+    hat_rarity = COLLECTION_FILTERS[int(rarity_filter)] if rarity_filter else None
+    after = before = None
+    if len(rest) == 4 and page > 0:
+        cursor = _decode_cursor(rest[2], rest[3])
+        if rest[1] == "a":
+            after = cursor
+        else:
+            before = cursor
+    elif page > 0:
+        page = 0
+
+    # Версия коллекции меняется с каждым новым блином, поэтому готовый лист можно брать из кэша
+    version = await get_collection_version(session, user_id)
+    rows = []
+    if version:
+        # На одного маскота больше, чтобы знать, есть ли следующая страница
+        rows = await get_user_mascots_page(
+            session, user_id, COLLECTION_PAGE_SIZE + (0 if before else 1),
+            after=after, before=before, hat_rarity=hat_rarity
+        )
+    # Соединение возвращается в пул до ответа и отрисовки листа
+    await session.commit()
+
+    if not version:
+        await callback.message.answer(
+            "У вас пока нет ни одного блина в коллекции. Давайте выбьем первого!",
+            reply_markup=InlineKeyboardBuilder().add(
+                types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
+            ).as_markup()
+        )
+        await callback.answer()
+        return
+
+    has_next = bool(before) or len(rows) > COLLECTION_PAGE_SIZE
+    rows = rows[:COLLECTION_PAGE_SIZE]
+
+    # Фильтры по редкости шапки
+    builder = InlineKeyboardBuilder()
+    filters = [types.InlineKeyboardButton(
+        text=("✅ Все" if not rarity_filter else "Все"), callback_data=_collection_page_data(0, "")
+    )]
+    for index, rarity in enumerate(COLLECTION_FILTERS):
+        selected = rarity_filter == str(index)
+        filters.append(types.InlineKeyboardButton(
+            text=f"{'✅' if selected else ''}{RARITY_EMOJI[rarity]}", callback_data=_collection_page_data(0, str(index))
+        ))
+    builder.row(*filters)
+
+    if not rows:
+        builder.row(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
+        await callback.message.answer(
+            "Блинов в шапке такой редкости у вас пока нет.", reply_markup=builder.as_markup()
+        )
+        await callback.answer()
+        return
+
+    try:
+        sheet_png = await get_collection_sheet(
+            user_id, page, version,
+            [tuple(row)[2:] for row in rows],
+            COLLECTION_COLUMNS,
+            view=rarity_filter
+        )
+    except (RenderBusyError, RenderTimeoutError):
+        await callback.message.answer(
+            "🔥 Сейчас слишком много желающих посмотреть на блинов. Попробуйте ещё раз через пару секунд!"
+        )
         await callback.answer()
+        return
+
+    first = page * COLLECTION_PAGE_SIZE + 1
+    last = first + len(rows) - 1
+    if hat_rarity is None:
+        pages = math.ceil(version / COLLECTION_PAGE_SIZE)
+        caption = (
+            f"<b>🖼 Ваша коллекция блинов</b>\n\n"
+            f"Страница {page + 1} из {pages} · блины {first}–{last} из {version}"
+        )
+    else:
+        caption = (
+            f"<b>🖼 Ваша коллекция блинов</b>\n"
+            f"Шапки: {RARITY_EMOJI[hat_rarity]} {hat_rarity}\n\n"
+            f"Страница {page + 1} · блины {first}–{last}"
+        )
+
+    # Создаем кнопки
+    navigation = []
+    if page > 0:
+        navigation.append(types.InlineKeyboardButton(
+            text="◀️ Назад", callback_data=_collection_page_data(page - 1, rarity_filter, "b", rows[0])
+        ))
+    if has_next:
+        navigation.append(types.InlineKeyboardButton(
+            text="Вперёд ▶️", callback_data=_collection_page_data(page + 1, rarity_filter, "a", rows[-1])
+        ))
+    if navigation:
+        builder.row(*navigation)
+    builder.row(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
+    builder.row(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
+
+    await callback.message.answer_photo(
+        photo=BufferedInputFile(sheet_png, filename="collection.png"),
+        caption=caption,
+        parse_mode="HTML",
+        reply_markup=builder.as_markup()
+    )
+    await callback.answer()
 
 
 @router.callback_query(F.data == "my_rating")
-async def show_my_rating(callback: CallbackQuery):
+async def show_my_rating(callback: CallbackQuery, session: AsyncSession):
     """Показывает рейтинг пользователя"""
     user_id = callback.from_user.id
 
-    async with await get_session_ctx() as session:
-        # Получаем рейтинг пользователя
-        user_rating = await get_user_rating(session, user_id)
+    # Получаем рейтинг пользователя
+    user_rating = await get_user_rating(session, user_id)
+    await session.commit()
 
-        if not user_rating:
-            await callback.message.answer(
-                "У вас пока нет рейтинга. Чтобы получить рейтинг, нужно выбить хотя бы одного блина!",
-                reply_markup=InlineKeyboardBuilder().add(
-                    types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
-                ).as_markup()
-            )
+    if not user_rating:
+        await callback.message.answer(
+            "У вас пока нет рейтинга. Чтобы получить рейтинг, нужно выбить хотя бы одного блина!",
+            reply_markup=InlineKeyboardBuilder().add(
+                types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
+            ).as_markup()
+        )
+        await callback.answer()
+        return
+
+    # Формируем сообщение о рейтинге
+    username = user_rating["username"] or f"@{user_rating['user_id']}"
+    full_name = user_rating["full_name"] or username
+
+    rating_text = (
+        f"<b>🏆 Рейтинг: {full_name}</b>\n\n"
+        f"Всего блинов: <b>{user_rating['total_mascots']}</b>\n\n"
+        f"<b>Детали коллекции:</b>\n"
+        f"⚪ Обычных элементов: {user_rating['common_count']}\n"
+        f"🟢 Необычных элементов: {user_rating['uncommon_count']}\n"
+        f"🔵 Редких элементов: {user_rating['rare_count']}\n"
+        f"🟣 Эпических элементов: {user_rating['epic_count']}\n"
+        f"🟡 Легендарных элементов: {user_rating['legendary_count']}\n\n"
+        f"<b>Ваш рейтинг:</b> {user_rating['rating_score']} очков\n"
+        f"<b>Место в топе:</b> {user_rating['rating_position']}"
+    )
+
+    # Создаем кнопки
+    builder = InlineKeyboardBuilder()
+    builder.add(types.InlineKeyboardButton(text="🎲 Выбить ещё блина", callback_data="get_mascot"))
+    builder.add(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
+    builder.add(types.InlineKeyboardButton(text="🏅 Топ игроков", callback_data="top_players"))
+    builder.add(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
+    builder.adjust(1)
+
+    await callback.message.answer(rating_text, reply_markup=builder.as_markup(), parse_mode="HTML")
+    await callback.answer()
+
+
+def _format_player(medal: str, user: Dict[str, Any]) -> str:
+    """Строка игрока в топе"""
+    username = user["username"] or f"ID: {user['user_id']}"
+    full_name = user["full_name"] or username
+    return (
+        f"{medal} <b>{full_name}</b>\n"
+        f"   ├ Рейтинг: {user['rating_score']} очков\n"
+        f"   ├ Блинов: {user['total_mascots']}\n"
+        f"   └ 🟡: {user['legendary_count']} | 🟣: {user['epic_count']} | "
+        f"🔵: {user['rare_count']} | 🟢: {user['uncommon_count']} | ⚪: {user['common_count']}\n\n"
+    )
+
+
+def _format_top_text(top_users: list, start: int = 0) -> str:
+    """Текст страницы топа, начинающейся с места start + 1"""
+    if start == 0:
+        top_text = f"<b>🏅 Топ-{TOP_PAGE_SIZE} игроков:</b>\n\n"
+    else:
+        top_text = f"<b>🏅 Топ игроков, места {start + 1}–{start + len(top_users)}:</b>\n\n"
+
+    medals = ["🥇", "🥈", "🥉"]
+    for i, user in enumerate(top_users, start):
+        medal = medals[i] if i < 3 else f"{i + 1}."
+        top_text += _format_player(medal, user)
+    return top_text
+
+
+def _top_keyboard(navigation: list, around: bool = True) -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    if navigation:
+        builder.row(*navigation)
+    if around:
+        builder.row(types.InlineKeyboardButton(text="📍 Игроки рядом со мной", callback_data="top_around"))
+    builder.row(types.InlineKeyboardButton(text="🎲 Выбить ещё блина", callback_data="get_mascot"))
+    builder.row(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
+    builder.row(types.InlineKeyboardButton(text="🏆 Мой рейтинг", callback_data="my_rating"))
+    builder.row(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
+    return builder
+
+
+@router.callback_query(F.data == "top_players")
+@router.callback_query(F.data.startswith("top_page:"))
+async def show_top_players(callback: CallbackQuery, session: AsyncSession):
+    """Показывает рейтинг топ игроков постранично"""
+    # Следующая страница начинается после последнего игрока предыдущей
+    after = None
+    start = 0
+    if callback.data.startswith("top_page:"):
+        after, start = parse_top_page_cursor(callback.data)
+
+    if after is None:
+        # Первая страница топа меняется редко: готовое сообщение берем из памяти без БД
+        rendered = top_snapshot.get_rendered()
+        if rendered is not None:
+            top_text, markup = rendered
+            await callback.message.answer(top_text, reply_markup=markup, parse_mode="HTML")
             await callback.answer()
             return
 
-        # Формируем сообщение о рейтинге
-        username = user_rating["username"] or f"@{user_rating['user_id']}"
-        full_name = user_rating["full_name"] or username
-
-        rating_text = (
-            f"<b>🏆 Рейтинг: {full_name}</b>\n\n"
-            f"Всего блинов: <b>{user_rating['total_mascots']}</b>\n\n"
-            f"<b>Детали коллекции:</b>\n"
-            f"⚪ Обычных элементов: {user_rating['common_count']}\n"
-            f"🟢 Необычных элементов: {user_rating['uncommon_count']}\n"
-            f"🔵 Редких элементов: {user_rating['rare_count']}\n"
-            f"🟣 Эпических элементов: {user_rating['epic_count']}\n"
-            f"🟡 Легендарных элементов: {user_rating['legendary_count']}\n\n"
-            f"<b>Ваш рейтинг:</b> {user_rating['rating_score']} очков\n"
-            f"<b>Место в топе:</b> {user_rating['rating_position']}"
+    # Берем на одного игрока больше, чтобы знать, есть ли следующая страница
+    if after is None:
+        rows = await get_top_snapshot(session)
+    else:
+        rows = await get_top_users_page(session, limit=TOP_PAGE_SIZE + 1, after=after)
+    await session.commit()
+
+    if not rows:
+        await callback.message.answer(
+            "Рейтинг пока пуст! Будь первым, кто выбьет блина!",
+            reply_markup=InlineKeyboardBuilder().add(
+                types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
+            ).as_markup()
         )
+        await callback.answer()
+        return
 
-        # Создаем кнопки
-        builder = InlineKeyboardBuilder()
-        builder.add(types.InlineKeyboardButton(text="🎲 Выбить ещё блина", callback_data="get_mascot"))
-        builder.add(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
-        builder.add(types.InlineKeyboardButton(text="🏅 Топ игроков", callback_data="top_players"))
-        builder.add(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
-        builder.adjust(1)
+    has_next = len(rows) > TOP_PAGE_SIZE
+    top_users = rows[:TOP_PAGE_SIZE]
 
-        await callback.message.answer(rating_text, reply_markup=builder.as_markup(), parse_mode="HTML")
-        await callback.answer()
+    # Формируем сообщение с топом
+    top_text = _format_top_text(top_users, start)
 
+    navigation = []
+    if start > 0:
+        navigation.append(types.InlineKeyboardButton(text="⏮ В начало", callback_data="top_players"))
+    if has_next:
+        navigation.append(types.InlineKeyboardButton(
+            text="Вперёд ▶️",
+            callback_data=top_page_cursor(top_users[-1], start + len(top_users))
+        ))
 
-@router.callback_query(F.data == "top_players")
-async def show_top_players(callback: CallbackQuery):
-    """Показывает рейтинг топ игроков"""
-    async with await get_session_ctx() as session:
-        # Получаем топ-10 пользователей
-        top_users = await get_top_users(session, limit=10)
+    markup = _top_keyboard(navigation).as_markup()
+    if after is None:
+        top_snapshot.set_rendered(rows, (top_text, markup))
 
-        if not top_users:
-            await callback.message.answer(
-                "Рейтинг пока пуст! Будь первым, кто выбьет блина!",
-                reply_markup=InlineKeyboardBuilder().add(
-                    types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
-                ).as_markup()
-            )
-            await callback.answer()
-            return
+    await callback.message.answer(top_text, reply_markup=markup, parse_mode="HTML")
+    await callback.answer()
 
-        # Формируем сообщение с топом
-        top_text = "<b>🏅 Топ-10 игроков:</b>\n\n"
-
-        medals = ["🥇", "🥈", "🥉"]
-        for i, user in enumerate(top_users):
-            position = i + 1
-            medal = medals[i] if i < 3 else f"{position}."
-            username = user["username"] or f"ID: {user['user_id']}"
-            full_name = user["full_name"] or username
-
-            top_text += (
-                f"{medal} <b>{full_name}</b>\n"
-                f"   ├ Рейтинг: {user['rating_score']} очков\n"
-                f"   ├ Блинов: {user['total_mascots']}\n"
-                f"   └ 🟡: {user['legendary_count']} | 🟣: {user['epic_count']} | "
-                f"🔵: {user['rare_count']} | 🟢: {user['uncommon_count']} | ⚪: {user['common_count']}\n\n"
-            )
 
-        # Создаем кнопки
-        builder = InlineKeyboardBuilder()
-        builder.add(types.InlineKeyboardButton(text="🎲 Выбить ещё блина", callback_data="get_mascot"))
-        builder.add(types.InlineKeyboardButton(text="📚 Моя коллекция", callback_data="my_collection"))
-        builder.add(types.InlineKeyboardButton(text="🏆 Мой рейтинг", callback_data="my_rating"))
-        builder.add(types.InlineKeyboardButton(text="⬅️ Назад в меню", callback_data="back_to_menu"))
-        builder.adjust(1)
+@router.callback_query(F.data == "top_around")
+async def show_players_around(callback: CallbackQuery, session: AsyncSession):
+    """Показывает игроков рядом с пользователем в общем рейтинге"""
+    user_id = callback.from_user.id
 
-        await callback.message.answer(top_text, reply_markup=builder.as_markup(), parse_mode="HTML")
+    players = await get_users_around(session, user_id, TOP_AROUND_WINDOW)
+    await session.commit()
+
+    if not players:
+        await callback.message.answer(
+            "У вас пока нет рейтинга. Чтобы получить рейтинг, нужно выбить хотя бы одного блина!",
+            reply_markup=InlineKeyboardBuilder().add(
+                types.InlineKeyboardButton(text="🎲 Выбить блина", callback_data="get_mascot")
+            ).as_markup()
+        )
         await callback.answer()
+        return
+
+    around_text = "<b>📍 Игроки рядом с вами:</b>\n\n"
+    for player in players:
+        medal = f"{player['rating_position']}."
+        if player["is_me"]:
+            medal = f"👉 {medal}"
+        around_text += _format_player(medal, player)
+
+    builder = _top_keyboard([types.InlineKeyboardButton(text="🏅 Топ игроков", callback_data="top_players")], around=False)
+    await callback.message.answer(around_text, reply_markup=builder.as_markup(), parse_mode="HTML")
+    await callback.answer()
 
 
 @router.callback_query(F.data == "back_to_menu")
@@ -1,13 +1,20 @@
+import logging
 import types
 
 from aiogram import Router, F, types
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from config import (
+    RECIPE_POOL_SIZE, RECIPE_POOL_REFILL_INTERVAL, RECIPE_POOL_HOURLY_BUDGET, RECIPE_POOL_MAX_SERVES,
+    RECIPE_POOL_MAX_USERS
+)
 from keyboards import get_main_keyboard
-from models.yandex_gpt import get_yandex_gpt_response
+from models.yandex_gpt import gpt_client, llm_cache, ERROR_RESPONSE
+from utils.recipe_pool import RecipePool
 
 router = Router()
+logger = logging.getLogger(__name__)
 
 RECIPE_PROMPT = """Ты - креативный эксперт по кулинарии с хорошим чувством юмора.
 Сгенерируй оригинальный забавный рецепт блинов с интересным названием. 
@@ -22,19 +29,47 @@ RECIPE_PROMPT = """Ты - креативный эксперт по кулина
 
 Добавь эмодзи для украшения текста. Пиши с юмором и живо!"""
 
+RECIPE_MESSAGES = [
+    {"role": "system", "text": RECIPE_PROMPT},
+    {"role": "user", "text": "Пожалуйста, придумай оригинальный забавный рецепт блинов."}
+]
+
+# Рецепты генерируются фоном, запускается в main.py
+recipe_pool = RecipePool(
+    generate=lambda: gpt_client.complete(RECIPE_MESSAGES),
+    size=RECIPE_POOL_SIZE,
+    refill_interval=RECIPE_POOL_REFILL_INTERVAL,
+    hourly_budget=RECIPE_POOL_HOURLY_BUDGET,
+    max_serves=RECIPE_POOL_MAX_SERVES,
+    max_users=RECIPE_POOL_MAX_USERS
+)
+
+
+async def _generate_live_recipe():
+    """Генерирует рецепт в обход пула, учитывая запрос в бюджете пула"""
+    recipe_pool.record_call()
+    return await gpt_client.complete(RECIPE_MESSAGES)
+
+
 @router.callback_query(F.data == "pancake_recipe")
 async def send_pancake_recipe(callback: CallbackQuery):
     """Генерация и отправка рецепта блинов"""
-    await callback.message.answer("🥞 Генерирую рецепт блинов... Подождите немного.")
+    user_id = callback.from_user.id
 
-    # Подготовка запроса к модели
-    messages = [
-        {"role": "system", "text": RECIPE_PROMPT},
-        {"role": "user", "text": "Пожалуйста, придумай оригинальный забавный рецепт блинов."}
-    ]
+    # Берем готовый рецепт из пула, к модели идем, только если пул пуст
+    recipe = recipe_pool.take(user_id)
+    if recipe is None:
+        await callback.message.answer("🥞 Генерирую рецепт блинов... Подождите немного.")
 
-    # Получаем ответ от модели
-    recipe = get_yandex_gpt_response(messages)
+        # Получаем ответ от модели; одновременные нажатия при пустом пуле ждут один и тот же запрос
+        try:
+            recipe = await llm_cache.fetch(RECIPE_MESSAGES, _generate_live_recipe)
+        except Exception as e:
+            logger.error(f"Ошибка при генерации рецепта: {e}")
+            recipe = ERROR_RESPONSE
+        else:
+            # Свежий рецепт пригодится и другим пользователям
+            recipe_pool.add(recipe, served_to=user_id)
 
     # Создаем кнопку для возврата в меню
     builder = InlineKeyboardBuilder()
@@ -1,10 +1,23 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
-from config import TELEGRAM_TOKEN, configure_logging
+from config import (
+    TELEGRAM_TOKEN, BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    UPDATES_CONCURRENCY, SLOW_UPDATE_THRESHOLD, RANK_RESYNC_INTERVAL, configure_logging
+)
 from handlers import register_all_handlers
 from models.database import init_db  # Import the init_db function
+from models.ranking import keep_score_ranking_fresh
+from middlewares import ConcurrencyLimitMiddleware, DbSessionMiddleware
+from models.yandex_gpt import gpt_client, llm_cache
+from handlers.recipe import recipe_pool
+from utils.storage import state_backend
+from utils.render_pool import render_service
+from utils.render_cache import warm_up
+from utils.write_buffer import mascot_writer, start_mascot_writer
 
 # Настройка логирования
 configure_logging()
@@ -13,23 +26,107 @@ logger = logging.getLogger(__name__)
 # Инициализация бота и диспетчера
 bot = Bot(token=TELEGRAM_TOKEN)
 dp = Dispatcher()
+# Сессия БД на обновление и учет запросов по обработчикам
+db_session_middleware = DbSessionMiddleware(SLOW_UPDATE_THRESHOLD)
+
+
+async def run_webhook():
+    """Принимает обновления встроенным aiohttp-сервером"""
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("Для режима webhook задайте WEBHOOK_SECRET")
+
+    if WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=True
+        )
+    else:
+        logger.warning("WEBHOOK_BASE_URL не задан: webhook не зарегистрирован, сервер принимает только локальные запросы")
+
+    app = web.Application()
+    # Telegram сразу получает ответ, а обновление обрабатывается фоновой задачей
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook-сервер слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+
+def setup_dispatcher():
+    """Регистрирует обработчики и middleware диспетчера"""
+    register_all_handlers(dp)
+    # Обновления обрабатываются параллельно, но не больше UPDATES_CONCURRENCY одновременно
+    dp.update.outer_middleware(ConcurrencyLimitMiddleware(UPDATES_CONCURRENCY))
+    # Внутренние middleware знают, какой обработчик выбран, и действуют на все вложенные роутеры
+    dp.message.middleware(db_session_middleware)
+    dp.callback_query.middleware(db_session_middleware)
+
+
+def start_services(warm_up_cache=True):
+    """Запускает общие сервисы процесса; возвращает фоновые задачи"""
+    # Общий клиент Яндекс ГПТ: один пул соединений на все диалоги
+    gpt_client.start()
+    recipe_pool.start()
+    start_mascot_writer()
+
+    # Запускаем пул рендеринга маскотов и в фоне прогреваем кэш картинок
+    render_service.start()
+    tasks = [asyncio.create_task(warm_up())] if warm_up_cache else []
+
+    # Распределение рейтингов для мест в топе без подсчета по таблице
+    tasks.append(asyncio.create_task(keep_score_ranking_fresh(RANK_RESYNC_INTERVAL)))
+    return tasks
+
+
+async def stop_services(tasks):
+    """Останавливает сервисы, запущенные start_services"""
+    for task in tasks:
+        task.cancel()
+    recipe_pool.shutdown()
+    render_service.shutdown()
+    # Дописываем в БД броски, накопленные в буфере
+    await mascot_writer.shutdown()
+    await state_backend.close()
+    logger.info(f"Запросы к БД по обработчикам: {db_session_middleware.get_stats()}")
+    logger.info(f"Кэш ответов модели: {llm_cache.get_stats()}")
 
 
 async def main():
     """Запуск бота"""
-    # Initialize the database first
-    logger.info("Initializing database...")
+    # Схему создают миграции (alembic upgrade head); здесь только проверяем ее версию
     await init_db()
-    logger.info("Database initialized successfully")
-
-    # Удаляем все обновления, которые могли накопиться
-    await bot.delete_webhook(drop_pending_updates=True)
 
     # Регистрация всех обработчиков
-    register_all_handlers(dp)
+    setup_dispatcher()
+    service_tasks = start_services()
+
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook()
+        else:
+            # Удаляем все обновления, которые могли накопиться
+            await bot.delete_webhook(drop_pending_updates=True)
 
-    # Запускаем бота в режиме long polling
-    await dp.start_polling(bot)
+            # Запускаем бота в режиме long polling
+            await dp.start_polling(bot)
+    finally:
+        await stop_services(service_tasks)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+from middlewares.concurrency import ConcurrencyLimitMiddleware
+from middlewares.db_session import DbSessionMiddleware
+
+__all__ = ["ConcurrencyLimitMiddleware", "DbSessionMiddleware"]
@@ -0,0 +1,39 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Ограничивает число одновременно обрабатываемых обновлений; остальные ждут своей очереди"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._waiting = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        self._waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        wait_time = time.perf_counter() - queued_at
+        if wait_time > 1:
+            logger.warning(f"Обновление ждало обработки {wait_time:.1f} с, в очереди еще {self._waiting}")
+        try:
+            return await handler(event, data)
+        finally:
+            self._semaphore.release()
@@ -0,0 +1,128 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+
+from models.database import engine, async_session
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Запросы к БД, выполненные при обработке одного обновления"""
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# Статистика обновления, которое обрабатывает текущая задача; видна и в сессиях, открытых мимо middleware
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _finish_query(conn) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_query(conn)
+
+
+def _handle_error(exception_context):
+    # После упавшего запроса after_cursor_execute не вызывается: время начала снимаем здесь
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        _finish_query(conn)
+
+
+def install_query_timing(sync_engine) -> None:
+    """Подключает к движку учет числа и времени запросов"""
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Одна сессия БД на обновление и учет запросов к БД по обработчикам.
+
+    Сессия создается, только если обработчик принимает аргумент session, и фиксируется
+    (при ошибке откатывается) после него; соединение из пула она берет при первом запросе.
+    Обработчик сам фиксирует сессию, закончив работу с БД, чтобы до обращений к Telegram
+    вернуть соединение в пул и снять блокировки; тогда фиксация после него ничего не делает.
+    Обновления дольше slow_threshold секунд пишутся в лог с числом запросов и временем в БД.
+    """
+
+    def __init__(self, slow_threshold=1.0, session_factory=async_session):
+        self.slow_threshold = slow_threshold
+        self.session_factory = session_factory
+        install_query_timing(engine.sync_engine)
+
+        # Метрики по обработчикам: [обновлений, запросов, время в БД, время обработки]
+        self._handlers: Dict[str, list] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else type(event).__name__
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            if handler_object is None or "session" not in handler_object.params:
+                return await handler(event, data)
+
+            async with self.session_factory() as session:
+                data["session"] = session
+                try:
+                    result = await handler(event, data)
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+                return result
+        finally:
+            _current_stats.reset(token)
+            self._record(name, stats, time.perf_counter() - started)
+
+    def _record(self, name: str, stats: QueryStats, elapsed: float) -> None:
+        totals = self._handlers.setdefault(name, [0, 0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += stats.queries
+        totals[2] += stats.db_time
+        totals[3] += elapsed
+        if elapsed > self.slow_threshold:
+            logger.warning(
+                f"Медленное обновление: {name} {elapsed:.2f} с, "
+                f"запросов к БД {stats.queries} за {stats.db_time:.2f} с"
+            )
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Средние на одно обновление по каждому обработчику"""
+        return {
+            name: {
+                "updates": updates,
+                "queries": round(queries / updates, 2),
+                "db_ms": round(db_time / updates * 1000, 1),
+                "total_ms": round(total_time / updates * 1000, 1),
+            }
+            for name, (updates, queries, db_time, total_time) in self._handlers.items()
+        }
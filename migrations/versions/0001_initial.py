@@ -0,0 +1,93 @@
+"""Initial schema: users, mascots, mascot_images, user_ratings
+
+Таблицы создаются, только если их еще нет: БД, которые раньше создавал init_db через
+create_all, переходят на миграции обычным alembic upgrade head.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("first_name", sa.String(), nullable=True),
+        sa.Column("last_name", sa.String(), nullable=True),
+        sa.Column("registration_date", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("user_id"),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "mascots",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.user_id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("hat_name", sa.String(), nullable=False),
+        sa.Column("hat_rarity", sa.String(), nullable=False),
+        sa.Column("hat_color", sa.String(), nullable=False),
+        sa.Column("body_rarity", sa.String(), nullable=False),
+        sa.Column("body_color", sa.String(), nullable=False),
+        sa.Column("stroke_rarity", sa.String(), nullable=False),
+        sa.Column("stroke_color", sa.String(), nullable=False),
+        sa.Column("rarity_index", sa.Float(), nullable=False),
+        sa.Column("mascot_data", sa.JSON(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "mascot_images",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("render_version", sa.String(), nullable=False),
+        sa.Column("hat_name", sa.String(), nullable=False),
+        sa.Column("hat_color", sa.String(), nullable=False),
+        sa.Column("body_color", sa.String(), nullable=False),
+        sa.Column("stroke_color", sa.String(), nullable=False),
+        sa.Column("file_id", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint(
+            "render_version", "hat_name", "hat_color", "body_color", "stroke_color",
+            name="uq_mascot_images_key"
+        ),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "user_ratings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.user_id"), nullable=True),
+        sa.Column("total_mascots", sa.Integer(), nullable=True),
+        sa.Column("legendary_count", sa.Integer(), nullable=True),
+        sa.Column("epic_count", sa.Integer(), nullable=True),
+        sa.Column("rare_count", sa.Integer(), nullable=True),
+        sa.Column("uncommon_count", sa.Integer(), nullable=True),
+        sa.Column("common_count", sa.Integer(), nullable=True),
+        sa.Column("rating_score", sa.Float(), nullable=True),
+        sa.Column("max_rarity_score", sa.Float(), nullable=True),
+        sa.Column("rarest_mascot_id", sa.Integer(), sa.ForeignKey("mascots.id"), nullable=True),
+        sa.Column("last_updated", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("user_id"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_ratings")
+    op.drop_table("mascot_images")
+    op.drop_table("mascots")
+    op.drop_table("users")
@@ -0,0 +1,82 @@
+"""Indexes for the leaderboard and collection queries
+
+Индексы строятся CREATE INDEX CONCURRENTLY вне транзакции миграции, чтобы не блокировать
+запись в таблицы на работающем боте; уже созданные (например, прежним create_all) пропускаются.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Столбцы картинки маскота: страницы коллекции читаются только из индекса
+MASCOT_KEY_COLUMNS = ["hat_name", "hat_color", "body_color", "stroke_color"]
+
+INDEXES = (
+    "ix_user_ratings_rating_score_user_id",
+    "ix_mascots_user_id_created_at_id",
+    "ix_mascots_user_id_hat_rarity_created_at_id",
+)
+
+
+def _drop_if_invalid(name: str) -> None:
+    """Удаляет индекс, оставшийся невалидным после прерванного CREATE INDEX CONCURRENTLY"""
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+            "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+        ),
+        {"name": name}
+    ).scalar()
+    if invalid:
+        op.execute(sa.text(f"DROP INDEX CONCURRENTLY {name}"))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            _drop_if_invalid(name)
+
+        # Место в рейтинге, страницы топа и игроки рядом: ORDER BY rating_score DESC, user_id
+        op.create_index(
+            "ix_user_ratings_rating_score_user_id", "user_ratings",
+            [sa.text("rating_score DESC"), "user_id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        # Коллекция пользователя по курсору (created_at, id); заодно поиск маскотов по user_id
+        op.create_index(
+            "ix_mascots_user_id_created_at_id", "mascots",
+            ["user_id", "created_at", "id"],
+            postgresql_include=MASCOT_KEY_COLUMNS + ["hat_rarity"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        # Коллекция с фильтром по редкости шапки
+        op.create_index(
+            "ix_mascots_user_id_hat_rarity_created_at_id", "mascots",
+            ["user_id", "hat_rarity", "created_at", "id"],
+            postgresql_include=MASCOT_KEY_COLUMNS,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table, name in (
+            ("mascots", "ix_mascots_user_id_hat_rarity_created_at_id"),
+            ("mascots", "ix_mascots_user_id_created_at_id"),
+            ("user_ratings", "ix_user_ratings_rating_score_user_id"),
+        ):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
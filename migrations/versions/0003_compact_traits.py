@@ -0,0 +1,123 @@
+"""Compact mascot traits: smallint codes instead of strings and JSON
+
+Шапка, цвета и редкости маскота хранятся номерами в реестре models.traits, копия тех же данных
+в mascot_data и всегда нулевой rarity_index удаляются. Все столбцы меняются одним ALTER TABLE:
+таблица переписывается один раз под исключительной блокировкой, индексы перестраиваются вместе
+с ней, поэтому миграцию запускают, пока бот остановлен. Размер mascots до и после пишется в лог.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 14:00:00
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.migration")
+
+# Реестр характеристик на момент миграции: код - номер значения в списке
+RARITIES = [
+    "обычный", "необычный", "редкий", "эпический", "легендарный"
+]
+
+HATS = [
+    "Классическая шапка", "Простая кепка", "Шляпа с полями", "Шапка с помпоном", "Ковбойская шляпа",
+    "Цилиндр", "Корона", "Шлем рыцаря", "Волшебная шляпа", "Космический шлем"
+]
+
+HAT_COLORS = [
+    "#FFFFFF", "#F5F5F5", "#EFEFEF", "#FFD6D6", "#D6EEFF", "#EEFFD6", "#FFB6C1", "#AFEEEE", "#FFDAB9",
+    "#FFC0CB", "#87CEFA", "#FFFACD", "#FFFF00", "#FF00FF", "#00FFFF", "#E8E8E8", "#D1D1D1", "#C0C0C0",
+    "#AED6F1", "#F5CBA7", "#D2B4DE", "#F9E79F", "#ABEBC6", "#F5B7B1", "#BB8FCE", "#85C1E9", "#F8C471",
+    "#F1948A", "#7FB3D5", "#73C6B6", "#F5F5DC", "#E0E0E0", "#D0D0D0", "#FAD7A0", "#82E0AA", "#D7BDE2",
+    "#A9CCE3", "#F5B041", "#A3E4D7", "#7DCEA0", "#F4D03F", "#EC7063", "#3498DB", "#FAF0E6", "#F0E68C",
+    "#E6E6FA", "#FADBD8", "#D6EAF8", "#D4EFDF", "#A9DFBF", "#D2B48C", "#BC8F8F", "#F5DEB3", "#CD853F",
+    "#DEB887", "#B87333", "#8B4513", "#A0522D", "#800000", "#8B0000", "#A52A2A", "#FFD700", "#DAA520",
+    "#B8860B", "#000000", "#1A1A1A", "#2C2C2C", "#191970", "#00008B", "#0000CD", "#4B0082", "#800080",
+    "#8B008B", "#483D8B", "#4169E1", "#0000FF", "#00CED1", "#5F9EA0", "#FFC125", "#FFA500", "#FFDF00",
+    "#FFCC00", "#D4AF37", "#CFB53B", "#FAFAD2", "#EEE8AA", "#E6BE8A", "#CD7F32", "#996515", "#708090",
+    "#778899", "#A9A9A9", "#B0C4DE", "#B0E0E6", "#ADD8E6", "#4682B4", "#7B68EE", "#00BFFF", "#6A5ACD",
+    "#663399", "#9370DB", "#8A2BE2", "#9932CC", "#BA55D3", "#DA70D6", "#9400D3", "#6A0DAD", "#1E90FF"
+]
+
+BODY_COLORS = [
+    "#E39D3A", "#5C9EAD", "#8FB339", "#7C73E6", "#FF6B6B", "#4FB286", "#D972FF", "#FF4500", "#32CD32",
+    "#9370DB", "#40E0D0", "#00BFFF", "#FF69B4", "#FFD700", "#8A2BE2", "#FF00FF", "#1E90FF", "#00FF7F",
+    "#FF1493"
+]
+
+STROKE_COLORS = [
+    "#8A5C1E", "#2C5D73", "#5A7324", "#4A3D9D", "#B54B4B", "#2A735A", "#8A3DAD", "#B32D00", "#228B22",
+    "#663399", "#20B2AA", "#0080FF", "#C71585", "#DAA520", "#551A8B", "#8B008B", "#0000CD", "#006400",
+    "#8B0000"
+]
+
+# Столбцы характеристик и значения, которые кодирует их номер; hat_name после миграции называется hat
+TRAIT_COLUMNS = (
+    ("hat_name", HATS),
+    ("hat_rarity", RARITIES),
+    ("hat_color", HAT_COLORS),
+    ("body_rarity", RARITIES),
+    ("body_color", BODY_COLORS),
+    ("stroke_rarity", RARITIES),
+    ("stroke_color", STROKE_COLORS),
+)
+
+
+def _array(values) -> str:
+    return "ARRAY[" + ", ".join("'" + value.replace("'", "''") + "'" for value in values) + "]::varchar[]"
+
+
+def _report_size(stage: str) -> None:
+    heap, indexes, total = op.get_bind().execute(sa.text(
+        "SELECT pg_size_pretty(pg_relation_size('mascots')), pg_size_pretty(pg_indexes_size('mascots')), "
+        "pg_size_pretty(pg_total_relation_size('mascots'))"
+    )).one()
+    logger.info(f"Размер mascots {stage}: таблица {heap}, индексы {indexes}, всего {total}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _report_size("до")
+    # Значение не из реестра дает NULL, и ALTER TABLE падает на NOT NULL, ничего не изменив
+    op.execute(
+        "ALTER TABLE mascots "
+        + ", ".join(
+            f"ALTER COLUMN {column} TYPE smallint USING array_position({_array(values)}, {column}) - 1"
+            for column, values in TRAIT_COLUMNS
+        )
+        + ", DROP COLUMN rarity_index, DROP COLUMN mascot_data"
+    )
+    op.alter_column("mascots", "hat_name", new_column_name="hat")
+    _report_size("после")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column("mascots", "hat", new_column_name="hat_name")
+    op.execute(
+        "ALTER TABLE mascots "
+        + ", ".join(
+            f"ALTER COLUMN {column} TYPE varchar USING ({_array(values)})[{column} + 1]"
+            for column, values in TRAIT_COLUMNS
+        )
+        + ", ADD COLUMN rarity_index float NOT NULL DEFAULT 0, ADD COLUMN mascot_data json"
+    )
+    op.alter_column("mascots", "rarity_index", server_default=None)
+    op.execute(
+        "UPDATE mascots SET mascot_data = json_build_object("
+        "'hat', json_build_object('name', hat_name, 'rarity', hat_rarity, 'color', hat_color), "
+        "'body', json_build_object('color', body_color, 'rarity', body_rarity), "
+        "'stroke', json_build_object('color', stroke_color, 'rarity', stroke_rarity))"
+    )
+    op.alter_column("mascots", "mascot_data", nullable=False)
@@ -1,10 +1,14 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, JSON, Float
+from sqlalchemy import (
+    Column, Integer, SmallInteger, String, DateTime, ForeignKey, Boolean, Float, UniqueConstraint, Index
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from sqlalchemy import BigInteger  # Add this import
 
+from .traits import TRAIT_COLUMNS, decode_mascot_info
+
 Base = declarative_base()
 
 
@@ -29,21 +33,57 @@ class Mascot(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(BigInteger, ForeignKey("users.user_id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Характеристики - коды из реестра models.traits
+    hat = Column(SmallInteger, nullable=False)
+    hat_rarity = Column(SmallInteger, nullable=False)
+    hat_color = Column(SmallInteger, nullable=False)
+    body_rarity = Column(SmallInteger, nullable=False)
+    body_color = Column(SmallInteger, nullable=False)
+    stroke_rarity = Column(SmallInteger, nullable=False)
+    stroke_color = Column(SmallInteger, nullable=False)
+
+    # Отношения
+    user = relationship("User", back_populates="mascots")
+
+    __table_args__ = (
+        # Страницы коллекции по курсору (created_at, id); в индексе есть все, из чего собирается картинка
+        Index(
+            "ix_mascots_user_id_created_at_id", user_id, created_at, id,
+            postgresql_include=["hat", "hat_rarity", "hat_color", "body_color", "stroke_color"]
+        ),
+        # То же с фильтром по редкости шапки
+        Index(
+            "ix_mascots_user_id_hat_rarity_created_at_id", user_id, hat_rarity, created_at, id,
+            postgresql_include=["hat", "hat_color", "body_color", "stroke_color"]
+        ),
+    )
+
+    @property
+    def mascot_info(self):
+        """Описание маскота, раскодированное из кодов характеристик при обращении"""
+        return decode_mascot_info([getattr(self, column) for column in TRAIT_COLUMNS])
+
+
+class MascotImage(Base):
+    __tablename__ = "mascot_images"
+
+    id = Column(Integer, primary_key=True)
+    # Версия рендера: при смене шаблона или масштаба старые file_id не используются
+    render_version = Column(String, nullable=False)
     hat_name = Column(String, nullable=False)
-    hat_rarity = Column(String, nullable=False)
     hat_color = Column(String, nullable=False)
-    body_rarity = Column(String, nullable=False)
     body_color = Column(String, nullable=False)
-    stroke_rarity = Column(String, nullable=False)
     stroke_color = Column(String, nullable=False)
+    # file_id картинки, уже загруженной в Telegram
+    file_id = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
-    # Индекс редкости - числовое значение для сортировки
-    rarity_index = Column(Float, nullable=False)
-    # Полная информация о маскоте в JSON
-    mascot_data = Column(JSON, nullable=False)
-
-    # Отношения
-    user = relationship("User", back_populates="mascots")
+    __table_args__ = (
+        UniqueConstraint(
+            "render_version", "hat_name", "hat_color", "body_color", "stroke_color",
+            name="uq_mascot_images_key"
+        ),
+    )
 
 
 class UserRating(Base):
@@ -67,4 +107,9 @@ class UserRating(Base):
 
     # Отношения
     user = relationship("User", back_populates="rating")
-    rarest_mascot = relationship("Mascot", foreign_keys=[rarest_mascot_id])
\ No newline at end of file
+    rarest_mascot = relationship("Mascot", foreign_keys=[rarest_mascot_id])
+
+    __table_args__ = (
+        # Место в рейтинге и страницы топа: ORDER BY rating_score DESC, user_id
+        Index("ix_user_ratings_rating_score_user_id", rating_score.desc(), user_id),
+    )
\ No newline at end of file
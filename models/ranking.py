@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+
+from config import TOP_PAGE_SIZE, TOP_CACHE_TTL
+from .models import UserRating
+from .database import get_session_ctx
+
+logger = logging.getLogger(__name__)
+
+# Рейтинг - скор самого редкого маскота: сумма трех весов редкости, не больше 3 * 100
+MAX_RATING_SCORE = 300
+
+
+class FenwickTree:
+    """Дерево Фенвика: добавление и сумма на префиксе за O(log n)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        index += 1
+        while index <= self.size:
+            self._tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, index: int) -> int:
+        """Сумма элементов с 0 по index включительно"""
+        index = min(index, self.size - 1) + 1
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+
+class ScoreRanking:
+    """Количество игроков по каждому значению рейтинга; место игрока - 1 + число игроков с большим рейтингом.
+
+    generation растет с каждым изменением рейтингов: распределение, прочитанное из БД, пока
+    шли изменения, может их не содержать и не заменяет текущее.
+    """
+
+    def __init__(self, max_score: int = MAX_RATING_SCORE):
+        self.max_score = max_score
+        self._tree = FenwickTree(max_score + 1)
+        self._total = 0
+        self.loaded = False
+        self.generation = 0
+
+    def _bucket(self, score: float) -> int:
+        return min(max(int(round(score)), 0), self.max_score)
+
+    def load(self, histogram: Dict[float, int], generation: Optional[int] = None) -> bool:
+        """Заменяет распределение рейтингов: {рейтинг: число игроков}.
+
+        С generation заменяет, только если с начала чтения histogram рейтинги не менялись;
+        возвращает, заменено ли распределение.
+        """
+        if generation is not None and generation != self.generation:
+            return False
+        tree = FenwickTree(self.max_score + 1)
+        total = 0
+        for score, count in histogram.items():
+            tree.add(self._bucket(score), count)
+            total += count
+        self._tree, self._total = tree, total
+        self.loaded = True
+        return True
+
+    def move(self, old_score: Optional[float], new_score: float) -> None:
+        """Учитывает изменение рейтинга игрока; old_score=None - новый игрок"""
+        self.generation += 1
+        if not self.loaded:
+            return
+        if old_score is None:
+            self._total += 1
+        elif self._bucket(old_score) == self._bucket(new_score):
+            return
+        else:
+            self._tree.add(self._bucket(old_score), -1)
+        self._tree.add(self._bucket(new_score), 1)
+
+    def invalidate(self) -> None:
+        """Помечает распределение неточным: до следующей загрузки места считаются запросом к БД"""
+        self.generation += 1
+        self.loaded = False
+
+    def rank(self, score: float) -> int:
+        """Место игрока с таким рейтингом"""
+        return self._total - self._tree.prefix_sum(self._bucket(score)) + 1
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+
+class TopSnapshot:
+    """Первая страница топа в памяти процесса вместе с готовым сообщением.
+
+    Сбрасывается, когда новый рейтинг может попасть в топ; ttl - страховка от изменений,
+    которые снимок не видит (другие процессы бота, счетчики блинов у игроков топа).
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.generation = 0
+        self._users: Optional[List[Dict[str, Any]]] = None
+        self._rendered: Any = None
+        self._expires_at = 0.0
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _fresh(self) -> bool:
+        return self._users is not None and time.monotonic() < self._expires_at
+
+    def get(self) -> Optional[List[Dict[str, Any]]]:
+        """Игроки топа или None, если снимок устарел"""
+        if not self._fresh():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._users
+
+    def put(self, users: List[Dict[str, Any]], generation: int) -> None:
+        """Сохраняет снимок, если с начала его чтения из БД (generation) топ не сбрасывался"""
+        if generation != self.generation:
+            return
+        self._users = users
+        self._rendered = None
+        self._expires_at = time.monotonic() + self.ttl
+
+    def get_rendered(self) -> Any:
+        """Сообщение, построенное по текущему снимку, или None"""
+        if not self._fresh() or self._rendered is None:
+            return None
+        self.hits += 1
+        return self._rendered
+
+    def set_rendered(self, users: List[Dict[str, Any]], rendered: Any) -> None:
+        """Запоминает сообщение, если оно построено по текущему снимку"""
+        if users is self._users:
+            self._rendered = rendered
+
+    def invalidate(self) -> None:
+        self.generation += 1
+        self._users = None
+        self._rendered = None
+        self.invalidations += 1
+
+    def offer(self, score: float) -> None:
+        """Сбрасывает снимок, если игрок с таким рейтингом может оказаться в топе"""
+        if self._users is None:
+            return
+        if len(self._users) < self.size or score >= self._users[-1]["rating_score"]:
+            self.invalidate()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+def top_page_cursor(user: Dict[str, Any], start: int) -> str:
+    """callback_data следующей страницы топа: top_page:рейтинг:id:место.
+
+    Рейтинг записан через repr, чтобы при разборе получилось то же число, что в БД:
+    иначе страница начнется не с того игрока.
+    """
+    return f"top_page:{float(user['rating_score'])!r}:{user['user_id']}:{start}"
+
+
+def parse_top_page_cursor(data: str) -> Tuple[Tuple[float, int], int]:
+    """Разбирает top_page_cursor: ((рейтинг, id последнего игрока), место первого игрока страницы)"""
+    _, score, last_user_id, start = data.split(":")
+    return (float(score), int(last_user_id)), int(start)
+
+
+# Распределение рейтингов в памяти процесса
+score_ranking = ScoreRanking()
+
+# Первая страница топа; на одного игрока больше, чтобы знать, есть ли следующая страница
+top_snapshot = TopSnapshot(TOP_PAGE_SIZE + 1, TOP_CACHE_TTL)
+
+
+async def get_score_histogram(session) -> Dict[float, int]:
+    """Gets the number of players for each rating score"""
+    result = await session.execute(
+        select(UserRating.rating_score, func.count()).group_by(UserRating.rating_score)
+    )
+    return {score or 0.0: count for score, count in result}
+
+
+# Сколько раз перечитывать распределение, если рейтинги менялись во время чтения
+REFRESH_ATTEMPTS = 3
+
+
+async def refresh_score_ranking() -> bool:
+    """Перечитывает распределение рейтингов из БД; False, если его не удалось прочитать без гонки с бросками"""
+    for _ in range(REFRESH_ATTEMPTS):
+        generation = score_ranking.generation
+        async with await get_session_ctx() as session:
+            histogram = await get_score_histogram(session)
+        if score_ranking.load(histogram, generation):
+            return True
+    return False
+
+
+async def keep_score_ranking_fresh(interval: float) -> None:
+    """Загружает распределение рейтингов и периодически сверяет его с БД.
+
+    Изменения из других процессов бота попадают в память процесса при очередной сверке.
+    """
+    while True:
+        try:
+            if await refresh_score_ranking():
+                logger.info(f"Распределение рейтингов загружено: игроков {score_ranking.total}")
+            else:
+                # Текущее распределение остается (или места считаются по БД) до следующей сверки
+                logger.warning("Рейтинги менялись во время каждого чтения распределения, оно не обновлено")
+        except Exception as e:
+            logger.error(f"Не удалось загрузить распределение рейтингов: {e}")
+        await asyncio.sleep(interval)
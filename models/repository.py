@@ -1,11 +1,14 @@
-from sqlalchemy import select, func, desc, update, insert
+from sqlalchemy import event, select, func, desc, update, insert, delete, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import Session, selectinload, aliased
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
-from .models import User, Mascot, UserRating
+from .models import User, Mascot, UserRating, MascotImage
 from .database import async_session
+from .ranking import score_ranking, top_snapshot
+from .traits import TRAIT_COLUMNS, RARITY_CODES, HAT_CODES, encode_mascot_info
 
 # Weight for calculating ratings
 RARITY_WEIGHTS = {
@@ -17,91 +20,161 @@ RARITY_WEIGHTS = {
 }
 
 
-async def add_mascot(session: AsyncSession, user_id: int, mascot_data: Dict[str, Any]) -> Mascot:
-    """Adds a new mascot to user's collection and updates their rating"""
-
-    # Check if user exists, create if not
-    user_result = await session.execute(select(User).where(User.user_id == user_id))
-    user = user_result.scalars().first()
-
-    if not user:
-        # Create new user
-        user = User(user_id=user_id)
-        session.add(user)
-        await session.flush()
-
-    # Create mascot
-    mascot = Mascot(
-        user_id=user_id,
-        hat_name=mascot_data.get("hat", {}).get("name", ""),
-        hat_rarity=mascot_data.get("hat", {}).get("rarity", "обычный"),
-        hat_color=mascot_data.get("hat", {}).get("color", "#FFFFFF"),
-        body_rarity=mascot_data.get("body", {}).get("rarity", "обычный"),
-        body_color=mascot_data.get("body", {}).get("color", "#FFFFFF"),
-        stroke_rarity=mascot_data.get("stroke", {}).get("rarity", "обычный"),
-        stroke_color=mascot_data.get("stroke", {}).get("color", "#FFFFFF"),
-        rarity_index=mascot_data.get("rarity_index", 0.0),
-        mascot_data=mascot_data
-    )
-    session.add(mascot)
-    await session.flush()  # Чтобы получить ID маскота
-
-    # Рассчитываем общий score редкости для этого маскота
-    rarities = [
+def get_mascot_rarities(mascot_data: Dict[str, Any]) -> List[str]:
+    """Gets rarities of the mascot's hat, body and stroke"""
+    return [
         mascot_data.get("hat", {}).get("rarity", "обычный"),
         mascot_data.get("body", {}).get("rarity", "обычный"),
         mascot_data.get("stroke", {}).get("rarity", "обычный")
     ]
 
-    current_mascot_score = sum(RARITY_WEIGHTS.get(rarity, 0) for rarity in rarities)
-
-    # Update user's rating
-    rating_result = await session.execute(select(UserRating).where(UserRating.user_id == user_id))
-    rating = rating_result.scalars().first()
-
-    if not rating:
-        # Create new rating for user
-        rating = UserRating(
-            user_id=user_id,
-            total_mascots=0,
-            legendary_count=0,
-            epic_count=0,
-            rare_count=0,
-            uncommon_count=0,
-            common_count=0,
-            rating_score=0.0,
-            max_rarity_score=0.0
-        )
-        session.add(rating)
-
-    # Update mascot counts
-    rating.total_mascots += 1
-
-    # Count mascot rarities and update counts
-    for rarity in rarities:
-        if rarity == "легендарный":
-            rating.legendary_count += 1
-        elif rarity == "эпический":
-            rating.epic_count += 1
-        elif rarity == "редкий":
-            rating.rare_count += 1
-        elif rarity == "необычный":
-            rating.uncommon_count += 1
-        elif rarity == "обычный":
-            rating.common_count += 1
-
-    # Обновляем максимальный скор редкости, только если текущий маскот более редкий
-    if current_mascot_score > rating.max_rarity_score:
-        rating.max_rarity_score = current_mascot_score
-        rating.rarest_mascot_id = mascot.id
-
-        # Важно: рейтинг теперь равен максимальному скору редкости
-        rating.rating_score = current_mascot_score
-
-    rating.last_updated = datetime.utcnow()
 
-    await session.commit()
-    return mascot
+def calculate_mascot_score(mascot_data: Dict[str, Any]) -> int:
+    """Calculates the rarity score of a single mascot"""
+    return sum(RARITY_WEIGHTS.get(rarity, 0) for rarity in get_mascot_rarities(mascot_data))
+
+
+# Счетчики рейтинга для каждой редкости элемента
+RARITY_COUNTERS = {
+    "легендарный": "legendary_count",
+    "эпический": "epic_count",
+    "редкий": "rare_count",
+    "необычный": "uncommon_count",
+    "обычный": "common_count"
+}
+
+
+def _rarity_score_sql(column: str) -> str:
+    return f"CASE {column} " + " ".join(
+        f"WHEN {RARITY_CODES[rarity]} THEN {weight}" for rarity, weight in RARITY_WEIGHTS.items()
+    ) + " ELSE 0 END"
+
+
+def _rarity_count_sql(rarity: str) -> str:
+    return " + ".join(f"({part}_rarity = {RARITY_CODES[rarity]})::int" for part in ("hat", "body", "stroke"))
+
+
+# Один запрос на бросок или пачку бросков разных пользователей: пользователи создаются
+# при необходимости, маскоты вставляются, рейтинги обновляются upsert'ом по одной строке
+# на пользователя. Счетчики увеличиваются и лучший скор поднимается на стороне БД под
+# блокировкой строки ON CONFLICT DO UPDATE, поэтому параллельные броски одного пользователя
+# не теряют обновлений; строки рейтинга блокируются по возрастанию user_id, чтобы пачки
+# не взаимоблокировались. Маскоты передаются массивами по столбцам, и текст запроса не зависит
+# от их числа: он компилируется один раз, а подготовленный запрос переиспользуется соединением.
+# old_rating блокирует строки рейтинга до upsert'а: FOR UPDATE дожидается параллельных бросков
+# тех же пользователей и читает последнюю версию строки, поэтому old_score - рейтинг прямо перед
+# этим броском. Строки, которых еще не было, FOR UPDATE не видит: inserted отличает нового игрока
+# от строки, которую параллельный бросок вставил раньше.
+ADD_MASCOTS_SQL = text(f"""
+WITH new_users AS (
+    INSERT INTO users (user_id, registration_date)
+    SELECT DISTINCT user_id, CAST(:now AS timestamp) FROM unnest(CAST(:user_id AS bigint[])) AS u(user_id)
+    ON CONFLICT (user_id) DO NOTHING
+),
+old_rating AS (
+    SELECT user_id, rating_score FROM user_ratings WHERE user_id = ANY(CAST(:user_id AS bigint[]))
+    ORDER BY user_id
+    FOR UPDATE
+),
+new_mascots AS (
+    INSERT INTO mascots (user_id, created_at, {", ".join(TRAIT_COLUMNS)})
+    SELECT m.user_id, CAST(:now AS timestamp), {", ".join(f"m.{column}" for column in TRAIT_COLUMNS)}
+    FROM unnest(
+        CAST(:user_id AS bigint[]),
+        {", ".join(f"CAST(:{column} AS smallint[])" for column in TRAIT_COLUMNS)}
+    ) WITH ORDINALITY AS m(user_id, {", ".join(TRAIT_COLUMNS)}, position)
+    ORDER BY m.position
+    RETURNING id, user_id, hat_rarity, body_rarity, stroke_rarity
+),
+scored AS (
+    SELECT id, user_id, hat_rarity, body_rarity, stroke_rarity,
+           {_rarity_score_sql("hat_rarity")} + {_rarity_score_sql("body_rarity")}
+           + {_rarity_score_sql("stroke_rarity")} AS score
+    FROM new_mascots
+)
+INSERT INTO user_ratings (user_id, total_mascots, {", ".join(RARITY_COUNTERS.values())},
+                          rating_score, max_rarity_score, rarest_mascot_id, last_updated)
+SELECT user_id, count(*),
+       {", ".join(f"sum({_rarity_count_sql(rarity)})" for rarity in RARITY_COUNTERS)},
+       max(score), max(score),
+       -- Самый редкий из новых маскотов пользователя; при равенстве - первый выпавший
+       (array_agg(id ORDER BY score DESC, id))[1],
+       CAST(:now AS timestamp)
+-- Соединение с old_rating берет блокировки до записи первой строки рейтинга
+FROM scored LEFT JOIN old_rating USING (user_id)
+GROUP BY user_id
+ORDER BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    total_mascots = user_ratings.total_mascots + excluded.total_mascots,
+    {", ".join(f"{column} = user_ratings.{column} + excluded.{column}" for column in RARITY_COUNTERS.values())},
+    -- Рейтинг - скор самого редкого маскота: меняется, только если выпал более редкий
+    rarest_mascot_id = CASE WHEN excluded.max_rarity_score > user_ratings.max_rarity_score
+                            THEN excluded.rarest_mascot_id ELSE user_ratings.rarest_mascot_id END,
+    max_rarity_score = GREATEST(user_ratings.max_rarity_score, excluded.max_rarity_score),
+    rating_score = GREATEST(user_ratings.rating_score, excluded.rating_score),
+    last_updated = excluded.last_updated
+RETURNING user_id, rating_score, xmax = 0 AS inserted,
+          (SELECT o.rating_score FROM old_rating o WHERE o.user_id = user_ratings.user_id) AS old_score,
+          (SELECT array_agg(n.id ORDER BY n.id) FROM new_mascots n WHERE n.user_id = user_ratings.user_id)
+              AS mascot_ids
+""")
+
+
+def _add_mascots_params(rolls: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Parameters of ADD_MASCOTS_SQL for (user_id, mascot_data) pairs: one array of trait codes per column"""
+    rows = [encode_mascot_info(mascot_data) for _, mascot_data in rolls]
+    params = {column: [row[column] for row in rows] for column in TRAIT_COLUMNS}
+    params["user_id"] = [user_id for user_id, _ in rolls]
+    params["now"] = datetime.utcnow()
+    return params
+
+
+async def write_mascots(session: AsyncSession, rolls: List[Tuple[int, Dict[str, Any]]]) -> Dict[int, List[int]]:
+    """Adds mascots of one or many users and updates their ratings in one statement.
+
+    rolls are (user_id, mascot_data) pairs; returns the new mascot ids of each user in roll order.
+    The caller commits the session; the in-memory ranking is updated only after that commit.
+    """
+    result = await session.execute(ADD_MASCOTS_SQL, _add_mascots_params(rolls))
+    rows = result.all()
+
+    moves = session.info.setdefault("rating_moves", [])
+    mascot_ids = {}
+    for user_id, rating_score, inserted, old_score, ids in rows:
+        # Без old_score и без вставки строку рейтинга только что вставил параллельный первый бросок
+        # того же игрока: каким был его рейтинг до этого броска, неизвестно
+        moves.append((old_score, rating_score, inserted or old_score is not None))
+        mascot_ids[user_id] = ids
+    return mascot_ids
+
+
+# Рейтинги в памяти повторяют только зафиксированные в БД: сдвиги копятся в сессии до ее коммита
+@event.listens_for(Session, "after_commit")
+def _apply_rating_moves(session: Session) -> None:
+    for old_score, rating_score, known in session.info.pop("rating_moves", ()):
+        if known:
+            score_ranking.move(old_score, rating_score)
+        else:
+            score_ranking.invalidate()
+        top_snapshot.offer(rating_score)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rating_moves(session: Session) -> None:
+    session.info.pop("rating_moves", None)
+
+
+async def add_mascots(session: AsyncSession, user_id: int, mascots_data: List[Dict[str, Any]]) -> List[int]:
+    """Adds mascots to user's collection and updates their rating in one round-trip"""
+    mascot_ids = await write_mascots(session, [(user_id, mascot_data) for mascot_data in mascots_data])
+    return mascot_ids[user_id]
+
+
+async def add_mascot(session: AsyncSession, user_id: int, mascot_data: Dict[str, Any]) -> int:
+    """Adds a new mascot to user's collection and updates their rating; returns the mascot id"""
+    mascot_ids = await add_mascots(session, user_id, [mascot_data])
+    return mascot_ids[0]
+
 
 async def get_user_mascots(session: AsyncSession, user_id: int) -> List[Mascot]:
     """Gets all mascots for a user"""
@@ -109,98 +182,240 @@ async def get_user_mascots(session: AsyncSession, user_id: int) -> List[Mascot]:
     return result.scalars().all()
 
 
-async def get_user_rating(session: AsyncSession, user_id: int) -> Dict[str, Any]:
-    """Gets rating info for a user"""
-    # Get user information
-    user_result = await session.execute(select(User).where(User.user_id == user_id))
-    user = user_result.scalars().first()
+# Курсор страницы коллекции: (created_at, id) маскота на ее границе
+CollectionCursor = Tuple[datetime, int]
+
+# Столбцы маскота, из кодов которых собирается ключ картинки (models.traits.decode_key)
+MASCOT_KEY_COLUMNS = (Mascot.hat, Mascot.hat_color, Mascot.body_color, Mascot.stroke_color)
+
+
+def user_mascots_page_query(user_id: int, limit: int,
+                            after: Optional[CollectionCursor] = None,
+                            before: Optional[CollectionCursor] = None,
+                            hat_rarity: Optional[str] = None,
+                            hat_name: Optional[str] = None,
+                            columns=MASCOT_KEY_COLUMNS):
+    """Query for a page of the user's collection; with before the rows come newest first"""
+    query = select(Mascot.id, Mascot.created_at, *columns).where(Mascot.user_id == user_id)
+    if hat_rarity is not None:
+        query = query.where(Mascot.hat_rarity == RARITY_CODES[hat_rarity])
+    if hat_name is not None:
+        query = query.where(Mascot.hat == HAT_CODES[hat_name])
+
+    cursor = tuple_(Mascot.created_at, Mascot.id)
+    if before is not None:
+        # Предыдущая страница: читаем индекс в обратном порядке от ее конца
+        return (
+            query.where(cursor < tuple_(*before))
+            .order_by(Mascot.created_at.desc(), Mascot.id.desc())
+            .limit(limit)
+        )
+
+    if after is not None:
+        query = query.where(cursor > tuple_(*after))
+    return query.order_by(Mascot.created_at, Mascot.id).limit(limit)
+
+
+async def get_user_mascots_page(session: AsyncSession, user_id: int, limit: int,
+                                after: Optional[CollectionCursor] = None,
+                                before: Optional[CollectionCursor] = None,
+                                hat_rarity: Optional[str] = None,
+                                hat_name: Optional[str] = None,
+                                columns=MASCOT_KEY_COLUMNS) -> List[Any]:
+    """Gets a page of the user's collection in roll order, oldest first.
 
-    # Get rating information
+    Pages are read by keyset on (created_at, id): after/before is the cursor of the last/first mascot
+    of the neighbouring page, so a page costs the same however large the collection is.
+    Rows have id, created_at and the requested columns only; traits are codes from models.traits.
+    """
     result = await session.execute(
-        select(UserRating).where(UserRating.user_id == user_id)
+        user_mascots_page_query(user_id, limit, after, before, hat_rarity, hat_name, columns)
     )
-    rating = result.scalars().first()
+    if before is not None:
+        return list(reversed(result.all()))
+    return result.all()
 
-    # Get position in ranking
-    position_result = await get_user_position(session, user_id)
 
-    if not rating:
-        return None
+async def get_collection_version(session: AsyncSession, user_id: int) -> int:
+    """Gets a number that changes whenever the user's collection grows"""
+    result = await session.execute(
+        select(UserRating.total_mascots).where(UserRating.user_id == user_id)
+    )
+    return result.scalar_one_or_none() or 0
+
 
+def _full_name(user_id: int, username: Optional[str], first_name: Optional[str], last_name: Optional[str]) -> str:
+    """Display name of a player"""
     # Формирование полного имени с проверкой значений
     full_name = ""
-    if user and user.first_name:
-        full_name += user.first_name
-    if user and user.last_name:
-        full_name += f" {user.last_name}" if full_name else user.last_name
+    if first_name:
+        full_name += first_name
+    if last_name:
+        full_name += f" {last_name}" if full_name else last_name
 
     # Если полное имя пустое, используем username или ID
-    if not full_name and user and user.username:
-        full_name = user.username
+    if not full_name and username:
+        full_name = username
     elif not full_name:
         full_name = f"Игрок {user_id}"
+    return full_name
 
+
+def _rating_to_dict(rating: UserRating, username: Optional[str],
+                    first_name: Optional[str], last_name: Optional[str]) -> Dict[str, Any]:
+    """Rating row as a dict for handlers"""
     return {
-        "user_id": user_id,
-        "username": user.username if user else None,
-        "full_name": full_name,
+        "user_id": rating.user_id,
+        "username": username,
+        "full_name": _full_name(rating.user_id, username, first_name, last_name),
         "total_mascots": rating.total_mascots,
         "legendary_count": rating.legendary_count,
         "epic_count": rating.epic_count,
         "rare_count": rating.rare_count,
         "uncommon_count": rating.uncommon_count,
         "common_count": rating.common_count,
-        "rating_score": rating.rating_score,
-        "rating_position": position_result
+        "rating_score": rating.rating_score
     }
-async def get_top_users(session: AsyncSession, limit: int = 10) -> List[Dict[str, Any]]:
-    """Gets top users by rating score"""
-    result = await session.execute(
-        select(
-            UserRating,
-            User.username,
-            User.first_name,
-            User.last_name
+
+
+def user_rating_query(user_id: int, with_position: bool):
+    """Query for a player's rating row with profile; with_position adds the number of players above"""
+    columns = [UserRating, User.username, User.first_name, User.last_name]
+    if with_position:
+        # Место считается в том же запросе по индексу на rating_score
+        higher = aliased(UserRating)
+        columns.append(
+            select(func.count())
+            .where(higher.rating_score > UserRating.rating_score)
+            .scalar_subquery()
         )
+    return (
+        select(*columns)
+        .outerjoin(User, UserRating.user_id == User.user_id)
+        .where(UserRating.user_id == user_id)
+    )
+
+
+async def get_user_rating(session: AsyncSession, user_id: int) -> Dict[str, Any]:
+    """Gets rating info for a user: profile, counters, score and position in one query"""
+    # Распределение могут перезагрузить или сбросить, пока идет запрос: решаем один раз до него
+    use_memory = score_ranking.loaded
+    result = await session.execute(user_rating_query(user_id, with_position=not use_memory))
+    row = result.first()
+    if not row:
+        return None
+
+    rating = row[0]
+    rating_info = _rating_to_dict(rating, row.username, row.first_name, row.last_name)
+    if use_memory:
+        rating_info["rating_position"] = score_ranking.rank(rating.rating_score)
+    else:
+        rating_info["rating_position"] = row[4] + 1
+    return rating_info
+
+
+def _top_users_query():
+    return (
+        select(UserRating, User.username, User.first_name, User.last_name)
         .join(User, UserRating.user_id == User.user_id)
-        .order_by(desc(UserRating.rating_score))
+    )
+
+
+def top_users_page_query(limit: int, after: Optional[Tuple[float, int]] = None):
+    """Query for a leaderboard page after the (rating_score, user_id) of the previous page's last player"""
+    query = _top_users_query()
+    if after is not None:
+        after_score, after_user_id = after
+        query = query.where(
+            (UserRating.rating_score < after_score)
+            | ((UserRating.rating_score == after_score) & (UserRating.user_id > after_user_id))
+        )
+    return query.order_by(desc(UserRating.rating_score), UserRating.user_id).limit(limit)
+
+
+def users_above_query(score: float, user_id: int, limit: int):
+    """Query for the players right above a player, nearest first"""
+    # Игроки выше: в обратном порядке индекса от игрока вверх
+    return (
+        _top_users_query()
+        .where(
+            (UserRating.rating_score > score)
+            | ((UserRating.rating_score == score) & (UserRating.user_id < user_id))
+        )
+        .order_by(UserRating.rating_score, desc(UserRating.user_id))
         .limit(limit)
     )
 
-    top_users = []
-    for row in result:
-        rating = row.UserRating
-        username = row.username
-        first_name = row.first_name
-        last_name = row.last_name
-
-        # Формирование полного имени с проверкой значений
-        full_name = ""
-        if first_name:
-            full_name += first_name
-        if last_name:
-            full_name += f" {last_name}" if full_name else last_name
-
-        # Если полное имя пустое, используем username или ID
-        if not full_name and username:
-            full_name = username
-        elif not full_name:
-            full_name = f"Игрок {rating.user_id}"
-
-        top_users.append({
-            "user_id": rating.user_id,
-            "username": username,
-            "full_name": full_name,
-            "total_mascots": rating.total_mascots,
-            "legendary_count": rating.legendary_count,
-            "epic_count": rating.epic_count,
-            "rare_count": rating.rare_count,
-            "uncommon_count": rating.uncommon_count,
-            "common_count": rating.common_count,
-            "rating_score": rating.rating_score
-        })
-
-    return top_users
+
+async def get_top_users_page(session: AsyncSession, limit: int = 10,
+                             after: Optional[Tuple[float, int]] = None) -> List[Dict[str, Any]]:
+    """Gets a page of the leaderboard ordered by rating score.
+
+    after is the (rating_score, user_id) of the last player on the previous page:
+    the page is read from the index right after it instead of skipping OFFSET rows.
+    """
+    result = await session.execute(top_users_page_query(limit, after))
+    return [_rating_to_dict(row.UserRating, row.username, row.first_name, row.last_name) for row in result]
+
+
+async def get_top_snapshot(session: AsyncSession) -> List[Dict[str, Any]]:
+    """Gets the first leaderboard page from the in-memory snapshot, reading it from the DB when stale"""
+    users = top_snapshot.get()
+    if users is None:
+        generation = top_snapshot.generation
+        users = await get_top_users_page(session, top_snapshot.size)
+        top_snapshot.put(users, generation)
+    return users
+
+
+async def get_top_users(session: AsyncSession, limit: int = 10) -> List[Dict[str, Any]]:
+    """Gets top users by rating score"""
+    return await get_top_users_page(session, limit)
+
+
+async def get_users_around(session: AsyncSession, user_id: int, window: int = 2) -> List[Dict[str, Any]]:
+    """Gets the player and up to window players right above and below them in the leaderboard"""
+    result = await session.execute(
+        select(UserRating.rating_score).where(UserRating.user_id == user_id)
+    )
+    score = result.scalar_one_or_none()
+    if score is None:
+        return []
+
+    above_result = await session.execute(users_above_query(score, user_id, window))
+    above = [_rating_to_dict(row.UserRating, row.username, row.first_name, row.last_name) for row in above_result]
+    above.reverse()
+
+    # Сам игрок и игроки ниже: страница топа, начиная с самого игрока
+    me_and_below = await session.execute(top_users_page_query(window + 1, (score, user_id - 1)))
+    below = [_rating_to_dict(row.UserRating, row.username, row.first_name, row.last_name) for row in me_and_below]
+
+    players = above + below
+    positions = {}
+    for player in players:
+        if player["rating_score"] not in positions:
+            positions[player["rating_score"]] = await get_score_position(session, player["rating_score"])
+        player["rating_position"] = positions[player["rating_score"]]
+        player["is_me"] = player["user_id"] == user_id
+    return players
+
+
+def score_position_query(score: float):
+    """Query for the number of players with a higher rating score"""
+    return select(func.count()).where(UserRating.rating_score > score)
+
+
+async def get_score_position(session: AsyncSession, score: float) -> int:
+    """Gets the leaderboard position of a rating score: 1 + number of players with a higher score"""
+    if score_ranking.loaded:
+        # Распределение рейтингов в памяти: без запроса к БД
+        return score_ranking.rank(score)
+
+    # Count users with higher rating (по индексу на rating_score)
+    higher_ratings = await session.execute(score_position_query(score))
+    return higher_ratings.scalar() + 1
+
+
 async def get_user_position(session: AsyncSession, user_id: int) -> int:
     """Gets user's position in the overall rating"""
     # Get the user's rating
@@ -212,10 +427,53 @@ async def get_user_position(session: AsyncSession, user_id: int) -> int:
     if not user_rating:
         return 0
 
-    # Count users with higher rating
-    higher_ratings = await session.execute(
-        select(func.count()).where(UserRating.rating_score > user_rating)
+    # Position is count of users with higher rating + 1
+    return await get_score_position(session, user_rating)
+
+
+def _mascot_image_filter(render_version: str, key: Tuple[str, str, str, str]):
+    hat_name, hat_color, body_color, stroke_color = key
+    return (
+        (MascotImage.render_version == render_version)
+        & (MascotImage.hat_name == hat_name)
+        & (MascotImage.hat_color == hat_color)
+        & (MascotImage.body_color == body_color)
+        & (MascotImage.stroke_color == stroke_color)
     )
 
-    # Position is count of users with higher rating + 1
-    return higher_ratings.scalar() + 1
\ No newline at end of file
+
+async def get_mascot_file_id(session: AsyncSession, render_version: str,
+                             key: Tuple[str, str, str, str]) -> Optional[str]:
+    """Gets the Telegram file_id of an already uploaded mascot image"""
+    result = await session.execute(
+        select(MascotImage.file_id).where(_mascot_image_filter(render_version, key))
+    )
+    return result.scalar_one_or_none()
+
+
+async def save_mascot_file_id(session: AsyncSession, render_version: str,
+                              key: Tuple[str, str, str, str], file_id: str) -> None:
+    """Stores the Telegram file_id of an uploaded mascot image"""
+    hat_name, hat_color, body_color, stroke_color = key
+    stmt = pg_insert(MascotImage).values(
+        render_version=render_version,
+        hat_name=hat_name,
+        hat_color=hat_color,
+        body_color=body_color,
+        stroke_color=stroke_color,
+        file_id=file_id,
+        created_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_mascot_images_key",
+        set_={"file_id": stmt.excluded.file_id, "created_at": stmt.excluded.created_at}
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def delete_mascot_file_id(session: AsyncSession, render_version: str,
+                                key: Tuple[str, str, str, str]) -> None:
+    """Forgets a stale Telegram file_id"""
+    await session.execute(delete(MascotImage).where(_mascot_image_filter(render_version, key)))
+    await session.commit()
\ No newline at end of file
@@ -0,0 +1,55 @@
+from typing import Any, Dict, List, Tuple
+
+from utils.generate_blin import RARITY_WEIGHTS, COLOR_PALETTES, HAT_COLORS, MascotTraits, traits_to_mascot_info
+
+
+def _unique(values) -> List[str]:
+    return list(dict.fromkeys(values))
+
+
+# Реестр характеристик маскота: в БД хранится номер значения в списке, а не строка.
+# Коды уже записаны в таблицу mascots, поэтому новые шапки, цвета и редкости
+# добавляются в generate_blin только в конец своих словарей и списков.
+RARITIES = list(RARITY_WEIGHTS)  # От обычной к легендарной
+HATS = list(HAT_COLORS)
+HAT_COLOR_VALUES = _unique(color for colors in HAT_COLORS.values() for palette in colors.values() for color in palette)
+BODY_COLOR_VALUES = _unique(color for palette in COLOR_PALETTES["body"].values() for color in palette)
+STROKE_COLOR_VALUES = _unique(color for palette in COLOR_PALETTES["stroke"].values() for color in palette)
+
+RARITY_CODES = {rarity: code for code, rarity in enumerate(RARITIES)}
+HAT_CODES = {hat: code for code, hat in enumerate(HATS)}
+HAT_COLOR_CODES = {color: code for code, color in enumerate(HAT_COLOR_VALUES)}
+BODY_COLOR_CODES = {color: code for code, color in enumerate(BODY_COLOR_VALUES)}
+STROKE_COLOR_CODES = {color: code for code, color in enumerate(STROKE_COLOR_VALUES)}
+
+# Столбцы mascots с кодами в порядке MascotTraits и значения, которые они кодируют
+TRAIT_COLUMNS = ("hat", "hat_rarity", "hat_color", "body_rarity", "body_color", "stroke_rarity", "stroke_color")
+TRAIT_VALUES = (HATS, RARITIES, HAT_COLOR_VALUES, RARITIES, BODY_COLOR_VALUES, RARITIES, STROKE_COLOR_VALUES)
+_TRAIT_CODES = (HAT_CODES, RARITY_CODES, HAT_COLOR_CODES, RARITY_CODES, BODY_COLOR_CODES, RARITY_CODES,
+                STROKE_COLOR_CODES)
+
+
+def encode_mascot_info(mascot_info: Dict[str, Any]) -> Dict[str, int]:
+    """Коды характеристик маскота по его описанию: {столбец: код}"""
+    traits = MascotTraits(
+        mascot_info["hat"]["name"], mascot_info["hat"]["rarity"], mascot_info["hat"]["color"],
+        mascot_info["body"]["rarity"], mascot_info["body"]["color"],
+        mascot_info["stroke"]["rarity"], mascot_info["stroke"]["color"]
+    )
+    return {column: codes[value] for column, codes, value in zip(TRAIT_COLUMNS, _TRAIT_CODES, traits)}
+
+
+def decode_traits(codes) -> MascotTraits:
+    """Характеристики маскота по кодам в порядке TRAIT_COLUMNS"""
+    return MascotTraits(*(values[code] for values, code in zip(TRAIT_VALUES, codes)))
+
+
+def decode_mascot_info(codes) -> Dict[str, Any]:
+    """Описание маскота, как у roll_mascot_info, по кодам в порядке TRAIT_COLUMNS"""
+    return traits_to_mascot_info(decode_traits(codes))
+
+
+def decode_key(codes) -> Tuple[str, str, str, str]:
+    """Ключ изображения маскота по кодам шапки, цвета шапки, цвета тела и цвета обводки"""
+    hat, hat_color, body_color, stroke_color = codes
+    return HATS[hat], HAT_COLOR_VALUES[hat_color], BODY_COLOR_VALUES[body_color], STROKE_COLOR_VALUES[stroke_color]
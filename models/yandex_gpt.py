@@ -1,37 +1,185 @@
+import asyncio
 import logging
-from yandex_cloud_ml_sdk import YCloudML
-from config import YANDEX_GPT_API_KEY, YANDEX_GPT_FOLDER_ID, GPT_MODEL_PARAMS
+import time
+
+from yandex_cloud_ml_sdk import AsyncYCloudML
+from config import (
+    YANDEX_GPT_API_KEY, YANDEX_GPT_FOLDER_ID, GPT_MODEL_NAME, GPT_MODEL_PARAMS, GPT_MAX_CONCURRENCY, GPT_TIMEOUT,
+    LLM_CACHE_BACKEND, LLM_CACHE_DIR, LLM_CACHE_MAX_ENTRIES
+)
+from utils.llm_cache import LLMCache, create_backend
 
 logger = logging.getLogger(__name__)
 
-# Создание клиента для работы с Яндекс ГПТ
-sdk = YCloudML(
+ERROR_RESPONSE = "Извините, у меня возникли проблемы с получением ответа. Попробуйте еще раз позже."
+
+
+class YandexGPTTimeoutError(Exception):
+    """Модель не ответила за отведённое время"""
+
+
+def format_messages(messages):
+    """Подготовка сообщений в формате для SDK"""
+    return [{'role': msg["role"], 'text': msg["text"]} for msg in messages]
+
+
+class YandexGPTClient:
+    """Асинхронный клиент Яндекс ГПТ с общим пулом соединений и ограничением параллельных запросов"""
+
+    def __init__(self, folder_id, auth, model_name="yandexgpt-lite", max_concurrency=32, timeout=60.0):
+        self.folder_id = folder_id
+        self.auth = auth
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+        self._sdk = None
+        self._model = None
+        self._models = {}  # Модели с другим лимитом ответа, max_tokens -> модель
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+
+        # Метрики
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def start(self):
+        """Создает клиент SDK; его gRPC-каналы переиспользуются всеми запросами"""
+        if self._sdk is not None:
+            return
+
+        self._sdk = AsyncYCloudML(folder_id=self.folder_id, auth=self.auth)
+        # configure возвращает новую модель с параметрами, исходная не меняется
+        self._model = self._sdk.models.completions(self.model_name).configure(
+            temperature=GPT_MODEL_PARAMS["temperature"],
+            max_tokens=GPT_MODEL_PARAMS["max_tokens"]
+        )
+        logger.info(f"Клиент Яндекс ГПТ запущен: модель {self.model_name}, параллельных запросов {self.max_concurrency}")
+
+    @property
+    def model(self):
+        self.start()
+        return self._model
+
+    def _get_model(self, max_tokens=None):
+        if max_tokens is None:
+            return self.model
+        model = self._models.get(max_tokens)
+        if model is None:
+            model = self.model.configure(max_tokens=max_tokens)
+            self._models[max_tokens] = model
+        return model
+
+    @property
+    def waiting(self):
+        """Количество запросов, ожидающих свободного слота"""
+        return max(0, self._in_flight - self.max_concurrency)
+
+    async def complete(self, messages, timeout=None, max_tokens=None):
+        """Возвращает текст ответа модели на сообщения; max_tokens ограничивает длину ответа для служебных запросов"""
+        timeout = timeout or self.timeout
+        model = self._get_model(max_tokens)
+
+        self._in_flight += 1
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(model.run(format_messages(messages), timeout=timeout), timeout)
+                except asyncio.TimeoutError:
+                    self._timeouts += 1
+                    raise YandexGPTTimeoutError(f"Яндекс ГПТ не ответил за {timeout} с")
+                except Exception:
+                    self._failed += 1
+                    raise
+        finally:
+            self._in_flight -= 1
+
+        latency = time.perf_counter() - started
+        self._completed += 1
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+        logger.info(f"Ответ Яндекс ГПТ: {latency:.2f} с, в ожидании слота: {self.waiting}")
+        return result.text
+
+    async def stream(self, messages, timeout=None):
+        """Отдает ответ модели по мере генерации: каждый раз весь текст, полученный к этому моменту"""
+        timeout = timeout or self.timeout
+        model = self.model
+
+        self._in_flight += 1
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                chunks = model.run_stream(format_messages(messages), timeout=timeout).__aiter__()
+                text = ""
+                try:
+                    while True:
+                        try:
+                            # Таймаут на каждый кусок: генерация не должна замолкать дольше, чем длится обычный запрос
+                            result = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            self._timeouts += 1
+                            raise YandexGPTTimeoutError(f"Яндекс ГПТ не ответил за {timeout} с")
+                        except Exception:
+                            self._failed += 1
+                            raise
+                        text = result.text
+                        yield text
+                finally:
+                    # Если ответ перестали читать раньше, поток SDK закрывается сразу, а не сборщиком мусора
+                    await chunks.aclose()
+        finally:
+            self._in_flight -= 1
+
+        latency = time.perf_counter() - started
+        self._completed += 1
+        self._latency_total += latency
+        self._latency_max = max(self._latency_max, latency)
+        logger.info(f"Потоковый ответ Яндекс ГПТ: {latency:.2f} с, {len(text)} символов")
+
+    def get_stats(self):
+        """Возвращает метрики клиента"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": min(self._in_flight, self.max_concurrency),
+            "waiting": self.waiting,
+            "completed": self._completed,
+            "failed": self._failed,
+            "timeouts": self._timeouts,
+            "avg_latency_s": self._latency_total / self._completed if self._completed else 0.0,
+            "max_latency_s": self._latency_max,
+        }
+
+
+# Общий клиент бота, запускается в main.py
+gpt_client = YandexGPTClient(
     folder_id=YANDEX_GPT_FOLDER_ID,
-    auth=YANDEX_GPT_API_KEY
+    auth=YANDEX_GPT_API_KEY,
+    model_name=GPT_MODEL_NAME,
+    max_concurrency=GPT_MAX_CONCURRENCY,
+    timeout=GPT_TIMEOUT
 )
 
-model = sdk.models.completions('yandexgpt-lite')
-model.configure(
-    temperature=GPT_MODEL_PARAMS["temperature"],
-    max_tokens=GPT_MODEL_PARAMS["max_tokens"]
+# Кэш ответов перед клиентом; параметры модели входят в ключ
+llm_cache = LLMCache(
+    create_backend(LLM_CACHE_BACKEND, LLM_CACHE_DIR, LLM_CACHE_MAX_ENTRIES),
+    namespace=f"{GPT_MODEL_NAME}:{GPT_MODEL_PARAMS['temperature']}:{GPT_MODEL_PARAMS['max_tokens']}"
 )
 
-def get_yandex_gpt_response(messages):
-    """Получить ответ от Яндекс ГПТ с использованием SDK."""
-    try:
-        # Подготовка сообщений в формате для SDK
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                'role': msg["role"],
-                'text': msg["text"]
-            })
-
-        # Выполнение запроса к модели
-        operation = model.run_deferred(formatted_messages)
-        result = operation.wait()
-        return result.text
 
+async def get_yandex_gpt_response(messages, cache_ttl=None):
+    """Получить ответ от Яндекс ГПТ с использованием SDK.
+
+    Одинаковые одновременные запросы выполняются один раз; с cache_ttl ответ еще и кэшируется.
+    """
+    try:
+        return await llm_cache.fetch(messages, lambda: gpt_client.complete(messages), ttl=cache_ttl)
     except Exception as e:
         logger.error(f"Ошибка при обращении к Яндекс ГПТ: {e}")
-        return "Извините, у меня возникли проблемы с получением ответа. Попробуйте еще раз позже."
\ No newline at end of file
+        return ERROR_RESPONSE
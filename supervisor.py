@@ -0,0 +1,400 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from aiohttp import web
+
+from config import (
+    TELEGRAM_TOKEN, BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    UPDATES_CONCURRENCY, SUPERVISOR_WORKERS, WORKER_QUEUE_SIZE, WORKER_HEARTBEAT_INTERVAL, WORKER_HEARTBEAT_TIMEOUT, configure_logging
+)
+
+logger = logging.getLogger(__name__)
+
+# Поля обновления, в которых Telegram передает автора
+USER_FIELDS = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "poll_answer", "my_chat_member", "chat_member", "chat_join_request",
+    "business_message", "edited_business_message", "message_reaction", "purchased_paid_media"
+)
+
+# Не перезапускать один и тот же воркер чаще, чем раз в столько секунд
+RESTART_DELAY = 1.0
+
+
+def update_user_id(update):
+    """Возвращает id пользователя, от которого пришло обновление, или 0"""
+    for field in USER_FIELDS:
+        payload = update.get(field)
+        if not payload:
+            continue
+        user = payload.get("from") or payload.get("user")
+        if user:
+            return user["id"]
+        chat = payload.get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+def worker_main(index, workers, updates, heartbeats):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C получает вся группа процессов: воркеры завершаются по команде супервизора, доработав обновления
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging()
+    asyncio.run(_run_worker(index, workers, updates, heartbeats))
+
+
+async def _heartbeat(index, heartbeats):
+    while True:
+        heartbeats[index] = time.time()
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+
+async def _run_worker(index, workers, updates, heartbeats):
+    # Бот, диспетчер и сервисы создаются заново в каждом процессе
+    import main
+    from handlers.recipe import recipe_pool
+
+    main.setup_dispatcher()
+    # Бюджет рецептов общий на всех воркеров
+    recipe_pool.hourly_budget = max(1, recipe_pool.hourly_budget // workers)
+    # Кэш картинок общий на диске, прогревает его только первый воркер
+    service_tasks = main.start_services(warm_up_cache=index == 0)
+    heartbeat_task = asyncio.create_task(_heartbeat(index, heartbeats))
+    logger.info(f"Воркер {index} запущен, pid {os.getpid()}")
+
+    # Новое обновление берется из очереди, только когда есть место среди обрабатываемых:
+    # остальные ждут в очереди супервизора, и при ее переполнении он откладывает прием
+    slots = asyncio.Semaphore(UPDATES_CONCURRENCY)
+
+    async def process(update):
+        try:
+            await main.dp.feed_raw_update(main.bot, update)
+        except Exception:
+            logger.exception(f"Воркер {index}: ошибка при обработке обновления {update.get('update_id')}")
+        finally:
+            slots.release()
+
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        while True:
+            await slots.acquire()
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                slots.release()
+                break
+            task = asyncio.create_task(process(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # Дорабатываем то, что уже начали
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        heartbeat_task.cancel()
+        await main.stop_services(service_tasks)
+        await main.bot.session.close()
+        logger.info(f"Воркер {index} остановлен")
+
+
+class Supervisor:
+    """Запускает воркеров, распределяет между ними обновления по пользователям и перезапускает упавших"""
+
+    def __init__(self, workers, queue_size=1000, heartbeat_timeout=30.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.heartbeat_timeout = heartbeat_timeout
+
+        self._context = multiprocessing.get_context("spawn")
+        # Очереди принадлежат супервизору и переживают перезапуск воркера
+        self._queues = [self._context.Queue(queue_size) for _ in range(workers)]
+        self._heartbeats = self._context.Array("d", workers, lock=False)
+        self._processes = [None] * workers
+        self._started_at = [0.0] * workers
+
+        # Метрики
+        self._routed = [0] * workers
+        self._rejected = 0
+        self._restarts = [0] * workers
+
+    def _spawn(self, index):
+        # До первого сердцебиения отсчет идет от запуска процесса
+        self._heartbeats[index] = time.time()
+        self._started_at[index] = time.monotonic()
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self.workers, self._queues[index], self._heartbeats),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        """Запускает всех воркеров"""
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Супервизор запустил воркеров: {self.workers}")
+
+    def worker_index(self, update):
+        """Номер воркера, который обрабатывает обновления этого пользователя"""
+        return update_user_id(update) % self.workers
+
+    def route(self, update):
+        """Отдает обновление воркеру пользователя; False, если его очередь переполнена"""
+        index = self.worker_index(update)
+        try:
+            self._queues[index].put_nowait(update)
+        except queue.Full:
+            self._rejected += 1
+            logger.warning(f"Очередь воркера {index} переполнена, обновление {update.get('update_id')} отложено")
+            return False
+        self._routed[index] += 1
+        return True
+
+    def check_workers(self):
+        """Перезапускает воркеров, которые упали или перестали присылать сердцебиение"""
+        now = time.time()
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                silence = now - self._heartbeats[index]
+                if silence <= self.heartbeat_timeout:
+                    continue
+                logger.error(f"Воркер {index} не отвечает {silence:.0f} с, перезапускаем")
+                process.kill()
+                process.join(5)
+            elif time.monotonic() - self._started_at[index] < RESTART_DELAY:
+                continue
+            else:
+                logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапускаем")
+
+            self._restarts[index] += 1
+            self._replace_queue(index)
+            self._spawn(index)
+
+    def _replace_queue(self, index):
+        """Дает перезапущенному воркеру новую очередь, перекладывая в нее то, что осталось в старой"""
+        # Убитый процесс мог остаться владельцем блокировки чтения старой очереди,
+        # тогда из нее не прочитает уже никто: забираем из нее, что получится, без ожидания
+        old_queue = self._queues[index]
+        new_queue = self._context.Queue(self.queue_size)
+        moved = 0
+        while True:
+            try:
+                new_queue.put_nowait(old_queue.get(block=False))
+            except (queue.Empty, queue.Full):
+                break
+            moved += 1
+        old_queue.close()
+        self._queues[index] = new_queue
+        if moved:
+            logger.info(f"Воркеру {index} переданы {moved} необработанных обновлений")
+
+    async def monitor(self):
+        """Проверяет воркеров каждую секунду"""
+        while True:
+            self.check_workers()
+            await asyncio.sleep(1)
+
+    def stop(self, timeout=10.0):
+        """Просит воркеров доработать текущие обновления и завершиться"""
+        for update_queue in self._queues:
+            try:
+                update_queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.terminate()
+        logger.info("Супервизор остановил воркеров")
+
+    def get_stats(self):
+        """Возвращает состояние воркеров"""
+        now = time.time()
+        return {
+            "workers": [
+                {
+                    "index": index,
+                    "pid": process.pid if process else None,
+                    "alive": bool(process and process.is_alive()),
+                    "heartbeat_age_s": round(now - self._heartbeats[index], 1),
+                    "queue_depth": self._queues[index].qsize(),
+                    "routed": self._routed[index],
+                    "restarts": self._restarts[index],
+                }
+                for index, process in enumerate(self._processes)
+            ],
+            "rejected": self._rejected,
+        }
+
+
+class ParkedUpdates:
+    """Обновления, не поместившиеся в очереди воркеров: у каждого воркера свои, в порядке получения.
+
+    Пока у воркера есть отложенные обновления, новые для него встают за ними, чтобы сообщения
+    пользователя не обгоняли друг друга; обновления остальных воркеров уходят сразу.
+    """
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        self._parked = [deque() for _ in range(supervisor.workers)]
+
+    def __len__(self):
+        return sum(len(parked) for parked in self._parked)
+
+    def offer(self, update):
+        """Отдает обновление воркеру или откладывает его"""
+        parked = self._parked[self.supervisor.worker_index(update)]
+        if parked or not self.supervisor.route(update):
+            parked.append(update)
+
+    def flush(self):
+        """Отдает воркерам отложенные обновления, пока в их очередях есть место"""
+        for parked in self._parked:
+            while parked and self.supervisor.route(parked[0]):
+                parked.popleft()
+
+    def first_update_id(self):
+        """update_id самого раннего отложенного обновления или None"""
+        update_ids = [parked[0]["update_id"] for parked in self._parked if parked]
+        return min(update_ids) if update_ids else None
+
+
+def resolve_allowed_updates():
+    """Типы обновлений, для которых у диспетчера воркеров есть обработчики"""
+    import main
+
+    main.setup_dispatcher()
+    return main.dp.resolve_used_update_types()
+
+
+async def serve_webhook(supervisor, bot, allowed_updates=None):
+    """Принимает обновления по webhook и раскладывает их по воркерам"""
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("Для режима webhook задайте WEBHOOK_SECRET")
+    if WEBHOOK_BASE_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=True
+        )
+
+    async def handle_update(request):
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        if not supervisor.route(await request.json()):
+            # Telegram повторит доставку позже
+            return web.Response(status=503)
+        return web.Response()
+
+    async def handle_health(request):
+        stats = supervisor.get_stats()
+        healthy = all(worker["alive"] for worker in stats["workers"])
+        return web.json_response(stats, status=200 if healthy else 503)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get("/health", handle_health)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    logger.info(f"Webhook-сервер супервизора слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def poll_updates(supervisor, bot, allowed_updates=None, polling_timeout=10):
+    """Забирает обновления long polling'ом и раскладывает их по воркерам.
+
+    Переполненная очередь одного воркера не задерживает остальных: его обновления откладываются
+    (ParkedUpdates). offset не уходит дальше первого отложенного обновления, чтобы Telegram не
+    считал его доставленным, а уже полученные обновления при повторной выдаче пропускаются.
+    """
+    await bot.delete_webhook(drop_pending_updates=True)
+    parked = ParkedUpdates(supervisor)
+    # update_id, следующий за последним полученным обновлением
+    received_until = None
+    while True:
+        parked.flush()
+        first_parked = parked.first_update_id()
+        offset = received_until if first_parked is None else first_parked
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                # Отложенные обновления ждут места у воркера, а не новых обновлений
+                timeout=0 if parked else polling_timeout,
+                allowed_updates=allowed_updates
+            )
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.warning(f"Ошибка получения обновлений: {e}")
+            await asyncio.sleep(1)
+            continue
+
+        received = False
+        for update in updates:
+            if received_until is not None and update.update_id < received_until:
+                continue
+            parked.offer(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+            received_until = update.update_id + 1
+            received = True
+
+        if parked and not received:
+            # Новых обновлений нет, а очереди заняты: даем воркерам их разобрать
+            await asyncio.sleep(0.1)
+
+
+async def run(workers):
+    """Запуск бота в несколько процессов"""
+    from models.database import init_db
+
+    # Версию схемы проверяет супервизор один раз, а не каждый воркер
+    await init_db()
+
+    supervisor = Supervisor(workers, WORKER_QUEUE_SIZE, WORKER_HEARTBEAT_TIMEOUT)
+    supervisor.start()
+    monitor_task = asyncio.create_task(supervisor.monitor())
+
+    # Telegram присылает только те обновления, которые воркеры обрабатывают
+    allowed_updates = resolve_allowed_updates()
+    bot = Bot(token=TELEGRAM_TOKEN)
+    try:
+        if BOT_MODE == "webhook":
+            await serve_webhook(supervisor, bot, allowed_updates)
+        else:
+            await poll_updates(supervisor, bot, allowed_updates)
+    finally:
+        monitor_task.cancel()
+        await bot.session.close()
+        supervisor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запуск бота в нескольких процессах с привязкой пользователей к воркерам")
+    parser.add_argument("--workers", type=int, default=SUPERVISOR_WORKERS, help="Количество процессов-воркеров")
+    args = parser.parse_args()
+
+    configure_logging()
+    try:
+        asyncio.run(run(args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
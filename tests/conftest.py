@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+# Тесты с пометкой postgres работают с отдельной базой: они мигрируют ее и пишут в нее служебные данные
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    # models.database читает DATABASE_URL при импорте
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: тест работает с Postgres из TEST_DATABASE_URL")
+
+
+def pytest_collection_modifyitems(config, items):
+    if TEST_DATABASE_URL:
+        return
+    skip_postgres = pytest.mark.skip(reason="TEST_DATABASE_URL не задан")
+    for item in items:
+        if "postgres" in item.keywords:
+            item.add_marker(skip_postgres)
+
+
+@pytest.fixture(scope="session")
+def migrated_database():
+    """Доводит схему тестовой базы до последней миграции"""
+    from alembic import command
+    from alembic.config import Config
+
+    from models.database import ALEMBIC_CONFIG
+
+    command.upgrade(Config(ALEMBIC_CONFIG), "head")
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from utils import conversation
+from utils.storage import MemoryStateBackend, StateStore
+
+
+class _SlowBackend(MemoryStateBackend):
+    """Память, которая уступает цикл событий на каждой операции, как сетевое хранилище"""
+
+    async def get(self, key, ttl):
+        await asyncio.sleep(0)
+        return await super().get(key, ttl)
+
+    async def set(self, key, value, ttl):
+        await asyncio.sleep(0)
+        await super().set(key, value, ttl)
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    backend = _SlowBackend()
+    monkeypatch.setattr(conversation, "user_sessions", StateStore("user_sessions", backend))
+    monkeypatch.setattr(conversation, "conversation_summaries", StateStore("conversation_summaries", backend))
+
+    async def complete(messages, max_tokens=None):
+        await asyncio.sleep(0.01)
+        return "заметки"
+
+    monkeypatch.setattr(conversation.gpt_client, "complete", complete)
+    return conversation.user_sessions, conversation.conversation_summaries
+
+
+def test_summary_keeps_messages_added_meanwhile(stores):
+    user_sessions, conversation_summaries = stores
+
+    async def scenario():
+        await conversation.start_conversation(1, "промпт")
+        for index in range(4):
+            await conversation.add_message(1, "user", f"старое {index}")
+        conversation.schedule_summary(1, 2)
+        # Реплики, добавленные во время запроса заметок и во время их записи
+        await asyncio.gather(*(conversation.add_message(1, "user", f"новое {index}") for index in range(5)))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(*(conversation.add_message(1, "user", f"новое {index}") for index in range(5, 10)))
+        while conversation._summarizing:
+            await asyncio.sleep(0.01)
+        return await user_sessions.get(1), await conversation_summaries.get(1)
+
+    history, summary = asyncio.run(scenario())
+
+    assert summary == "заметки"
+    assert [message["text"] for message in history] == (
+        ["промпт", "старое 2", "старое 3"] + [f"новое {index}" for index in range(10)]
+    )
+
+
+def test_build_prompt_without_history(stores):
+    assert asyncio.run(conversation.build_prompt(1)) == []
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from middlewares.db_session import DbSessionMiddleware
+
+
+class _Session:
+    def __init__(self, log):
+        self.log = log
+
+    async def __aenter__(self):
+        self.log.append("open")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.log.append("close")
+
+    async def commit(self):
+        self.log.append("commit")
+
+    async def rollback(self):
+        self.log.append("rollback")
+
+
+def _middleware(log):
+    return DbSessionMiddleware(slow_threshold=60, session_factory=lambda: _Session(log))
+
+
+def _data(callback, params=("session",)):
+    return {"handler": SimpleNamespace(callback=callback, params=set(params))}
+
+
+def test_commits_after_handler():
+    log = []
+
+    async def handler(event, data):
+        log.append("handler")
+        assert isinstance(data["session"], _Session)
+        return "ok"
+
+    result = asyncio.run(_middleware(log)(handler, object(), _data(handler)))
+
+    assert result == "ok"
+    assert log == ["open", "handler", "commit", "close"]
+
+
+def test_rolls_back_when_handler_fails():
+    log = []
+
+    async def handler(event, data):
+        log.append("handler")
+        raise ValueError("ошибка обработчика")
+
+    middleware = _middleware(log)
+    with pytest.raises(ValueError):
+        asyncio.run(middleware(handler, object(), _data(handler)))
+
+    assert log == ["open", "handler", "rollback", "close"]
+    assert middleware.get_stats()["handler"]["updates"] == 1
+
+
+def test_no_session_for_handlers_without_it():
+    log = []
+
+    async def handler(event, data):
+        assert "session" not in data
+        return "ok"
+
+    assert asyncio.run(_middleware(log)(handler, object(), _data(handler, params=()))) == "ok"
+    assert log == []
@@ -0,0 +1,53 @@
+import io
+import random
+
+import pytest
+
+try:
+    import cairosvg  # noqa: F401
+except (ImportError, OSError):
+    # cairosvg без libcairo падает при импорте с OSError
+    pytest.skip("cairosvg и libcairo недоступны", allow_module_level=True)
+
+from PIL import Image, ImageChops
+
+from config import MASCOT_SVG_TEMPLATE_PATH
+from utils.generate_blin import load_svg, roll_mascot_info, mascot_key
+from utils.layer_renderer import LayerRenderer
+from utils.render_cache import MASCOT_RENDER_SCALE
+from utils.render_pool import svg_to_png
+from utils.svg_template import render_mascot_svg
+
+KEYS = 50
+# Допустимое отклонение канала из-за округления при наложении слоев
+TOLERANCE = 2
+# Доля пикселей, которые вообще могут отличаться (сглаживание на краях слоев)
+MAX_DIFFERING_SHARE = 0.01
+
+
+def _on_white(image):
+    # Пользователь видит картинку на белом фоне
+    background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+    return Image.alpha_composite(background, image.convert("RGBA")).convert("RGB")
+
+
+def test_layers_match_cairosvg():
+    random.seed(42)
+    keys = list(dict.fromkeys(mascot_key(roll_mascot_info()) for _ in range(KEYS)))
+    renderer = LayerRenderer(load_svg(MASCOT_SVG_TEMPLATE_PATH), MASCOT_RENDER_SCALE)
+
+    max_difference = 0
+    differing_pixels = 0
+    total_pixels = 0
+    for key in keys:
+        expected = Image.open(io.BytesIO(svg_to_png(render_mascot_svg(key), MASCOT_RENDER_SCALE)))
+        actual = Image.open(io.BytesIO(renderer.render(key)))
+        assert actual.size == expected.size
+
+        difference = ImageChops.difference(_on_white(expected), _on_white(actual))
+        max_difference = max(max_difference, max(high for _, high in difference.getextrema()))
+        differing_pixels += sum(1 for pixel in difference.getdata() if max(pixel))
+        total_pixels += expected.width * expected.height
+
+    assert max_difference <= TOLERANCE
+    assert differing_pixels / total_pixels <= MAX_DIFFERING_SHARE
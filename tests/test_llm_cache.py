@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.llm_cache import LLMCache, MemoryLRUBackend, DiskBackend, cache_key
+
+MESSAGES = [{"role": "user", "text": "рецепт блинов"}]
+
+
+class _Model:
+    """Вызов модели, который ждет release и затем отвечает или падает"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return f"ответ {self.calls}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_same_messages_share_one_call():
+    async def main():
+        cache = LLMCache(MemoryLRUBackend())
+        model = _Model()
+        # Пробелы не различают запросы
+        other = [{"role": "user", "text": "  рецепт   блинов "}]
+        waiters = [asyncio.ensure_future(cache.fetch(messages, model)) for messages in (MESSAGES, other, MESSAGES)]
+        await asyncio.sleep(0)
+        model.release.set()
+        return cache, model, await asyncio.gather(*waiters)
+
+    cache, model, results = asyncio.run(main())
+    assert results == ["ответ 1"] * 3
+    assert model.calls == 1
+    assert cache.get_stats() == {"hits": 0, "misses": 1, "coalesced": 2, "in_flight": 0}
+
+
+def test_failed_leader_fails_followers_and_is_forgotten():
+    async def main():
+        cache = LLMCache(MemoryLRUBackend())
+        model = _Model(RuntimeError("модель недоступна"))
+        waiters = [asyncio.ensure_future(cache.fetch(MESSAGES, model, ttl=60)) for _ in range(3)]
+        await asyncio.sleep(0)
+        model.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert cache.get_stats()["in_flight"] == 0
+
+        # Ошибка не кэшируется: следующий запрос снова идет в модель
+        model.error = None
+        assert await cache.fetch(MESSAGES, model, ttl=60) == "ответ 2"
+        return results
+
+    results = asyncio.run(main())
+    assert [str(result) for result in results] == ["модель недоступна"] * 3
+
+
+def test_cancelled_follower_does_not_cancel_call():
+    async def main():
+        cache = LLMCache(MemoryLRUBackend())
+        model = _Model()
+        leader = asyncio.ensure_future(cache.fetch(MESSAGES, model))
+        follower = asyncio.ensure_future(cache.fetch(MESSAGES, model))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        model.release.set()
+        return await follower
+
+    assert asyncio.run(main()) == "ответ 1"
+
+
+def test_answer_is_cached_for_ttl(clock):
+    async def main():
+        cache = LLMCache(MemoryLRUBackend())
+        model = _Model()
+        model.release.set()
+        assert await cache.fetch(MESSAGES, model, ttl=60) == "ответ 1"
+        clock[0] += 59
+        assert await cache.fetch(MESSAGES, model, ttl=60) == "ответ 1"
+        clock[0] += 1
+        assert await cache.fetch(MESSAGES, model, ttl=60) == "ответ 2"
+        # Без ttl ответ не сохраняется
+        assert await cache.fetch([{"role": "user", "text": "другое"}], model) == "ответ 3"
+        assert await cache.get([{"role": "user", "text": "другое"}]) is None
+        return cache.get_stats()
+
+    stats = asyncio.run(main())
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    async def main():
+        backend = MemoryLRUBackend(max_entries=2)
+        await backend.set("a", "A", 60)
+        await backend.set("b", "B", 60)
+        assert await backend.get("a") == "A"
+        await backend.set("c", "C", 60)
+        return backend
+
+    backend = asyncio.run(main())
+    assert list(backend._entries) == ["a", "c"]
+
+
+def test_disk_backend_expires_entries(tmp_path, clock):
+    async def main():
+        backend = DiskBackend(str(tmp_path))
+        key = cache_key(MESSAGES)
+        await backend.set(key, "ответ", 60)
+        assert await DiskBackend(str(tmp_path)).get(key) == "ответ"
+        clock[0] += 60
+        assert await backend.get(key) is None
+        return list(tmp_path.rglob("*.json"))
+
+    assert asyncio.run(main()) == []
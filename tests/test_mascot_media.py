@@ -0,0 +1,123 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile
+
+try:
+    import cairosvg  # noqa: F401
+except (ImportError, OSError):
+    # cairosvg без libcairo падает при импорте с OSError
+    pytest.skip("cairosvg и libcairo недоступны", allow_module_level=True)
+
+from utils import mascot_media
+
+KEY = ("шапка", "#000000", "#ffffff", "#000000")
+
+
+class _Message:
+    def __init__(self, error):
+        self.error = error
+        self.sent = []
+
+    async def answer_photo(self, photo, **kwargs):
+        if isinstance(photo, str):
+            raise self.error
+        self.sent.append(photo)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="новый")])
+
+
+@pytest.fixture
+def forgotten(monkeypatch):
+    keys = []
+
+    async def forget(key):
+        keys.append(key)
+
+    async def remember(key, file_id):
+        pass
+
+    async def png(key):
+        return b"png"
+
+    monkeypatch.setattr(mascot_media, "_forget_file_id", forget)
+    monkeypatch.setattr(mascot_media, "_remember_file_id", remember)
+    monkeypatch.setattr(mascot_media, "get_mascot_png", png)
+    return keys
+
+
+def test_stale_file_id_falls_back_to_png(forgotten):
+    message = _Message(TelegramBadRequest(None, "Bad Request: wrong file identifier/HTTP URL specified"))
+    asyncio.run(mascot_media.answer_mascot_photo(message, KEY, "старый"))
+
+    assert forgotten == [KEY]
+    assert isinstance(message.sent[0], BufferedInputFile)
+
+
+def test_other_bad_request_is_raised(forgotten):
+    message = _Message(TelegramBadRequest(None, "Bad Request: can't parse entities"))
+    with pytest.raises(TelegramBadRequest):
+        asyncio.run(mascot_media.answer_mascot_photo(message, KEY, "старый"))
+
+    assert forgotten == []
+    assert message.sent == []
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Запросы file_id к БД; stored - что в ней лежит"""
+    lookups = []
+    stored = {}
+
+    async def get_session_ctx():
+        return _Session()
+
+    async def get_mascot_file_id(session, version, key):
+        lookups.append(key)
+        return stored.get(key)
+
+    monkeypatch.setattr(mascot_media, "get_session_ctx", get_session_ctx)
+    monkeypatch.setattr(mascot_media, "get_mascot_file_id", get_mascot_file_id)
+    monkeypatch.setattr(mascot_media, "_file_ids", {})
+    monkeypatch.setattr(mascot_media, "_missing", {})
+    return lookups, stored
+
+
+def test_missing_file_id_is_not_looked_up_again_until_ttl(lookups):
+    lookups, stored = lookups
+    assert asyncio.run(mascot_media._get_file_id(KEY)) is None
+    assert asyncio.run(mascot_media._get_file_id(KEY)) is None
+    assert lookups == [KEY]
+
+    # Другой процесс бота загрузил картинку: когда ttl промаха истек, file_id находится в БД
+    stored[KEY] = "чужой"
+    mascot_media._missing[KEY] = 0.0
+    assert asyncio.run(mascot_media._get_file_id(KEY)) == "чужой"
+    assert asyncio.run(mascot_media._get_file_id(KEY)) == "чужой"
+    assert lookups == [KEY, KEY]
+
+
+def test_uploaded_file_id_replaces_miss(lookups, monkeypatch):
+    lookups, stored = lookups
+
+    async def save_mascot_file_id(session, version, key, file_id):
+        stored[key] = file_id
+
+    monkeypatch.setattr(mascot_media, "save_mascot_file_id", save_mascot_file_id)
+
+    async def main():
+        assert await mascot_media._get_file_id(KEY) is None
+        await mascot_media._remember_file_id(KEY, "новый")
+        return await mascot_media._get_file_id(KEY)
+
+    assert asyncio.run(main()) == "новый"
+    assert lookups == [KEY]
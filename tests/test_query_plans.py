@@ -0,0 +1,52 @@
+import asyncio
+import random
+
+import pytest
+from sqlalchemy import delete
+
+from models.database import engine, get_session_ctx
+from models.models import Mascot, User, UserRating
+from models.repository import write_mascots
+from utils.benchmarks import explain_plans
+from utils.generate_blin import roll_mascot_info
+
+pytestmark = pytest.mark.postgres
+
+# На почти пустой таблице полный просмотр уникального индекса с сортировкой дешевле
+# нужного индекса, поэтому рейтинг засевается служебными игроками с отрицательными id
+PLAYERS = 500
+PLAYER_IDS = [-(2000 + index) for index in range(PLAYERS)]
+
+
+async def _delete_players(session):
+    for model in (UserRating, Mascot, User):
+        await session.execute(delete(model).where(model.user_id.in_(PLAYER_IDS)))
+    await session.commit()
+
+
+async def _explain():
+    engine.echo = False
+    random.seed(23)
+    try:
+        async with await get_session_ctx() as session:
+            await _delete_players(session)
+            await write_mascots(session, [(user_id, roll_mascot_info()) for user_id in PLAYER_IDS])
+            await session.commit()
+        try:
+            async with await get_session_ctx() as session:
+                return await explain_plans(session)
+        finally:
+            async with await get_session_ctx() as session:
+                await _delete_players(session)
+    finally:
+        await engine.dispose()
+
+
+def test_queries_use_their_indexes(migrated_database):
+    reports = asyncio.run(_explain())
+
+    assert reports
+    for name, problems, scans in reports:
+        # Индексный просмотр по своему индексу, без полного чтения mascots/user_ratings и без сортировки
+        assert not problems, f"{name}: {'; '.join(problems)} ({scans})"
+        assert "Index" in scans, name
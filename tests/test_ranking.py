@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from models import ranking
+from models.ranking import ScoreRanking, TopSnapshot, top_page_cursor, parse_top_page_cursor
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def _ranking(histogram):
+    score_ranking = ScoreRanking(max_score=100)
+    score_ranking.load(histogram)
+    return score_ranking
+
+
+def test_players_with_equal_score_share_a_place():
+    score_ranking = _ranking({50.0: 3, 40.0: 1, 70.0: 2})
+    assert score_ranking.total == 6
+    assert score_ranking.rank(70) == 1
+    assert score_ranking.rank(50) == 3
+    assert score_ranking.rank(40) == 6
+    # Рейтинги округляются до целых: 49.6 и 50.4 делят место с 50
+    assert score_ranking.rank(49.6) == score_ranking.rank(50.4) == 3
+
+
+def test_move_across_buckets():
+    score_ranking = _ranking({50.0: 3, 40.0: 1})
+    score_ranking.move(40.0, 60.0)
+    assert score_ranking.total == 4
+    assert score_ranking.rank(60) == 1
+    assert score_ranking.rank(50) == 2
+
+
+def test_move_within_bucket_and_new_player():
+    score_ranking = _ranking({50.0: 2})
+    score_ranking.move(50.0, 50.2)
+    assert score_ranking.rank(50) == 1
+    score_ranking.move(None, 80.0)
+    assert score_ranking.total == 3
+    assert score_ranking.rank(50) == 2
+
+
+def test_moves_are_ignored_until_loaded():
+    score_ranking = ScoreRanking(max_score=100)
+    score_ranking.move(None, 10.0)
+    assert score_ranking.total == 0
+    score_ranking.load({10.0: 1})
+    assert score_ranking.total == 1
+
+
+def test_reload_read_during_moves_is_discarded():
+    score_ranking = _ranking({50.0: 1})
+    generation = score_ranking.generation
+    # Распределение читается из БД, а тем временем игрок бросает
+    score_ranking.move(None, 90.0)
+    assert not score_ranking.load({50.0: 1}, generation)
+    assert score_ranking.total == 2
+    assert score_ranking.rank(90) == 1
+
+    assert score_ranking.load({50.0: 1, 90.0: 1}, score_ranking.generation)
+
+
+def test_reload_after_invalidate_during_read_is_discarded():
+    score_ranking = _ranking({50.0: 1})
+    generation = score_ranking.generation
+    score_ranking.invalidate()
+    assert not score_ranking.load({50.0: 1}, generation)
+    assert not score_ranking.loaded
+
+
+@pytest.fixture
+def histograms(monkeypatch):
+    """get_score_histogram по очереди возвращает распределения; during_read вызывается во время чтения"""
+    score_ranking = ScoreRanking(max_score=100)
+    monkeypatch.setattr(ranking, "score_ranking", score_ranking)
+
+    async def get_session_ctx():
+        return _Session()
+
+    monkeypatch.setattr(ranking, "get_session_ctx", get_session_ctx)
+
+    def install(*reads):
+        reads = list(reads)
+
+        async def get_score_histogram(session):
+            histogram, during_read = reads.pop(0)
+            during_read(score_ranking)
+            return histogram
+
+        monkeypatch.setattr(ranking, "get_score_histogram", get_score_histogram)
+        return score_ranking
+
+    return install
+
+
+def _nothing(score_ranking):
+    pass
+
+
+def test_refresh_rereads_when_moves_arrive_during_read(histograms):
+    score_ranking = histograms(
+        ({50.0: 1}, lambda score_ranking: score_ranking.move(None, 90.0)),
+        ({50.0: 1, 90.0: 1}, _nothing),
+    )
+    assert asyncio.run(ranking.refresh_score_ranking())
+    assert score_ranking.total == 2
+    assert score_ranking.rank(90) == 1
+
+
+def test_refresh_gives_up_while_moves_keep_arriving(histograms):
+    def busy(score_ranking):
+        score_ranking.move(None, 90.0)
+
+    score_ranking = histograms(*[({50.0: 1}, busy)] * ranking.REFRESH_ATTEMPTS)
+    assert not asyncio.run(ranking.refresh_score_ranking())
+    assert not score_ranking.loaded
+
+
+def _snapshot(*scores):
+    snapshot = TopSnapshot(size=3, ttl=60)
+    snapshot.put([{"user_id": index, "rating_score": score} for index, score in enumerate(scores)], 0)
+    return snapshot
+
+
+def test_offer_below_full_top_keeps_snapshot():
+    snapshot = _snapshot(90.0, 80.0, 70.0)
+    snapshot.offer(69.9)
+    assert snapshot.get() is not None
+    assert snapshot.invalidations == 0
+
+
+@pytest.mark.parametrize("score", [70.0, 85.0])
+def test_offer_reaching_top_invalidates(score):
+    snapshot = _snapshot(90.0, 80.0, 70.0)
+    snapshot.offer(score)
+    assert snapshot.get() is None
+    assert snapshot.invalidations == 1
+
+
+def test_offer_to_short_top_invalidates():
+    snapshot = _snapshot(90.0, 80.0)
+    snapshot.offer(1.0)
+    assert snapshot.get() is None
+
+
+def test_snapshot_read_before_invalidation_is_not_stored():
+    snapshot = TopSnapshot(size=3, ttl=60)
+    generation = snapshot.generation
+    snapshot.invalidate()
+    snapshot.put([{"user_id": 1, "rating_score": 90.0}], generation)
+    assert snapshot.get() is None
+
+
+@pytest.mark.parametrize("score", [0.0, 123.456789012, 1234567.25, 2 / 3])
+def test_top_page_cursor_round_trip(score):
+    data = top_page_cursor({"user_id": 987654321012, "rating_score": score}, 20)
+    # Ограничение Telegram на callback_data
+    assert len(data.encode()) <= 64
+    assert parse_top_page_cursor(data) == ((score, 987654321012), 20)
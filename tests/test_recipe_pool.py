@@ -0,0 +1,34 @@
+from utils.recipe_pool import RecipePool
+
+
+async def _generate():
+    return "рецепт"
+
+
+def _pool(max_users):
+    pool = RecipePool(_generate, size=2, max_serves=1000, max_users=max_users)
+    pool.add("первый")
+    pool.add("второй")
+    return pool
+
+
+def test_user_does_not_get_the_same_recipe_twice_in_a_row():
+    pool = _pool(max_users=10)
+    assert pool.take(1) != pool.take(1)
+
+
+def test_last_served_is_bounded():
+    pool = _pool(max_users=3)
+    for user_id in range(10):
+        assert pool.take(user_id) is not None
+    assert list(pool._last_served) == [7, 8, 9]
+
+
+def test_recently_served_users_are_kept():
+    pool = _pool(max_users=2)
+    pool.take(1)
+    pool.take(2)
+    pool.take(1)
+    pool.take(3)
+    # Вытесняется пользователь, который дольше всех не получал рецепт
+    assert list(pool._last_served) == [1, 3]
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+try:
+    import cairosvg  # noqa: F401
+except (ImportError, OSError):
+    # cairosvg без libcairo падает при импорте с OSError
+    pytest.skip("cairosvg и libcairo недоступны", allow_module_level=True)
+
+from utils import render_cache
+from utils.render_cache import RenderCache
+
+
+def _key(name):
+    return ("шапка", name)
+
+
+def test_memory_lru_keeps_byte_budget():
+    async def main():
+        cache = RenderCache(None, max_bytes=10)
+        await cache.put(_key("a"), b"aaaa")
+        await cache.put(_key("b"), b"bbbb")
+        # a использован недавно, поэтому вытесняется b
+        assert await cache.get(_key("a")) == b"aaaa"
+        await cache.put(_key("c"), b"cccc")
+        return cache
+
+    cache = asyncio.run(main())
+    assert list(cache._memory) == [_key("a"), _key("c")]
+    assert cache.get_stats()["memory_bytes"] == 8
+
+
+def test_oversized_png_is_not_kept_in_memory():
+    async def main():
+        cache = RenderCache(None, max_bytes=10)
+        await cache.put(_key("a"), b"aaaa")
+        await cache.put(_key("big"), b"x" * 11)
+        return cache, await cache.get(_key("big"))
+
+    cache, png_data = asyncio.run(main())
+    assert png_data is None
+    assert list(cache._memory) == [_key("a")]
+
+
+def test_disk_fallback(tmp_path):
+    async def main():
+        await RenderCache(str(tmp_path), max_bytes=100, version="1").put(_key("a"), b"png")
+        # Новый процесс с пустой памятью читает картинку с диска и кладет ее в память
+        cache = RenderCache(str(tmp_path), max_bytes=100, version="1")
+        assert await cache.get(_key("a")) == b"png"
+        assert await cache.get(_key("a")) == b"png"
+        # Другая версия шаблона не видит старые файлы
+        assert await RenderCache(str(tmp_path), max_bytes=100, version="2").get(_key("a")) is None
+        return cache.get_stats()
+
+    stats = asyncio.run(main())
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+
+class _RenderService:
+    """render_service.submit, который ждет release и затем отдает PNG или падает"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def submit(self, func, *args):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return b"png"
+
+
+@pytest.fixture
+def renderer(monkeypatch):
+    monkeypatch.setattr(render_cache, "mascot_cache", RenderCache(None, max_bytes=100))
+    monkeypatch.setattr(render_cache, "MASCOT_RENDER_BACKEND", "layers")
+    monkeypatch.setattr(render_cache, "_rendering", {})
+
+    def install(error=None):
+        service = _RenderService(error)
+        monkeypatch.setattr(render_cache, "render_service", service)
+        return service
+
+    return install
+
+
+def test_concurrent_misses_share_one_render(renderer):
+    async def main():
+        service = renderer()
+        waiters = [asyncio.ensure_future(render_cache.get_mascot_png(_key("a"))) for _ in range(3)]
+        await asyncio.sleep(0)
+        service.release.set()
+        return service, await asyncio.gather(*waiters)
+
+    service, results = asyncio.run(main())
+    assert results == [b"png"] * 3
+    assert service.calls == 1
+    assert render_cache._rendering == {}
+
+
+def test_failed_render_reaches_every_waiter_and_is_forgotten(renderer):
+    async def main():
+        service = renderer(RuntimeError("рендер упал"))
+        waiters = [asyncio.ensure_future(render_cache.get_mascot_png(_key("a"))) for _ in range(3)]
+        await asyncio.sleep(0)
+        service.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert render_cache._rendering == {}
+
+        # Следующий запрос рендерит заново, а не получает старую ошибку
+        service.error = None
+        assert await render_cache.get_mascot_png(_key("a")) == b"png"
+        return service, results
+
+    service, results = asyncio.run(main())
+    assert [str(result) for result in results] == ["рендер упал"] * 3
+    assert service.calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_shared_render(renderer):
+    async def main():
+        service = renderer()
+        first = asyncio.ensure_future(render_cache.get_mascot_png(_key("a")))
+        second = asyncio.ensure_future(render_cache.get_mascot_png(_key("a")))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        service.release.set()
+        return service, await second
+
+    service, png_data = asyncio.run(main())
+    assert png_data == b"png"
+    assert service.calls == 1
+    assert render_cache._rendering == {}
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+try:
+    import cairosvg  # noqa: F401
+except (ImportError, OSError):
+    # cairosvg без libcairo падает при импорте с OSError
+    pytest.skip("cairosvg и libcairo недоступны", allow_module_level=True)
+
+from utils.render_pool import RenderService, RenderBusyError, RenderTimeoutError
+
+
+def _blocked(release):
+    release.wait(5)
+    return "png"
+
+
+async def _settled(service):
+    """Ждет, пока воркеры вернут слоты в event loop"""
+    for _ in range(200):
+        if service._pending == 0:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"слоты не освобождены: {service._pending}")
+
+
+def _run(scenario, **options):
+    release = threading.Event()
+
+    async def main():
+        service = RenderService(mode="thread", **options)
+        try:
+            return await scenario(service, release)
+        finally:
+            release.set()
+            service.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario(service, release):
+        running = asyncio.create_task(service.submit(_blocked, release))
+        queued = asyncio.create_task(service.submit(_blocked, release))
+        await asyncio.sleep(0.05)
+        assert service.queue_depth == 1
+
+        with pytest.raises(RenderBusyError):
+            await service.submit(_blocked, release)
+        assert service._pending == 2
+
+        release.set()
+        assert await asyncio.gather(running, queued) == ["png", "png"]
+        await _settled(service)
+        return service.get_stats()
+
+    stats = _run(scenario, workers=1, queue_size=1, timeout=5)
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+
+
+def test_timeout_keeps_slot_until_worker_finishes():
+    async def scenario(service, release):
+        with pytest.raises(RenderTimeoutError):
+            await service.submit(_blocked, release)
+        # Воркер все еще занят задачей, которую обработчик бросил ждать
+        assert service._pending == 1
+
+        release.set()
+        await _settled(service)
+        return service.get_stats()
+
+    stats = _run(scenario, workers=1, queue_size=1, timeout=0.05)
+    assert stats["timeouts"] == 1
+    assert stats["completed"] == 0
+
+
+def test_timed_out_queued_job_frees_slot_at_once():
+    async def scenario(service, release):
+        results = await asyncio.gather(
+            service.submit(_blocked, release),
+            service.submit(_blocked, release),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, RenderTimeoutError) for result in results)
+        await asyncio.sleep(0.01)
+        # Задача из очереди отменена, занят только слот работающего воркера
+        assert service._pending == 1
+
+        release.set()
+        await _settled(service)
+
+    _run(scenario, workers=1, queue_size=1, timeout=0.05)
+
+
+def test_cancelled_caller_releases_slot_after_worker():
+    async def scenario(service, release):
+        task = asyncio.create_task(service.submit(_blocked, release))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert service._pending == 1
+
+        release.set()
+        await _settled(service)
+        # Освободившийся слот снова принимает задачи
+        assert await service.submit(_blocked, release) == "png"
+
+    _run(scenario, workers=1, queue_size=0, timeout=5)
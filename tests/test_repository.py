@@ -0,0 +1,48 @@
+import asyncio
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pytest
+
+from models.ranking import score_ranking
+from models.repository import get_user_rating
+
+_Row = namedtuple("_Row", "rating username first_name last_name")
+_RowWithPosition = namedtuple("_RowWithPosition", "rating username first_name last_name higher")
+
+RATING = SimpleNamespace(
+    user_id=1, total_mascots=3, legendary_count=0, epic_count=0, rare_count=1, uncommon_count=2,
+    common_count=6, rating_score=21.0
+)
+
+
+class _Session:
+    """Сессия, во время запроса которой распределение рейтингов загружают или сбрасывают"""
+
+    def __init__(self, loaded_after):
+        self.loaded_after = loaded_after
+
+    async def execute(self, query):
+        with_position = len(query.column_descriptions) == 5
+        score_ranking.loaded = self.loaded_after
+        row = _RowWithPosition(RATING, "user", None, None, 4) if with_position else _Row(RATING, "user", None, None)
+        return SimpleNamespace(first=lambda: row)
+
+
+@pytest.fixture
+def ranking():
+    saved = score_ranking._tree, score_ranking._total, score_ranking.loaded
+    score_ranking.load({21.0: 1, 40.0: 2})
+    yield score_ranking
+    score_ranking._tree, score_ranking._total, score_ranking.loaded = saved
+
+
+def test_rating_survives_ranking_invalidated_during_query(ranking):
+    rating = asyncio.run(get_user_rating(_Session(loaded_after=False), 1))
+    assert rating["rating_position"] == 3
+
+
+def test_rating_survives_ranking_loaded_during_query(ranking):
+    ranking.invalidate()
+    rating = asyncio.run(get_user_rating(_Session(loaded_after=True), 1))
+    assert rating["rating_position"] == 5
@@ -0,0 +1,157 @@
+import asyncio
+import random
+
+import pytest
+from sqlalchemy import delete, select
+
+from models.database import engine, get_session_ctx
+from models.models import Mascot, User, UserRating
+from models.ranking import ScoreRanking, get_score_histogram, score_ranking
+from models.repository import RARITY_COUNTERS, add_mascot, calculate_mascot_score, get_mascot_rarities
+from utils.generate_blin import roll_mascot_info
+from utils.write_buffer import MascotWriteBuffer
+
+pytestmark = pytest.mark.postgres
+
+ROLLS = 200
+CONCURRENCY = 20
+# Служебные пользователи с отрицательными id, как в utils.benchmarks
+USER_ID = -1001
+PLAYER_IDS = [-(1100 + index) for index in range(5)]
+
+
+async def _delete_user(session, user_id):
+    for model in (UserRating, Mascot, User):
+        await session.execute(delete(model).where(model.user_id == user_id))
+    await session.commit()
+
+
+async def _roll(user_id, mascot_info):
+    async with await get_session_ctx() as session:
+        await add_mascot(session, user_id, mascot_info)
+        await session.commit()
+
+
+async def _roll_concurrently(mascots_info, buffered):
+    engine.echo = False
+    async with await get_session_ctx() as session:
+        await _delete_user(session, USER_ID)
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    writer = MascotWriteBuffer(flush_interval=0.01, batch_size=50)
+    if buffered:
+        writer.start()
+
+    async def roll(mascot_info):
+        async with semaphore:
+            if buffered:
+                await (await writer.submit(USER_ID, [mascot_info]))
+            else:
+                await _roll(USER_ID, mascot_info)
+
+    try:
+        await asyncio.gather(*(roll(mascot_info) for mascot_info in mascots_info))
+        if buffered:
+            await writer.shutdown()
+        async with await get_session_ctx() as session:
+            rating = (await session.execute(
+                select(UserRating).where(UserRating.user_id == USER_ID)
+            )).scalar_one()
+            mascots = len((await session.execute(
+                select(Mascot.id).where(Mascot.user_id == USER_ID)
+            )).all())
+            await _delete_user(session, USER_ID)
+        return rating, mascots
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.parametrize("buffered", [False, True], ids=["direct", "buffered"])
+def test_concurrent_rolls_lose_no_updates(migrated_database, buffered):
+    random.seed(19)
+    mascots_info = [roll_mascot_info() for _ in range(ROLLS)]
+
+    rating, mascots = asyncio.run(_roll_concurrently(mascots_info, buffered))
+
+    assert mascots == ROLLS
+    assert rating.total_mascots == ROLLS
+    rarities = [rarity for mascot_info in mascots_info for rarity in get_mascot_rarities(mascot_info)]
+    for rarity, column in RARITY_COUNTERS.items():
+        assert getattr(rating, column) == rarities.count(rarity)
+    assert rating.rating_score == max(calculate_mascot_score(mascot_info) for mascot_info in mascots_info)
+
+
+async def _ranking_after_rolls():
+    """Параллельные броски игроков PLAYER_IDS; распределение по БД после них"""
+    engine.echo = False
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def roll(user_id):
+        async with semaphore:
+            await _roll(user_id, roll_mascot_info())
+
+    try:
+        async with await get_session_ctx() as session:
+            for user_id in PLAYER_IDS:
+                await _delete_user(session, user_id)
+            score_ranking.load(await get_score_histogram(session))
+        # Строки рейтинга уже есть: параллельные броски их обновляют
+        for user_id in PLAYER_IDS:
+            await _roll(user_id, roll_mascot_info())
+
+        await asyncio.gather(*(roll(user_id) for _ in range(ROLLS // len(PLAYER_IDS)) for user_id in PLAYER_IDS))
+
+        async with await get_session_ctx() as session:
+            expected = ScoreRanking()
+            expected.load(await get_score_histogram(session))
+            for user_id in PLAYER_IDS:
+                await _delete_user(session, user_id)
+        return expected
+    finally:
+        await engine.dispose()
+
+
+def test_concurrent_rolls_keep_ranking_exact(migrated_database):
+    random.seed(17)
+    expected = asyncio.run(_ranking_after_rolls())
+
+    # Рейтинги до бросков читаются из заблокированных строк, а не из снимка начала запроса
+    assert score_ranking.loaded
+    assert score_ranking.total == expected.total
+    assert [score_ranking.rank(score) for score in range(score_ranking.max_score + 1)] == [
+        expected.rank(score) for score in range(expected.max_score + 1)
+    ]
+
+
+async def _first_rolls_race():
+    engine.echo = False
+    user_id = PLAYER_IDS[0]
+    try:
+        async with await get_session_ctx() as session:
+            await _delete_user(session, user_id)
+            score_ranking.load(await get_score_histogram(session))
+        total = score_ranking.total
+
+        async with await get_session_ctx() as first, await get_session_ctx() as second:
+            await add_mascot(first, user_id, roll_mascot_info())
+            # Второй первый бросок того же игрока ждет, пока первый вставит строку рейтинга
+            racing = asyncio.create_task(add_mascot(second, user_id, roll_mascot_info()))
+            await asyncio.sleep(0.2)
+            assert not racing.done()
+            await first.commit()
+            assert score_ranking.loaded and score_ranking.total == total + 1
+            await racing
+            await second.commit()
+        loaded = score_ranking.loaded
+
+        async with await get_session_ctx() as session:
+            await _delete_user(session, user_id)
+        return loaded
+    finally:
+        await engine.dispose()
+
+
+def test_racing_first_rolls_invalidate_ranking(migrated_database):
+    random.seed(18)
+    # Второй бросок не знает, каким был рейтинг, вставленный первым: места считаются по БД до сверки
+    assert not asyncio.run(_first_rolls_race())
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from utils.storage import MemoryStateBackend, RedisStateBackend, StateStore
+
+fakeredis = pytest.importorskip("fakeredis")
+
+VALUE = {"history": [{"role": "user", "text": "Привет"}], "step": 1}
+
+
+def _redis_backend():
+    backend = RedisStateBackend("redis://localhost:6379/0")
+    # Клиент redis подключается лениво: подменяем его до первого запроса
+    backend._redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return backend
+
+
+def test_redis_get_set_with_ttl():
+    async def scenario():
+        backend = _redis_backend()
+        store = StateStore("test", backend, ttl=100)
+
+        await store.set(1, VALUE)
+        assert await backend._redis.ttl("test:1") == 100
+        await backend._redis.expire("test:1", 5)
+
+        # GETEX читает значение и возвращает ключу срок жизни хранилища
+        assert await store.get(1) == VALUE
+        assert await backend._redis.ttl("test:1") > 90
+
+        await store.delete(1)
+        assert await store.get(1, "нет") == "нет"
+        await backend.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_state_expires():
+    async def scenario():
+        backend = _redis_backend()
+        store = StateStore("test", backend, ttl=1)
+
+        await store.set(1, VALUE)
+        assert await store.get(1) == VALUE
+        # Без обращений состояние истекает через ttl
+        await asyncio.sleep(1.2)
+        assert await store.get(1) is None
+        assert await backend._redis.exists("test:1") == 0
+        await backend.close()
+
+    asyncio.run(scenario())
+
+
+def test_redis_get_stats():
+    backend = _redis_backend()
+    assert backend.get_stats() == {"url": "redis://localhost:6379/0"}
+    asyncio.run(backend.close())
+
+
+def test_memory_counts_encoded_bytes():
+    async def scenario():
+        backend = MemoryStateBackend()
+        await backend.set("ключ", "значение", 10)
+        assert backend.get_stats()["bytes"] == len("ключ".encode()) + len("значение".encode())
+        await backend.delete("ключ")
+        assert backend.get_stats()["bytes"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_memory_evicts_least_recently_used():
+    async def scenario():
+        backend = MemoryStateBackend(max_bytes=20)
+        await backend.set("a", "x" * 8, 10)
+        await backend.set("b", "y" * 8, 10)
+        await backend.get("a", 10)
+        await backend.set("c", "z" * 8, 10)
+
+        assert await backend.get("b", 10) is None
+        assert await backend.get("a", 10) == "x" * 8
+        assert backend.get_stats()["evicted"] == 1
+
+    asyncio.run(scenario())
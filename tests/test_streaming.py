@@ -0,0 +1,44 @@
+import asyncio
+
+from utils.streaming import answer_streamed
+
+
+class _SentMessage:
+    async def edit_text(self, text):
+        pass
+
+
+class _Message:
+    def __init__(self):
+        self.answers = []
+
+    async def answer(self, text):
+        self.answers.append(text)
+        return _SentMessage()
+
+
+async def _chunks(*texts, error=None):
+    for text in texts:
+        yield text
+    if error:
+        raise error
+
+
+async def _fallback():
+    return "ответ целиком"
+
+
+def _answer(chunks):
+    return asyncio.run(answer_streamed(_Message(), chunks, _fallback))
+
+
+def test_completed_stream():
+    assert _answer(_chunks("Привет", "Привет, мир")) == ("Привет, мир", True)
+
+
+def test_interrupted_stream_is_not_completed():
+    assert _answer(_chunks("Привет", error=RuntimeError("обрыв"))) == ("Привет", False)
+
+
+def test_fallback_is_not_completed():
+    assert _answer(_chunks(error=RuntimeError("нет потока"))) == ("ответ целиком", False)
@@ -0,0 +1,134 @@
+import asyncio
+import queue
+
+import pytest
+from aiogram.types import Update
+
+import supervisor as supervisor_module
+from supervisor import ParkedUpdates, Supervisor, poll_updates, update_user_id
+
+
+def _message(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Блин"},
+            "text": "привет",
+        },
+    }
+
+
+def _received(supervisor, index):
+    """Забирает все, что лежит в очереди воркера; empty() врет, пока поток очереди не дописал данные"""
+    update_ids = []
+    while True:
+        try:
+            update_ids.append(supervisor._queues[index].get(timeout=0.2)["update_id"])
+        except queue.Empty:
+            return update_ids
+
+
+@pytest.fixture
+def supervisor():
+    # Воркеры не запускаются: проверяется только раскладка по очередям
+    supervisor = Supervisor(workers=2, queue_size=1)
+    yield supervisor
+    for update_queue in supervisor._queues:
+        update_queue.close()
+
+
+@pytest.mark.parametrize("update, user_id", [
+    (_message(1, 42), 42),
+    ({"update_id": 1, "callback_query": {"id": "1", "from": {"id": 7}, "data": "top_players"}}, 7),
+    ({"update_id": 1, "my_chat_member": {"chat": {"id": 5}, "from": {"id": 9}}}, 9),
+    ({"update_id": 1, "message_reaction": {"chat": {"id": -100}, "date": 0}}, -100),
+    ({"update_id": 1, "channel_post": {"chat": {"id": -200}}}, 0),
+])
+def test_update_user_id(update, user_id):
+    assert update_user_id(update) == user_id
+
+
+def test_route_keeps_user_on_one_worker(supervisor):
+    assert supervisor.route(_message(1, 3))
+    assert supervisor.route(_message(2, 4))
+    assert _received(supervisor, 1) == [1]
+    assert _received(supervisor, 0) == [2]
+
+
+def test_route_rejects_when_worker_queue_is_full(supervisor):
+    assert supervisor.route(_message(1, 2))
+    assert not supervisor.route(_message(2, 4))
+    # Очередь другого воркера свободна
+    assert supervisor.route(_message(3, 1))
+    assert supervisor.get_stats()["rejected"] == 1
+
+
+def test_parked_updates_do_not_block_other_workers(supervisor):
+    parked = ParkedUpdates(supervisor)
+    parked.offer(_message(1, 2))
+    parked.offer(_message(2, 4))
+    parked.offer(_message(3, 1))
+    assert (len(parked), parked.first_update_id()) == (1, 2)
+    assert _received(supervisor, 1) == [3]
+
+    # Пока у воркера есть отложенные, новые встают за ними, даже если место освободилось
+    assert _received(supervisor, 0) == [1]
+    parked.offer(_message(4, 2))
+    assert len(parked) == 2
+
+    parked.flush()
+    assert _received(supervisor, 0) == [2]
+    parked.flush()
+    assert _received(supervisor, 0) == [4]
+    assert (len(parked), parked.first_update_id()) == (0, None)
+
+
+class _StopPolling(Exception):
+    pass
+
+
+class _Bot:
+    """Telegram, который выдает обновления начиная с offset; step вызывается перед каждой выдачей"""
+
+    def __init__(self, supervisor, updates, steps):
+        self.supervisor = supervisor
+        self.updates = [Update.model_validate(update) for update in updates]
+        self.steps = list(steps)
+        self.offsets = []
+
+    async def delete_webhook(self, drop_pending_updates):
+        pass
+
+    async def get_updates(self, offset, timeout, allowed_updates):
+        self.offsets.append(offset)
+        if not self.steps:
+            raise _StopPolling()
+        self.steps.pop(0)(self.supervisor)
+        return [update for update in self.updates if offset is None or update.update_id >= offset]
+
+
+def test_poll_holds_offset_at_first_parked_update(supervisor, monkeypatch):
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(supervisor_module.asyncio, "sleep", sleep)
+    received = {0: [], 1: []}
+
+    def nothing(supervisor):
+        pass
+
+    def worker_0_takes_one(supervisor):
+        received[0].extend(_received(supervisor, 0))
+
+    bot = _Bot(supervisor, [_message(1, 2), _message(2, 4), _message(3, 1)], [nothing, worker_0_takes_one])
+    with pytest.raises(_StopPolling):
+        asyncio.run(poll_updates(supervisor, bot))
+
+    # Второе обновление ждало места у воркера 0, третье ушло воркеру 1 сразу
+    assert bot.offsets == [None, 2, 4]
+    received[0].extend(_received(supervisor, 0))
+    assert received[0] == [1, 2]
+    assert _received(supervisor, 1) == [3]
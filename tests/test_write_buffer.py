@@ -0,0 +1,114 @@
+import asyncio
+import gc
+import logging
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from utils import write_buffer
+from utils.write_buffer import MascotWriteBuffer
+
+
+class _Session:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def commit(self):
+        pass
+
+
+class _Writer:
+    """write_mascots, который падает заданными ошибками, а потом пишет"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.next_id = 1
+
+    async def __call__(self, session, rolls):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        mascot_ids = {}
+        for user_id, _ in rolls:
+            mascot_ids.setdefault(user_id, []).append(self.next_id)
+            self.next_id += 1
+        return mascot_ids
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    async def get_session_ctx():
+        return _Session()
+
+    monkeypatch.setattr(write_buffer, "get_session_ctx", get_session_ctx)
+    monkeypatch.setattr(write_buffer, "RETRY_DELAYS", (0, 0, 0))
+
+    def install(*errors):
+        fake = _Writer(*errors)
+        monkeypatch.setattr(write_buffer, "write_mascots", fake)
+        return fake
+
+    return install
+
+
+def _run(scenario):
+    async def main():
+        buffer = MascotWriteBuffer(flush_interval=0.01, batch_size=10)
+        buffer.start()
+        try:
+            return await scenario(buffer)
+        finally:
+            await buffer.shutdown()
+
+    return asyncio.run(main())
+
+
+def _operational_error():
+    return OperationalError("INSERT", {}, ConnectionResetError("соединение разорвано"))
+
+
+def test_transient_errors_are_retried(writer):
+    fake = writer(_operational_error(), _operational_error())
+
+    async def scenario(buffer):
+        return await (await buffer.submit(1, [{}]))
+
+    assert _run(scenario) == [1]
+    assert fake.calls == 3
+
+
+def test_bad_batch_is_dropped_and_later_batches_are_written(writer):
+    fake = writer(IntegrityError("INSERT", {}, ValueError("нарушено ограничение")))
+
+    async def scenario(buffer):
+        failed = await buffer.submit(1, [{}])
+        with pytest.raises(IntegrityError):
+            await failed
+        written = await (await buffer.submit(2, [{}]))
+        return written, buffer.get_stats()
+
+    written, stats = _run(scenario)
+    assert written == [1]
+    assert fake.calls == 2
+    assert stats["lost"] == 1 and stats["written"] == 1
+
+
+def test_retries_are_bounded(writer, caplog):
+    fake = writer(*(_operational_error() for _ in range(10)))
+
+    async def scenario(buffer):
+        # Никто не ждет future, как в store_mascots: исключение не должно остаться незабранным
+        await buffer.submit(1, [{}])
+        await asyncio.sleep(0.1)
+        return buffer.get_stats()
+
+    with caplog.at_level(logging.ERROR, logger="asyncio"):
+        stats = _run(scenario)
+        gc.collect()
+    assert fake.calls == len(write_buffer.RETRY_DELAYS) + 1
+    assert stats["lost"] == 1
+    assert "never retrieved" not in caplog.text
@@ -0,0 +1,80 @@
+import asyncio
+from contextlib import aclosing
+
+import pytest
+
+from models.yandex_gpt import YandexGPTClient, YandexGPTTimeoutError
+
+
+class _Result:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Model:
+    """Модель SDK, которая отдает куски ответа и запоминает, закрыт ли поток"""
+
+    def __init__(self, *texts, stall=False):
+        self.texts = texts
+        self.stall = stall
+        self.closed = False
+
+    async def run_stream(self, messages, timeout):
+        try:
+            for text in self.texts:
+                yield _Result(text)
+            if self.stall:
+                await asyncio.sleep(10)
+        finally:
+            self.closed = True
+
+
+def _client(model):
+    client = YandexGPTClient("folder", "key", timeout=0.05)
+    client._sdk = object()
+    client._model = model
+    return client
+
+
+MESSAGES = [{"role": "user", "text": "привет"}]
+
+
+def test_stream_reads_whole_answer():
+    model = _Model("При", "Привет")
+    client = _client(model)
+
+    async def main():
+        return [text async for text in client.stream(MESSAGES)]
+
+    assert asyncio.run(main()) == ["При", "Привет"]
+    assert model.closed
+    assert client.get_stats()["completed"] == 1
+
+
+def test_stream_closed_early_closes_sdk_stream():
+    model = _Model("При", "Привет", "Привет, мир")
+    client = _client(model)
+
+    async def main():
+        async with aclosing(client.stream(MESSAGES)) as stream:
+            async for text in stream:
+                break
+        # Поток SDK закрыт сразу, а не при следующем обороте event loop
+        return text, model.closed
+
+    assert asyncio.run(main()) == ("При", True)
+    assert client.get_stats()["in_flight"] == 0
+
+
+def test_stalled_stream_times_out_and_is_closed():
+    model = _Model("При", stall=True)
+    client = _client(model)
+
+    async def main():
+        async for _ in client.stream(MESSAGES):
+            pass
+
+    with pytest.raises(YandexGPTTimeoutError):
+        asyncio.run(main())
+    assert model.closed
+    assert client.get_stats()["timeouts"] == 1
@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import random
+import time
+import timeit
+
+from config import MASCOT_SVG_TEMPLATE_PATH
+from utils.generate_blin import (
+    load_svg, modify_svg_colors, replace_hat, select_by_rarity, roll_mascot_info, mascot_key,
+    build_mascot_svg
+)
+
+
+def _report(name, seconds, number):
+    """Печатает время одной операции"""
+    print(f"{name:<40} {seconds / number * 1e6:10.1f} мкс/операция")
+
+
+def bench_svg(args):
+    """Сборка SVG на один бросок: чтение файла и regex-замены против скомпилированного шаблона"""
+    from utils.svg_template import render_mascot_svg
+
+    random.seed(args.seed)
+    keys = [mascot_key(roll_mascot_info()) for _ in range(args.number)]
+
+    def regex_build():
+        for key in keys:
+            build_mascot_svg(load_svg(MASCOT_SVG_TEMPLATE_PATH), key)
+
+    def compiled_build():
+        for key in keys:
+            render_mascot_svg(key)
+
+    def regex_roll():
+        svg_content = load_svg(MASCOT_SVG_TEMPLATE_PATH)
+        modified_svg, _ = modify_svg_colors(svg_content)
+        replace_hat(modified_svg, select_by_rarity())
+
+    def compiled_roll():
+        render_mascot_svg(mascot_key(roll_mascot_info()))
+
+    print("Только сборка SVG:")
+    _report("regex (load_svg + re.sub)", timeit.timeit(regex_build, number=1), args.number)
+    _report("скомпилированный шаблон", timeit.timeit(compiled_build, number=1), args.number)
+
+    print("Бросок целиком (выбор характеристик + сборка SVG):")
+    random.seed(args.seed)
+    _report("regex (load_svg + re.sub)", timeit.timeit(regex_roll, number=args.number), args.number)
+    random.seed(args.seed)
+    _report("скомпилированный шаблон", timeit.timeit(compiled_roll, number=args.number), args.number)
+
+
+def bench_render(args):
+    """Рендер PNG: cairosvg по целому SVG против наложения слоев, с попиксельным сравнением"""
+    import io
+
+    from PIL import Image, ImageChops
+
+    from utils.layer_renderer import LayerRenderer
+    from utils.render_pool import svg_to_png
+    from utils.svg_template import render_mascot_svg
+
+    random.seed(args.seed)
+    keys = [mascot_key(roll_mascot_info()) for _ in range(args.number)]
+
+    renderer = LayerRenderer(load_svg(MASCOT_SVG_TEMPLATE_PATH), args.scale)
+    prepare_time = timeit.timeit(renderer.prepare, number=1)
+    print(f"Подготовка слоев: {prepare_time:.2f} с, слоев: {len(renderer._layers)}")
+
+    _report("cairosvg", timeit.timeit(
+        lambda: [svg_to_png(render_mascot_svg(key), args.scale) for key in keys], number=1
+    ), args.number)
+    _report("наложение слоев", timeit.timeit(
+        lambda: [renderer.render(key) for key in keys], number=1
+    ), args.number)
+
+    # Попиксельное сравнение на белом фоне (как картинку видит пользователь):
+    # максимальное отклонение канала и доля отличающихся пикселей
+    max_difference = 0
+    differing_pixels = 0
+    total_pixels = 0
+    for key in keys:
+        expected = Image.open(io.BytesIO(svg_to_png(render_mascot_svg(key), args.scale))).convert("RGBA")
+        actual = renderer.compose(key)
+        background = Image.new("RGBA", expected.size, (255, 255, 255, 255))
+        difference = ImageChops.difference(
+            Image.alpha_composite(background, expected).convert("RGB"),
+            Image.alpha_composite(background, actual).convert("RGB")
+        )
+        max_difference = max(max_difference, max(high for _, high in difference.getextrema()))
+        differing_pixels += sum(1 for pixel in difference.getdata() if max(pixel) > args.tolerance)
+        total_pixels += expected.width * expected.height
+
+    print(f"Максимальное отклонение канала: {max_difference}")
+    print(f"Пикселей с отклонением больше {args.tolerance}: {differing_pixels / total_pixels:.4%}")
+    if max_difference > args.tolerance:
+        raise SystemExit("Наложение слоев расходится с cairosvg сильнее допустимого")
+
+
+async def _delete_bench_user(session, user_id):
+    from sqlalchemy import delete
+
+    from models.models import Mascot, User, UserRating
+
+    await session.execute(delete(UserRating).where(UserRating.user_id == user_id))
+    await session.execute(delete(Mascot).where(Mascot.user_id == user_id))
+    await session.execute(delete(User).where(User.user_id == user_id))
+    await session.commit()
+
+
+async def _bench_rolls(args):
+    from sqlalchemy import select
+
+    from models.database import engine, get_session_ctx, init_db
+    from models.models import UserRating
+    from models.repository import RARITY_COUNTERS, add_mascot, calculate_mascot_score, get_mascot_rarities
+    from utils.write_buffer import mascot_writer
+
+    # SQL в лог не пишем: это и есть измеряемая работа
+    engine.echo = False
+    await init_db()
+
+    random.seed(args.seed)
+    mascots_info = [roll_mascot_info() for _ in range(args.number)]
+    async with await get_session_ctx() as session:
+        await _delete_bench_user(session, args.user_id)
+
+    # Все броски одного пользователя параллельно: каждый в своей сессии или через буфер записи
+    semaphore = asyncio.Semaphore(args.concurrency)
+    if args.buffered:
+        mascot_writer.start()
+
+    async def roll(mascot_info):
+        async with semaphore:
+            if args.buffered:
+                # Ждем записи в БД, чтобы мерить скорость сохранения, а не постановки в очередь
+                await (await mascot_writer.submit(args.user_id, [mascot_info]))
+            else:
+                async with await get_session_ctx() as session:
+                    await add_mascot(session, args.user_id, mascot_info)
+                    await session.commit()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(roll(mascot_info) for mascot_info in mascots_info))
+    elapsed = time.perf_counter() - started
+    print(f"Бросков: {args.number} за {elapsed:.2f} с ({args.number / elapsed:.0f} в секунду), "
+          f"параллельно: {args.concurrency}")
+    if args.buffered:
+        await mascot_writer.shutdown()
+        print(f"Буфер записи: {mascot_writer.get_stats()}")
+
+    # Ни одно увеличение счетчиков не должно потеряться
+    rarities = [rarity for mascot_info in mascots_info for rarity in get_mascot_rarities(mascot_info)]
+    expected = {column: rarities.count(rarity) for rarity, column in RARITY_COUNTERS.items()}
+    expected["total_mascots"] = args.number
+    expected["rating_score"] = max(calculate_mascot_score(mascot_info) for mascot_info in mascots_info)
+
+    async with await get_session_ctx() as session:
+        rating = (await session.execute(
+            select(UserRating).where(UserRating.user_id == args.user_id)
+        )).scalar_one()
+        actual = {column: getattr(rating, column) for column in expected}
+        await _delete_bench_user(session, args.user_id)
+    await engine.dispose()
+
+    if actual != expected:
+        raise SystemExit(f"Рейтинг разошелся с бросками: ожидалось {expected}, в базе {actual}")
+    print(f"Рейтинг сошелся с бросками: {actual}")
+
+
+def bench_rolls(args):
+    """Броски одного пользователя параллельно против базы из DATABASE_URL: скорость и отсутствие потерянных счетчиков"""
+    asyncio.run(_bench_rolls(args))
+
+
+async def _old_collection_screen(session, user_id):
+    """Экран коллекции до перехода на один запрос: все маскоты ради len() и четыре запроса рейтинга"""
+    from sqlalchemy import func, select
+
+    from models.models import User, UserRating
+    from models.repository import get_user_mascots
+
+    mascots = await get_user_mascots(session, user_id)
+    await session.execute(select(User).where(User.user_id == user_id))
+    rating = (await session.execute(select(UserRating).where(UserRating.user_id == user_id))).scalar_one()
+    score = (await session.execute(
+        select(UserRating.rating_score).where(UserRating.user_id == user_id)
+    )).scalar_one()
+    position = (await session.execute(
+        select(func.count()).where(UserRating.rating_score > score)
+    )).scalar() + 1
+    return len(mascots), rating.total_mascots, position
+
+
+async def _bench_screens(args):
+    from sqlalchemy import delete
+
+    from models.database import engine, get_session_ctx, init_db
+    from models.models import Mascot, User, UserRating
+    from models.ranking import refresh_score_ranking, score_ranking
+    from models.repository import get_user_rating, write_mascots
+
+    engine.echo = False
+    await init_db()
+    random.seed(args.seed)
+
+    # Служебные пользователи с отрицательными id: тяжелые с большой коллекцией и обычные для места в топе
+    heavy_users = [-(index + 1) for index in range(args.heavy_users)]
+    players = [-(args.heavy_users + index + 1) for index in range(args.players)]
+    user_ids = heavy_users + players
+
+    async def cleanup():
+        async with await get_session_ctx() as session:
+            for model in (UserRating, Mascot, User):
+                await session.execute(delete(model).where(model.user_id.in_(user_ids)))
+            await session.commit()
+
+    await cleanup()
+    started = time.perf_counter()
+    rolls = [(user_id, roll_mascot_info()) for user_id in heavy_users for _ in range(args.mascots)]
+    rolls += [(user_id, roll_mascot_info()) for user_id in players]
+    for offset in range(0, len(rolls), 5000):
+        async with await get_session_ctx() as session:
+            await write_mascots(session, rolls[offset:offset + 5000])
+            await session.commit()
+    print(f"Засеяно маскотов: {len(rolls)} за {time.perf_counter() - started:.1f} с")
+
+    async def measure(name, screen):
+        async with await get_session_ctx() as session:
+            await screen(session, heavy_users[0])
+            started = time.perf_counter()
+            for index in range(args.number):
+                await screen(session, heavy_users[index % len(heavy_users)])
+            elapsed = time.perf_counter() - started
+        print(f"{name:<45} {elapsed / args.number * 1000:10.2f} мс/экран")
+
+    try:
+        await measure("до: все маскоты + 4 запроса рейтинга", _old_collection_screen)
+        score_ranking.loaded = False
+        await measure("один запрос, место подзапросом", get_user_rating)
+        await refresh_score_ranking()
+        await measure("один запрос, место из памяти", get_user_rating)
+
+        # Место из памяти и из подзапроса должны совпадать
+        async with await get_session_ctx() as session:
+            for user_id in heavy_users:
+                from_memory = await get_user_rating(session, user_id)
+                score_ranking.loaded = False
+                from_sql = await get_user_rating(session, user_id)
+                score_ranking.loaded = True
+                if from_memory != from_sql:
+                    raise SystemExit(f"Рейтинг расходится: {from_memory} против {from_sql}")
+    finally:
+        if not args.keep:
+            await cleanup()
+        await engine.dispose()
+
+
+def bench_screens(args):
+    """Экраны коллекции и рейтинга против базы из DATABASE_URL с засеянными тяжелыми коллекциями"""
+    asyncio.run(_bench_screens(args))
+
+
+def _plan_nodes(plan):
+    """Все узлы плана из EXPLAIN (FORMAT JSON)"""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _plan_checks():
+    """Запрос, индекс, по которому он должен читаться, и таблица, которую нельзя читать целиком"""
+    from datetime import datetime
+
+    from models.repository import (
+        top_users_page_query, users_above_query, score_position_query, user_rating_query, user_mascots_page_query
+    )
+
+    cursor = (datetime(2025, 1, 1), 1000)
+    return [
+        ("первая страница топа", top_users_page_query(11), "ix_user_ratings_rating_score_user_id", "user_ratings"),
+        ("следующая страница топа", top_users_page_query(10, (42.0, 1000)),
+         "ix_user_ratings_rating_score_user_id", "user_ratings"),
+        ("игроки выше", users_above_query(42.0, 1000, 3), "ix_user_ratings_rating_score_user_id", "user_ratings"),
+        ("место по рейтингу", score_position_query(42.0), "ix_user_ratings_rating_score_user_id", "user_ratings"),
+        ("рейтинг игрока с местом", user_rating_query(1000, with_position=True),
+         "ix_user_ratings_rating_score_user_id", "user_ratings"),
+        ("страница коллекции", user_mascots_page_query(1000, 12, after=cursor),
+         "ix_mascots_user_id_created_at_id", "mascots"),
+        ("предыдущая страница коллекции", user_mascots_page_query(1000, 12, before=cursor),
+         "ix_mascots_user_id_created_at_id", "mascots"),
+        ("коллекция по редкости", user_mascots_page_query(1000, 12, after=cursor, hat_rarity="легендарный"),
+         "ix_mascots_user_id_hat_rarity_created_at_id", "mascots"),
+    ]
+
+
+async def explain_plans(session):
+    """Проверяет планы запросов топа и коллекции в session: [(запрос, проблемы, просмотры индексов)]"""
+    import json
+
+    from sqlalchemy import text
+    from sqlalchemy.dialects import postgresql
+
+    # Статистика после свежей миграции или засева может быть старой
+    await session.execute(text("ANALYZE user_ratings, mascots"))
+    # На маленькой базе полный просмотр дешевле индекса: проверяем, что индекс вообще подходит
+    await session.execute(text("SET enable_seqscan = off"))
+    await session.execute(text("SET enable_bitmapscan = off"))
+
+    reports = []
+    for name, query, index, table in _plan_checks():
+        sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        result = await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes = list(_plan_nodes(plan[0]["Plan"]))
+
+        problems = []
+        if not any(node.get("Index Name") == index for node in nodes):
+            problems.append(f"не использует {index}")
+        if any(node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table for node in nodes):
+            problems.append(f"читает {table} целиком")
+        if any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes):
+            problems.append("сортирует строки")
+        scans = ", ".join(f"{node['Node Type']} {node['Index Name']}" for node in nodes if node.get("Index Name"))
+        reports.append((name, problems, scans))
+    return reports
+
+
+async def _check_plans(args):
+    from models.database import engine, get_session_ctx
+
+    engine.echo = False
+    try:
+        async with await get_session_ctx() as session:
+            reports = await explain_plans(session)
+    finally:
+        await engine.dispose()
+
+    failures = []
+    for name, problems, scans in reports:
+        print(f"{name:<35} {'ошибка: ' + '; '.join(problems) if problems else 'ок'} ({scans})")
+        if problems:
+            failures.append(name)
+    if failures:
+        raise SystemExit(f"Планы запросов не те: {', '.join(failures)}")
+
+
+def check_plans(args):
+    """Планы запросов топа и коллекции против базы из DATABASE_URL: читаются по своим индексам без сортировки"""
+    asyncio.run(_check_plans(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих путей бота")
+    parser.add_argument("--seed", type=int, default=42)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    svg_parser = subparsers.add_parser("svg", help=bench_svg.__doc__)
+    svg_parser.add_argument("--number", type=int, default=10000)
+    svg_parser.set_defaults(func=bench_svg)
+
+    render_parser = subparsers.add_parser("render", help=bench_render.__doc__)
+    render_parser.add_argument("--number", type=int, default=200)
+    render_parser.add_argument("--scale", type=float, default=2.0)
+    render_parser.add_argument("--tolerance", type=int, default=2,
+                               help="Допустимое отклонение канала из-за округления при наложении")
+    render_parser.set_defaults(func=bench_render)
+
+    rolls_parser = subparsers.add_parser("rolls", help=bench_rolls.__doc__)
+    rolls_parser.add_argument("--number", type=int, default=2000)
+    rolls_parser.add_argument("--concurrency", type=int, default=10, help="Одновременных бросков")
+    rolls_parser.add_argument("--user-id", type=int, default=-1,
+                              help="Служебный пользователь; его данные удаляются до и после прогона")
+    rolls_parser.add_argument("--buffered", action="store_true", help="Писать броски через буфер записи")
+    rolls_parser.set_defaults(func=bench_rolls)
+
+    screens_parser = subparsers.add_parser("screens", help=bench_screens.__doc__)
+    screens_parser.add_argument("--number", type=int, default=10, help="Показов экрана")
+    screens_parser.add_argument("--mascots", type=int, default=100000, help="Маскотов у каждого тяжелого пользователя")
+    screens_parser.add_argument("--heavy-users", type=int, default=2)
+    screens_parser.add_argument("--players", type=int, default=10000, help="Игроков с одним маскотом")
+    screens_parser.add_argument("--keep", action="store_true", help="Не удалять засеянные данные")
+    screens_parser.set_defaults(func=bench_screens)
+
+    plans_parser = subparsers.add_parser("plans", help=check_plans.__doc__)
+    plans_parser.set_defaults(func=check_plans)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import math
+import weakref
+
+from config import (
+    ASSISTANT_PROMPT_TOKEN_BUDGET, ASSISTANT_SUMMARY_MAX_TOKENS, ASSISTANT_MAX_HISTORY, CHARS_PER_TOKEN
+)
+from models.yandex_gpt import gpt_client
+from utils.storage import user_sessions, conversation_summaries
+
+logger = logging.getLogger(__name__)
+
+# Служебные токены, которые модель тратит на каждое сообщение помимо текста
+MESSAGE_TOKEN_OVERHEAD = 4
+
+SUMMARY_PROMPT = """Ты ведешь краткие заметки о разговоре карьерного консультанта с пользователем.
+Обнови заметки, добавив в них новые реплики. Сохрани факты о пользователе: образование, опыт, цели,
+сомнения и уже данные советы. Пиши сжато, в третьем лице, не больше 10 предложений."""
+
+SUMMARY_HEADER = "Краткое содержание предыдущей части разговора:"
+
+# Пользователи, для которых уже идет фоновое обновление заметок
+_summarizing = {}
+# Блокировки истории по пользователям: чтение, изменение и запись истории не перемежаются.
+# Блокировка живет, пока ее кто-то держит или ждет
+_history_locks = weakref.WeakValueDictionary()
+
+
+def _history_lock(user_id):
+    lock = _history_locks.get(user_id)
+    if lock is None:
+        lock = _history_locks[user_id] = asyncio.Lock()
+    return lock
+
+
+def estimate_tokens(text):
+    """Грубая оценка числа токенов в тексте без обращения к токенизатору модели"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_tokens(message):
+    """Оценка токенов, которые сообщение занимает в запросе"""
+    return estimate_tokens(message["text"]) + MESSAGE_TOKEN_OVERHEAD
+
+
+def truncate_to_tokens(text, tokens):
+    """Обрезает текст так, чтобы он уложился в заданное число токенов"""
+    limit = max(0, tokens * CHARS_PER_TOKEN)
+    if len(text) <= limit:
+        return text
+    return text[:max(0, limit - 1)] + "…"
+
+
+async def start_conversation(user_id, system_prompt):
+    """Начинает новый диалог: только системный промпт и пустые заметки"""
+    async with _history_lock(user_id):
+        await user_sessions.set(user_id, [{"role": "system", "text": system_prompt}])
+        await conversation_summaries.delete(user_id)
+
+
+async def add_message(user_id, role, text, system_prompt=None):
+    """Добавляет реплику в историю; самые старые реплики сверх жесткого лимита отбрасываются.
+
+    Если история уже забыта по истечении срока хранения, с system_prompt диалог начинается заново.
+    """
+    async with _history_lock(user_id):
+        history = await user_sessions.get(user_id)
+        if history is None:
+            if system_prompt is None:
+                return
+            history = [{"role": "system", "text": system_prompt}]
+        history.append({"role": role, "text": text})
+        if len(history) - 1 > ASSISTANT_MAX_HISTORY:
+            # Заметки не успевают за диалогом: храним только последние реплики
+            del history[1:len(history) - ASSISTANT_MAX_HISTORY]
+        await user_sessions.set(user_id, history)
+
+
+async def build_prompt(user_id, budget=ASSISTANT_PROMPT_TOKEN_BUDGET):
+    """Собирает запрос к модели в пределах бюджета токенов.
+
+    В запрос попадают системный промпт, заметки о ранних репликах и столько последних реплик,
+    сколько помещается в бюджет. Не поместившиеся реплики фоново сворачиваются в заметки.
+    Если истории уже нет (истекла или вытеснена из хранилища), возвращает пустой список.
+    """
+    history = await user_sessions.get(user_id)
+    if not history:
+        return []
+    system, *turns = history
+    summary = await conversation_summaries.get(user_id)
+
+    prompt_head = [system]
+    if summary:
+        prompt_head.append({"role": "system", "text": f"{SUMMARY_HEADER}\n{summary}"})
+    left = budget - sum(message_tokens(message) for message in prompt_head)
+
+    recent = []
+    for message in reversed(turns):
+        tokens = message_tokens(message)
+        if tokens > left:
+            if not recent:
+                # Последняя реплика одна не влезает в бюджет: отправляем ее начало
+                text = truncate_to_tokens(message["text"], left - MESSAGE_TOKEN_OVERHEAD)
+                recent.append({"role": message["role"], "text": text})
+            break
+        recent.append(message)
+        left -= tokens
+    recent.reverse()
+
+    evicted = len(turns) - len(recent)
+    if evicted > 0:
+        schedule_summary(user_id, evicted)
+    return prompt_head + recent
+
+
+def schedule_summary(user_id, count):
+    """Фоново сворачивает count самых ранних реплик в заметки, если это еще не делается"""
+    if user_id in _summarizing:
+        return
+    _summarizing[user_id] = asyncio.create_task(_summarize(user_id, count))
+
+
+async def _summarize(user_id, count):
+    try:
+        history = await user_sessions.get(user_id)
+        if not history:
+            return
+        folded = history[1:1 + count]
+        summary = await conversation_summaries.get(user_id, "")
+
+        dialogue = "\n".join(
+            f"{'Пользователь' if message['role'] == 'user' else 'Консультант'}: {message['text']}"
+            for message in folded
+        )
+        messages = [
+            {"role": "system", "text": SUMMARY_PROMPT},
+            {"role": "user", "text": f"Текущие заметки:\n{summary or 'нет'}\n\nНовые реплики:\n{dialogue}"}
+        ]
+        try:
+            new_summary = await gpt_client.complete(messages, max_tokens=ASSISTANT_SUMMARY_MAX_TOKENS)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить заметки разговора пользователя {user_id}: {e}")
+            return
+
+        # Пока шел запрос, в историю добавлялись реплики, а диалог могли начать заново:
+        # перечитываем историю под блокировкой и убираем из нее только свернутые реплики
+        async with _history_lock(user_id):
+            history = await user_sessions.get(user_id)
+            if not history or history[1:1 + count] != folded:
+                return
+            del history[1:1 + count]
+            await conversation_summaries.set(user_id, new_summary.strip())
+            await user_sessions.set(user_id, history)
+        logger.info(f"Заметки разговора пользователя {user_id} обновлены: свернуто реплик {count}")
+    finally:
+        _summarizing.pop(user_id, None)
@@ -0,0 +1,81 @@
+import argparse
+import time
+
+from utils.generate_blin import RARITY_WEIGHTS, trait_sampler
+
+# Элементы маскота, у каждого своя редкость
+SLOTS = {
+    "Шапка": "hat_rarity",
+    "Тело": "body_rarity",
+    "Обводка": "stroke_rarity",
+}
+
+
+def simulate_numpy(rolls, seed):
+    """Бросает rolls маскотов через NumPy и возвращает частоты редкостей по элементам"""
+    import numpy as np
+
+    rarities = list(RARITY_WEIGHTS)
+    rarity_index = {rarity: index for index, rarity in enumerate(rarities)}
+
+    rng = np.random.default_rng(seed)
+    probabilities = np.asarray(trait_sampler.probabilities)
+    draws = rng.choice(len(trait_sampler.outcomes), size=rolls, p=probabilities / probabilities.sum())
+
+    counts = {}
+    for slot, field in SLOTS.items():
+        slot_rarities = np.array([rarity_index[getattr(traits, field)] for traits in trait_sampler.outcomes])
+        slot_counts = np.bincount(slot_rarities[draws], minlength=len(rarities))
+        counts[slot] = dict(zip(rarities, slot_counts.tolist()))
+    return counts
+
+
+def simulate_sampler(rolls, seed, chunk_size=100_000):
+    """Бросает rolls маскотов тем же сэмплером, что и бот"""
+    import random
+
+    random.seed(seed)
+    counts = {slot: {rarity: 0 for rarity in RARITY_WEIGHTS} for slot in SLOTS}
+    left = rolls
+    while left > 0:
+        batch = trait_sampler.roll_many(min(chunk_size, left))
+        for traits in batch:
+            for slot, field in SLOTS.items():
+                counts[slot][getattr(traits, field)] += 1
+        left -= len(batch)
+    return counts
+
+
+def print_report(counts, rolls):
+    """Печатает эмпирические частоты в сравнении с RARITY_WEIGHTS"""
+    total_weight = sum(RARITY_WEIGHTS.values())
+    for slot, slot_counts in counts.items():
+        print(f"\n{slot}:")
+        print(f"  {'редкость':<12} {'ожидается':>10} {'выпало':>10} {'отклонение':>11}")
+        for rarity, weight in RARITY_WEIGHTS.items():
+            expected = weight / total_weight
+            actual = slot_counts[rarity] / rolls
+            print(f"  {rarity:<12} {expected:>10.4%} {actual:>10.4%} {actual - expected:>+11.4%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симулятор выпадения редкостей маскотов")
+    parser.add_argument("--rolls", type=int, default=5_000_000, help="Количество бросков")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--engine", choices=["numpy", "sampler"], default="numpy",
+                        help="numpy - векторизованная симуляция, sampler - тот же код, что в боте")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.engine == "numpy":
+        counts = simulate_numpy(args.rolls, args.seed)
+    else:
+        counts = simulate_sampler(args.rolls, args.seed)
+    elapsed = time.perf_counter() - started
+
+    print(f"Бросков: {args.rolls:,}, время: {elapsed:.2f} с")
+    print_report(counts, args.rolls)
+
+
+if __name__ == "__main__":
+    main()
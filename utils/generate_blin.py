@@ -1,6 +1,8 @@
 import random
 import re
 import os
+from collections import namedtuple
+from itertools import accumulate
 from xml.etree import ElementTree as ET
 
 # Система редкости с весами
@@ -179,12 +181,98 @@ HAT_VARIANTS = {
 }
 
 
+# Смещение шапок по вертикали
+HAT_Y_OFFSETS = {
+    "Классическая шапка": 0,
+    "Простая кепка": -5,
+    "Шляпа с полями": 10,
+    "Шапка с помпоном": 10,
+    "Ковбойская шляпа": 15,
+    "Цилиндр": 5,
+    "Корона": 10,
+    "Шлем рыцаря": 5,
+    "Волшебная шляпа": 15,
+    "Космический шлем": 15
+}
+
+# Цвет обводки шапок
+HAT_STROKE_COLOR = "#AAAAAA"
+
+# Пути шапки в исходном шаблоне
+TEMPLATE_HAT_PATTERN = re.compile(
+    r'<path d="M113.5 84C90.8 84 79.45 102 79.45 114H147.55C147.55 102 136.2 84 113.5 84Z"[^/]+/>\s*<path d="M141.875 108H85.125C81.9907 108[^/]+/>'
+)
+
+# Шапки по названию
+HAT_BY_NAME = {
+    variant["name"]: variant
+    for variants in HAT_VARIANTS.values()
+    for variant in variants
+}
+
+
+# Редкости и накопленные веса, посчитанные один раз
+_RARITIES = list(RARITY_WEIGHTS.keys())
+_RARITY_CUM_WEIGHTS = list(accumulate(RARITY_WEIGHTS.values()))
+
+# Полный набор характеристик одного маскота
+MascotTraits = namedtuple(
+    "MascotTraits",
+    ["hat_name", "hat_rarity", "hat_color", "body_rarity", "body_color", "stroke_rarity", "stroke_color"]
+)
+
+
 def select_by_rarity():
     """Выбирает редкость на основе весов"""
-    rarities = list(RARITY_WEIGHTS.keys())
-    weights = list(RARITY_WEIGHTS.values())
-    chosen_rarity = random.choices(rarities, weights=weights, k=1)[0]
-    return chosen_rarity
+    return random.choices(_RARITIES, cum_weights=_RARITY_CUM_WEIGHTS, k=1)[0]
+
+
+def trait_distribution():
+    """Все возможные наборы характеристик маскота и их вероятности"""
+    total_weight = sum(RARITY_WEIGHTS.values())
+
+    hats = []
+    for rarity, variants in HAT_VARIANTS.items():
+        for variant in variants:
+            colors = HAT_COLORS[variant["name"]][rarity]
+            for color in colors:
+                probability = RARITY_WEIGHTS[rarity] / total_weight / len(variants) / len(colors)
+                hats.append(((variant["name"], rarity, color), probability))
+
+    def palette(part):
+        return [
+            ((rarity, color), RARITY_WEIGHTS[rarity] / total_weight / len(colors))
+            for rarity, colors in COLOR_PALETTES[part].items()
+            for color in colors
+        ]
+
+    return [
+        (MascotTraits(*hat, *body, *stroke), hat_p * body_p * stroke_p)
+        for hat, hat_p in hats
+        for body, body_p in palette("body")
+        for stroke, stroke_p in palette("stroke")
+    ]
+
+
+class TraitSampler:
+    """Выбор характеристик маскота по заранее посчитанной таблице накопленных вероятностей"""
+
+    def __init__(self, distribution):
+        self.outcomes = [traits for traits, _ in distribution]
+        self.probabilities = [probability for _, probability in distribution]
+        self._cum_weights = list(accumulate(self.probabilities))
+
+    def roll(self):
+        """Один бросок"""
+        return random.choices(self.outcomes, cum_weights=self._cum_weights, k=1)[0]
+
+    def roll_many(self, n):
+        """n бросков одним вызовом"""
+        return random.choices(self.outcomes, cum_weights=self._cum_weights, k=n)
+
+
+# Общий сэмплер характеристик
+trait_sampler = TraitSampler(trait_distribution())
 
 
 def load_svg(file_path):
@@ -234,36 +322,79 @@ def replace_hat(svg_content, hat_rarity=None):
 
     # Выбираем цвет шапки соответствующий её типу и редкости
     hat_color = random.choice(HAT_COLORS[hat_name][hat_rarity])
-    hat_stroke_color = "#AAAAAA"
-
-    # Добавляем смещение по вертикали в зависимости от типа шапки
-    y_offset = {
-        "Классическая шапка": 0,
-        "Простая кепка": -5,
-        "Шляпа с полями": 10,
-        "Шапка с помпоном": 10,
-        "Ковбойская шляпа": 15,
-        "Цилиндр": 5,
-        "Корона": 10,
-        "Шлем рыцаря": 5,
-        "Волшебная шляпа": 15,
-        "Космический шлем": 15
-    }.get(hat_name, 0)
+
+    modified_svg = insert_hat(svg_content, hat_variant, hat_color)
+
+    return modified_svg, {"name": hat_name, "rarity": hat_rarity, "color": hat_color}
+
+
+def build_hat_group(hat_variant, hat_color):
+    """Собирает группу SVG с шапкой, смещенной по вертикали в зависимости от типа"""
+    y_offset = HAT_Y_OFFSETS.get(hat_variant["name"], 0)
 
     # Применяем смещение к SVG с помощью группы и трансформации
     hat_group = f'<g transform="translate(0, {y_offset})">'
-    hat_paths = f'<path d="{hat_variant["path1"]}" fill="{hat_color}" stroke="{hat_stroke_color}" stroke-width="3"/>'
-    hat_paths += f'<path d="{hat_variant["path2"]}" fill="{hat_color}" stroke="{hat_stroke_color}" stroke-width="3"/>'
+    hat_paths = f'<path d="{hat_variant["path1"]}" fill="{hat_color}" stroke="{HAT_STROKE_COLOR}" stroke-width="3"/>'
+    hat_paths += f'<path d="{hat_variant["path2"]}" fill="{hat_color}" stroke="{HAT_STROKE_COLOR}" stroke-width="3"/>'
     hat_group += hat_paths + '</g>'
+    return hat_group
+
+
+def insert_hat(svg_content, hat_variant, hat_color):
+    """Подставляет в SVG заданную шапку заданного цвета"""
+    hat_group = build_hat_group(hat_variant, hat_color)
 
     # Заменяем старые пути шапки на новую группу с трансформацией
+    modified_svg = TEMPLATE_HAT_PATTERN.sub(hat_group, svg_content)
+
+    return modified_svg
+
+
+def traits_to_mascot_info(traits):
+    """Преобразует набор характеристик в описание маскота"""
+    return {
+        "hat": {"name": traits.hat_name, "rarity": traits.hat_rarity, "color": traits.hat_color},
+        "body": {"color": traits.body_color, "rarity": traits.body_rarity},
+        "stroke": {"color": traits.stroke_color, "rarity": traits.stroke_rarity}
+    }
+
+
+def roll_mascot_info():
+    """Случайно выбирает шапку, цвет тела и цвет обводки маскота с учетом редкости"""
+    return traits_to_mascot_info(trait_sampler.roll())
+
+
+def mascot_key(mascot_info):
+    """Ключ изображения маскота: (шапка, цвет шапки, цвет тела, цвет обводки)"""
+    return (
+        mascot_info["hat"]["name"],
+        mascot_info["hat"]["color"],
+        mascot_info["body"]["color"],
+        mascot_info["stroke"]["color"]
+    )
+
+
+def build_mascot_svg(svg_content, key):
+    """Собирает SVG маскота по ключу изображения"""
+    hat_name, hat_color, body_color, stroke_color = key
+
     modified_svg = re.sub(
-        r'<path d="M113.5 84C90.8 84 79.45 102 79.45 114H147.55C147.55 102 136.2 84 113.5 84Z"[^/]+/>\s*<path d="M141.875 108H85.125C81.9907 108[^/]+/>',
-        hat_group,
+        r'<stop offset="1" stop-color="#E39D3A"/>',
+        f'<stop offset="1" stop-color="{body_color}"/>',
         svg_content
     )
+    modified_svg = re.sub(r'stroke="#8A5C1E"', f'stroke="{stroke_color}"', modified_svg)
 
-    return modified_svg, {"name": hat_name, "rarity": hat_rarity, "color": hat_color}
+    return insert_hat(modified_svg, HAT_BY_NAME[hat_name], hat_color)
+
+
+def mascot_key_probabilities():
+    """Вероятности выпадения всех ключей изображений маскота"""
+    probabilities = {}
+    for traits, probability in trait_distribution():
+        key = (traits.hat_name, traits.hat_color, traits.body_color, traits.stroke_color)
+        probabilities[key] = probabilities.get(key, 0.0) + probability
+    return probabilities
 
 def generate_mascot_variations(input_svg_path, output_dir, count=5):
     """Генерирует несколько вариаций маскота с учетом редкости элементов"""
@@ -0,0 +1,179 @@
+import copy
+import io
+from xml.etree import ElementTree as ET
+
+import cairosvg
+from PIL import Image
+
+from config import MASCOT_SVG_TEMPLATE_PATH
+from utils.generate_blin import load_svg, build_hat_group, HAT_BY_NAME, COLOR_PALETTES
+from utils.svg_template import HAT_FRAGMENTS
+
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+ET.register_namespace("", SVG_NAMESPACE)
+
+# Цвета шаблона, которые заменяются при броске
+TEMPLATE_BODY_COLOR = "#E39D3A"
+TEMPLATE_STROKE_COLOR = "#8A5C1E"
+TEMPLATE_HAT_STROKE_COLOR = "#CCCCCC"
+
+# Виды слоев: неизменный, тело (градиент), обводка, шапка
+STATIC, BODY, STROKE, HAT = "static", "body", "stroke", "hat"
+
+
+def _local_name(element):
+    return element.tag.rsplit("}", 1)[-1]
+
+
+class LayerRenderer:
+    """Собирает PNG маскота наложением заранее растеризованных RGBA-слоев"""
+
+    def __init__(self, svg_content, scale=2.0, compress_level=6):
+        self.scale = scale
+        self.compress_level = compress_level
+
+        self._svg_open = svg_content[:svg_content.index(">", svg_content.index("<svg")) + 1]
+        root = ET.fromstring(svg_content)
+
+        self._defs = None
+        elements = []
+        for element in root:
+            if _local_name(element) == "defs":
+                self._defs = element
+                continue
+
+            if element.get("fill", "").startswith("url("):
+                # Тело: заливка градиентом и обводка рисуются отдельными слоями, порядок тот же
+                fill_part = copy.deepcopy(element)
+                fill_part.set("stroke", "none")
+                elements.append((BODY, fill_part))
+                if element.get("stroke") == TEMPLATE_STROKE_COLOR:
+                    stroke_part = copy.deepcopy(element)
+                    stroke_part.set("fill", "none")
+                    elements.append((STROKE, stroke_part))
+            elif element.get("stroke") == TEMPLATE_HAT_STROKE_COLOR:
+                elements.append((HAT, element))
+            elif element.get("stroke") == TEMPLATE_STROKE_COLOR:
+                elements.append((STROKE, element))
+            else:
+                elements.append((STATIC, element))
+
+        self._segments = self._group(elements)
+        self._layers = {}
+        self._size = None
+
+    @staticmethod
+    def _group(elements):
+        """Объединяет подряд идущие элементы одного вида в слои"""
+        segments = []
+        for kind, element in elements:
+            if segments and segments[-1][0] == kind:
+                segments[-1][1].append(element)
+            else:
+                segments.append((kind, [element]))
+
+        # Неизменные элементы между двумя кусками обводки рисуются в том же слое обводки
+        merged = []
+        for kind, items in segments:
+            if (kind == STROKE and len(merged) >= 2
+                    and merged[-1][0] == STATIC and merged[-2][0] == STROKE):
+                static_items = merged.pop()[1]
+                merged[-1][1].extend(static_items + items)
+            else:
+                merged.append((kind, items))
+
+        # Шапка в шаблоне одна: все ее элементы заменяются одной группой
+        return [(kind, items if kind != HAT else []) for kind, items in merged]
+
+    def _segment_svg(self, kind, items, value):
+        parts = [self._svg_open]
+        for element in items:
+            if kind == STROKE and element.get("stroke") == TEMPLATE_STROKE_COLOR:
+                element = copy.deepcopy(element)
+                element.set("stroke", value)
+            parts.append(ET.tostring(element, encoding="unicode"))
+
+        if kind == HAT:
+            hat_name, hat_color = value
+            parts.append(HAT_FRAGMENTS.get(value) or build_hat_group(HAT_BY_NAME[hat_name], hat_color))
+
+        if kind == BODY and self._defs is not None:
+            defs = copy.deepcopy(self._defs)
+            for stop in defs.iter(f"{{{SVG_NAMESPACE}}}stop"):
+                if stop.get("offset") == "1" and stop.get("stop-color") == TEMPLATE_BODY_COLOR:
+                    stop.set("stop-color", value)
+            parts.append(ET.tostring(defs, encoding="unicode"))
+
+        parts.append("</svg>")
+        return "".join(parts)
+
+    def _layer(self, index, value):
+        """Возвращает слой (обрезанное RGBA-изображение и его смещение), растеризуя его один раз"""
+        layer_key = (index, value)
+        if layer_key in self._layers:
+            return self._layers[layer_key]
+
+        kind, items = self._segments[index]
+        png_data = cairosvg.svg2png(bytestring=self._segment_svg(kind, items, value), scale=self.scale)
+        image = Image.open(io.BytesIO(png_data)).convert("RGBA")
+        if self._size is None:
+            self._size = image.size
+
+        # Храним только непрозрачную часть слоя, чтобы слои занимали меньше памяти
+        bbox = image.getbbox()
+        layer = (image.crop(bbox), bbox[:2]) if bbox else None
+        self._layers[layer_key] = layer
+        return layer
+
+    def _segment_value(self, kind, key):
+        hat_name, hat_color, body_color, stroke_color = key
+        return {
+            STATIC: None,
+            BODY: body_color,
+            STROKE: stroke_color,
+            HAT: (hat_name, hat_color),
+        }[kind]
+
+    def prepare(self):
+        """Растеризует заранее все слои для всех известных цветов и шапок"""
+        values = {
+            STATIC: [None],
+            BODY: [color for colors in COLOR_PALETTES["body"].values() for color in colors],
+            STROKE: [color for colors in COLOR_PALETTES["stroke"].values() for color in colors],
+            HAT: list(HAT_FRAGMENTS),
+        }
+        for index, (kind, _) in enumerate(self._segments):
+            for value in values[kind]:
+                self._layer(index, value)
+
+    def compose(self, key):
+        """Накладывает слои маскота друг на друга и возвращает RGBA-изображение"""
+        layers = [
+            self._layer(index, self._segment_value(kind, key))
+            for index, (kind, _) in enumerate(self._segments)
+        ]
+        canvas = Image.new("RGBA", self._size, (0, 0, 0, 0))
+        for layer in layers:
+            if layer is not None:
+                image, offset = layer
+                canvas.alpha_composite(image, dest=offset)
+        return canvas
+
+    def render(self, key):
+        """Возвращает PNG маскота по ключу изображения"""
+        buffer = io.BytesIO()
+        self.compose(key).save(buffer, format="PNG", compress_level=self.compress_level)
+        return buffer.getvalue()
+
+
+# Слои растеризуются лениво и живут в памяти процесса-воркера
+_renderers = {}
+
+
+def render_mascot_layers(key, scale=2.0):
+    """Рендерит маскота наложением слоев (выполняется в воркере пула)"""
+    renderer = _renderers.get(scale)
+    if renderer is None:
+        renderer = LayerRenderer(load_svg(MASCOT_SVG_TEMPLATE_PATH), scale)
+        _renderers[scale] = renderer
+    return renderer.render(key)
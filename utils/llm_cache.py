@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_messages(messages):
+    """Приводит сообщения к каноничному виду: роли и текст без лишних пробелов"""
+    return [(msg["role"], " ".join(msg["text"].split())) for msg in messages]
+
+
+def cache_key(messages, namespace=""):
+    """Ключ кэша по нормализованным сообщениям; namespace отделяет модели и их параметры"""
+    payload = json.dumps([namespace, normalize_messages(messages)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryLRUBackend:
+    """Ответы в памяти процесса с вытеснением давно не использованных"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return text
+
+    async def set(self, key, text, ttl):
+        self._entries[key] = (time.time() + ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class DiskBackend:
+    """Ответы в файлах каталога, переживают перезапуск бота"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_file(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry["expires_at"] <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry["text"]
+
+    def _write_file(self, path, entry):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    async def get(self, key):
+        return await asyncio.to_thread(self._read_file, self._path(key))
+
+    async def set(self, key, text, ttl):
+        entry = {"expires_at": time.time() + ttl, "text": text}
+        try:
+            await asyncio.to_thread(self._write_file, self._path(key), entry)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить ответ модели в дисковый кэш: {e}")
+
+
+class LLMCache:
+    """Кэш ответов модели: одинаковые одновременные запросы ждут один вызов, ответы с ttl хранятся в backend"""
+
+    def __init__(self, backend, namespace=""):
+        self.backend = backend
+        self.namespace = namespace
+
+        self._in_flight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def key(self, messages):
+        return cache_key(messages, self.namespace)
+
+    async def get(self, messages):
+        """Возвращает сохраненный ответ или None"""
+        text = await self.backend.get(self.key(messages))
+        if text is not None:
+            self.hits += 1
+        return text
+
+    async def put(self, messages, text, ttl):
+        """Сохраняет ответ на ttl секунд"""
+        if ttl:
+            await self.backend.set(self.key(messages), text, ttl)
+
+    async def _call_and_store(self, key, call, ttl):
+        try:
+            text = await call()
+            if ttl:
+                await self.backend.set(key, text, ttl)
+            return text
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def fetch(self, messages, call, ttl=None):
+        """Возвращает ответ на messages, вызывая call() только если его нет в кэше и он еще не запрошен.
+
+        Без ttl ответ не сохраняется: одинаковые запросы лишь объединяются, пока первый выполняется.
+        """
+        key = self.key(messages)
+        if ttl:
+            text = await self.backend.get(key)
+            if text is not None:
+                self.hits += 1
+                return text
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._call_and_store(key, call, ttl))
+            self._in_flight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def get_stats(self):
+        """Возвращает метрики кэша"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+def create_backend(kind, directory=None, max_entries=1024):
+    """Создает backend кэша по названию: memory или disk"""
+    if kind == "disk":
+        return DiskBackend(directory)
+    return MemoryLRUBackend(max_entries)
@@ -0,0 +1,90 @@
+import logging
+import time
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, Message
+
+from models.database import get_session_ctx
+from models.repository import get_mascot_file_id, save_mascot_file_id, delete_mascot_file_id
+from utils.render_cache import get_mascot_png, mascot_cache
+
+logger = logging.getLogger(__name__)
+
+# file_id уже загруженных картинок: пространство ключей конечно, поэтому словарь не растет бесконечно
+_file_ids = {}
+# Ключи, которых не было в БД, и до какого времени (time.monotonic) не искать их снова
+_missing = {}
+# Сколько секунд не перепроверять в БД отсутствующий file_id: его может сохранить другой процесс бота
+FILE_ID_MISS_TTL = 60.0
+
+# Части ответа Telegram о том, что file_id устарел или недействителен
+STALE_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file identifier", "file reference", "file_reference")
+
+
+def _is_stale_file_id(error):
+    text = str(error).lower()
+    return any(marker in text for marker in STALE_FILE_ID_ERRORS)
+
+
+async def _get_file_id(key):
+    file_id = _file_ids.get(key)
+    if file_id is not None or _missing.get(key, 0.0) > time.monotonic():
+        return file_id
+    async with await get_session_ctx() as session:
+        file_id = await get_mascot_file_id(session, mascot_cache.version, key)
+    if file_id is not None:
+        _file_ids[key] = file_id
+        _missing.pop(key, None)
+    else:
+        _missing[key] = time.monotonic() + FILE_ID_MISS_TTL
+    return file_id
+
+
+async def _remember_file_id(key, file_id):
+    _file_ids[key] = file_id
+    _missing.pop(key, None)
+    try:
+        async with await get_session_ctx() as session:
+            await save_mascot_file_id(session, mascot_cache.version, key, file_id)
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить file_id маскота: {e}")
+
+
+async def _forget_file_id(key):
+    _file_ids.pop(key, None)
+    try:
+        async with await get_session_ctx() as session:
+            await delete_mascot_file_id(session, mascot_cache.version, key)
+    except Exception as e:
+        logger.warning(f"Не удалось удалить устаревший file_id маскота: {e}")
+
+
+async def prepare_mascot_photo(key):
+    """Возвращает file_id, если картинка уже есть в Telegram, иначе PNG для загрузки"""
+    file_id = await _get_file_id(key)
+    if file_id is not None:
+        return file_id
+    return await get_mascot_png(key)
+
+
+async def answer_mascot_photo(message: Message, key, photo=None, **kwargs):
+    """Отправляет картинку маскота, по возможности ссылаясь на file_id вместо загрузки PNG"""
+    if photo is None:
+        photo = await prepare_mascot_photo(key)
+
+    if isinstance(photo, str):
+        try:
+            return await message.answer_photo(photo=photo, **kwargs)
+        except TelegramBadRequest as e:
+            # Остальные ошибки (подпись, клавиатура, чат) повторная загрузка не исправит
+            if not _is_stale_file_id(e):
+                raise
+            # file_id устарел или недействителен: забываем его и загружаем картинку заново
+            logger.warning(f"file_id маскота не принят Telegram, загружаем PNG: {e}")
+            await _forget_file_id(key)
+            photo = await get_mascot_png(key)
+
+    sent = await message.answer_photo(photo=BufferedInputFile(photo, filename="mascot.png"), **kwargs)
+    if sent.photo:
+        await _remember_file_id(key, sent.photo[-1].file_id)
+    return sent
@@ -0,0 +1,141 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Окно, за которое считается бюджет запросов к модели
+BUDGET_WINDOW = 3600
+
+
+class RecipePool:
+    """Ограниченный пул заранее сгенерированных рецептов, который фоново пополняется"""
+
+    def __init__(self, generate, size=10, refill_interval=20.0, hourly_budget=60, max_serves=3, max_users=10000):
+        self.generate = generate
+        self.size = size
+        self.refill_interval = refill_interval
+        self.hourly_budget = hourly_budget
+        self.max_serves = max_serves
+        self.max_users = max_users
+
+        self._recipes = deque()  # [id, текст, сколько раз выдан]
+        self._ids = itertools.count(1)
+        # user_id -> id последнего выданного рецепта; помним max_users недавних пользователей
+        self._last_served = OrderedDict()
+        self._calls = deque()  # Время обращений к модели за последний час
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        # Метрики
+        self._generated = 0
+        self._served = 0
+        self._misses = 0
+        self._failures = 0
+
+    def start(self):
+        """Запускает фоновое пополнение пула"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._producer())
+            logger.info(f"Пул рецептов запущен: размер {self.size}, бюджет {self.hourly_budget} запросов в час")
+
+    def shutdown(self):
+        """Останавливает пополнение пула"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _budget_left(self):
+        now = time.monotonic()
+        while self._calls and now - self._calls[0] >= BUDGET_WINDOW:
+            self._calls.popleft()
+        return self.hourly_budget - len(self._calls)
+
+    def record_call(self):
+        """Учитывает обращение к модели в бюджете, в том числе запрос в обход пула"""
+        self._calls.append(time.monotonic())
+
+    async def _producer(self):
+        while True:
+            if len(self._recipes) >= self.size or self._budget_left() <= 0:
+                # Пул полон или бюджет исчерпан: ждем выдачи рецепта или освобождения бюджета
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.refill_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.record_call()
+            try:
+                recipe = await self.generate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failures += 1
+                logger.error(f"Не удалось сгенерировать рецепт для пула: {e}")
+            else:
+                self.add(recipe)
+                self._generated += 1
+
+            # Пополняем не быстрее, чем раз в refill_interval секунд
+            await asyncio.sleep(self.refill_interval)
+
+    def _remember(self, user_id, recipe_id):
+        self._last_served[user_id] = recipe_id
+        self._last_served.move_to_end(user_id)
+        while len(self._last_served) > self.max_users:
+            # Давно не заходивший пользователь может снова получить тот же рецепт - это не страшно
+            self._last_served.popitem(last=False)
+
+    def add(self, recipe, served_to=None):
+        """Кладет рецепт в пул; served_to - пользователь, который его уже получил"""
+        for entry in self._recipes:
+            if entry[1] == recipe:
+                # Тот же рецепт уже в пуле (например, общий ответ на одновременные запросы)
+                if served_to is not None:
+                    self._remember(served_to, entry[0])
+                    entry[2] += 1
+                return
+
+        recipe_id = next(self._ids)
+        if served_to is not None:
+            self._remember(served_to, recipe_id)
+        if len(self._recipes) < self.size:
+            self._recipes.append([recipe_id, recipe, 0 if served_to is None else 1])
+
+    def take(self, user_id):
+        """Выдает рецепт из пула, но не тот же, что пользователь получил в прошлый раз; None, если выдать нечего"""
+        last_id = self._last_served.get(user_id)
+        for entry in self._recipes:
+            if entry[0] != last_id:
+                break
+        else:
+            self._misses += 1
+            return None
+
+        recipe_id, recipe, serves = entry
+        self._recipes.remove(entry)
+        entry[2] = serves + 1
+        if entry[2] < self.max_serves:
+            # Выданный рецепт уходит в конец очереди, свежие достаются первыми
+            self._recipes.append(entry)
+
+        self._remember(user_id, recipe_id)
+        self._served += 1
+        self._wakeup.set()
+        return recipe
+
+    def get_stats(self):
+        """Возвращает метрики пула"""
+        return {
+            "size": len(self._recipes),
+            "capacity": self.size,
+            "budget_left": self._budget_left(),
+            "generated": self._generated,
+            "served": self._served,
+            "misses": self._misses,
+            "failures": self._failures,
+        }
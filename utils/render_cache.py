@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+from config import (
+    RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, RENDER_WARMUP_COUNT, MASCOT_RENDER_BACKEND,
+    THUMBNAIL_CACHE_MAX_BYTES, COLLECTION_SHEET_CACHE_MAX_BYTES, COLLECTION_THUMBNAIL_SIZE,
+    configure_logging
+)
+from models.traits import decode_key
+from utils.generate_blin import mascot_key_probabilities
+from utils.svg_template import mascot_template, render_mascot_svg
+from utils.render_pool import render_service, svg_to_png, RenderBusyError
+from utils.layer_renderer import render_mascot_layers
+from utils.sprite_sheet import compose_grid, make_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Масштаб, с которым маскот отправляется пользователю
+MASCOT_RENDER_SCALE = 2.0
+
+
+class RenderCache:
+    """Двухуровневый кэш PNG: LRU в памяти с лимитом по байтам и каталог на диске (без каталога - только память)"""
+
+    def __init__(self, directory, max_bytes, version=""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Версия входит в адрес файла, поэтому смена шаблона, масштаба или рендерера не отдаст старые картинки
+        self.version = version
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        digest = hashlib.sha256("\x1f".join((self.version,) + tuple(key)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.png")
+
+    def _remember(self, key, png_data):
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        if len(png_data) > self.max_bytes:
+            return
+
+        self._memory[key] = png_data
+        self._memory_bytes += len(png_data)
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def get_from_memory(self, key):
+        """Возвращает PNG из памяти или None"""
+        png_data = self._memory.get(key)
+        if png_data is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        return png_data
+
+    def _read_file(self, path):
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, path, png_data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png_data)
+        os.replace(tmp_path, path)
+
+    async def get(self, key):
+        """Ищет PNG сначала в памяти, затем на диске"""
+        png_data = self.get_from_memory(key)
+        if png_data is not None:
+            return png_data
+
+        if self.directory is None:
+            self.misses += 1
+            return None
+
+        png_data = await asyncio.to_thread(self._read_file, self._path(key))
+        if png_data is None:
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        self._remember(key, png_data)
+        return png_data
+
+    def contains(self, key):
+        """Проверяет, есть ли PNG в кэше (в памяти или на диске)"""
+        if key in self._memory:
+            return True
+        return self.directory is not None and os.path.exists(self._path(key))
+
+    async def put(self, key, png_data):
+        """Сохраняет PNG в память и на диск"""
+        self._remember(key, png_data)
+        if self.directory is None:
+            return
+        try:
+            await asyncio.to_thread(self._write_file, self._path(key), png_data)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить PNG в дисковый кэш: {e}")
+
+    def get_stats(self):
+        """Возвращает метрики кэша"""
+        return {
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+# Кэш отрисованных маскотов
+mascot_cache = RenderCache(
+    RENDER_CACHE_DIR,
+    RENDER_CACHE_MAX_BYTES,
+    version=f"{mascot_template.digest}:{MASCOT_RENDER_SCALE}:{MASCOT_RENDER_BACKEND}"
+)
+
+# Миниатюры маскотов для листов коллекции
+thumbnail_cache = RenderCache(
+    os.path.join(RENDER_CACHE_DIR, "thumbnails"),
+    THUMBNAIL_CACHE_MAX_BYTES,
+    version=f"{mascot_template.digest}:{MASCOT_RENDER_SCALE}:{MASCOT_RENDER_BACKEND}:{COLLECTION_THUMBNAIL_SIZE}"
+)
+
+# Готовые листы коллекций по (пользователь, страница, версия коллекции); только в памяти
+collection_sheet_cache = RenderCache(None, COLLECTION_SHEET_CACHE_MAX_BYTES)
+
+# Рендеры, которые уже выполняются: одинаковые промахи ждут один и тот же рендер
+_rendering = {}
+
+
+async def gather_limited(coroutines, limit):
+    """Выполняет корутины не более чем по limit одновременно, сохраняя порядок результатов"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+
+async def _render_and_store(key):
+    try:
+        if MASCOT_RENDER_BACKEND == "layers":
+            png_data = await render_service.submit(render_mascot_layers, key, MASCOT_RENDER_SCALE)
+        else:
+            svg_content = render_mascot_svg(key)
+            png_data = await render_service.submit(svg_to_png, svg_content, MASCOT_RENDER_SCALE)
+        await mascot_cache.put(key, png_data)
+        return png_data
+    finally:
+        _rendering.pop(key, None)
+
+
+async def get_mascot_png(key):
+    """Возвращает PNG маскота по ключу изображения, рендеря его только при промахе кэша"""
+    png_data = mascot_cache.get_from_memory(key)
+    if png_data is not None:
+        return png_data
+
+    png_data = await mascot_cache.get(key)
+    if png_data is not None:
+        return png_data
+
+    task = _rendering.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render_and_store(key))
+        _rendering[key] = task
+    return await asyncio.shield(task)
+
+
+async def _thumbnail_and_store(key):
+    try:
+        png_data = await get_mascot_png(key)
+        thumbnail_png = await render_service.submit(make_thumbnail, png_data, COLLECTION_THUMBNAIL_SIZE)
+        await thumbnail_cache.put(key, thumbnail_png)
+        return thumbnail_png
+    finally:
+        _rendering.pop(("thumbnail", key), None)
+
+
+async def get_mascot_thumbnail(key):
+    """Возвращает миниатюру маскота, уменьшая полную картинку только при промахе кэша"""
+    thumbnail_png = await thumbnail_cache.get(key)
+    if thumbnail_png is not None:
+        return thumbnail_png
+
+    task = _rendering.get(("thumbnail", key))
+    if task is None:
+        task = asyncio.ensure_future(_thumbnail_and_store(key))
+        _rendering[("thumbnail", key)] = task
+    return await asyncio.shield(task)
+
+
+async def get_collection_sheet(user_id, page, version, codes, columns, view=""):
+    """Возвращает лист коллекции; при промахе кэша собирает лист из ключей страницы одним проходом.
+
+    codes - коды шапки и цветов маскотов страницы из БД: в ключи изображений они переводятся
+    только при промахе. view отличает страницы с разными фильтрами коллекции.
+    """
+    cache_key = (str(user_id), f"{view}-{page}" if view else str(page), str(version))
+    sheet_png = collection_sheet_cache.get_from_memory(cache_key)
+    if sheet_png is not None:
+        return sheet_png
+
+    keys = [decode_key(mascot_codes) for mascot_codes in codes]
+    unique_keys = list(dict.fromkeys(keys))
+    # Одна страница не должна сама переполнить очередь рендеринга
+    thumbnails = dict(zip(unique_keys, await gather_limited(
+        (get_mascot_thumbnail(key) for key in unique_keys), render_service.workers
+    )))
+    sheet_png = await render_service.submit(
+        compose_grid, [thumbnails[key] for key in keys], columns, COLLECTION_THUMBNAIL_SIZE, 4
+    )
+    await collection_sheet_cache.put(cache_key, sheet_png)
+    return sheet_png
+
+
+async def warm_up(count=RENDER_WARMUP_COUNT):
+    """Заранее рендерит самые вероятные комбинации маскотов"""
+    probabilities = mascot_key_probabilities()
+    keys = sorted(probabilities, key=probabilities.get, reverse=True)[:count]
+    missing = [key for key in keys if not mascot_cache.contains(key)]
+    if not missing:
+        logger.info(f"Прогрев кэша маскотов: все {len(keys)} комбинаций уже отрисованы")
+        return
+
+    logger.info(f"Прогрев кэша маскотов: рендерим {len(missing)} из {len(keys)} комбинаций")
+
+    # Не занимаем больше воркеров, чем есть, чтобы пользователи не упирались в переполненную очередь
+    semaphore = asyncio.Semaphore(render_service.workers)
+
+    async def render(key):
+        async with semaphore:
+            while True:
+                try:
+                    await get_mascot_png(key)
+                    return
+                except RenderBusyError:
+                    await asyncio.sleep(1)
+
+    results = await asyncio.gather(*(render(key) for key in missing), return_exceptions=True)
+    failed = sum(isinstance(result, Exception) for result in results)
+    logger.info(f"Прогрев кэша маскотов завершен, ошибок: {failed}")
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Прогрев кэша изображений маскотов")
+    parser.add_argument("--count", type=int, default=RENDER_WARMUP_COUNT,
+                        help="Сколько самых вероятных комбинаций отрисовать")
+    args = parser.parse_args()
+
+    render_service.start()
+    try:
+        await warm_up(args.count)
+    finally:
+        render_service.shutdown()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(_main())
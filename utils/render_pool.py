@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cairosvg
+
+from config import RENDER_MODE, RENDER_WORKERS, RENDER_QUEUE_SIZE, RENDER_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class RenderBusyError(Exception):
+    """Очередь рендеринга переполнена"""
+
+
+class RenderTimeoutError(Exception):
+    """Рендеринг не уложился в отведённое время"""
+
+
+def svg_to_png(svg_content, scale=2.0):
+    """Растеризует SVG в PNG"""
+    return cairosvg.svg2png(bytestring=svg_content, scale=scale)
+
+
+def _timed_call(func, *args):
+    """Выполняет задачу в воркере и замеряет время её выполнения"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class RenderService:
+    """Пул рендеринга с ограниченной очередью, таймаутами и метриками"""
+
+    def __init__(self, mode="process", workers=2, queue_size=16, timeout=10.0):
+        self.mode = mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self._executor = None
+        self._pending = 0
+
+        # Метрики
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._render_time_total = 0.0
+        self._render_time_max = 0.0
+
+    def start(self):
+        """Создает пул воркеров"""
+        if self._executor is not None:
+            return
+
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        else:
+            # spawn, чтобы не форкать процесс с работающим event loop и потоками
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        logger.info(f"Пул рендеринга запущен: режим {self.mode}, воркеров {self.workers}, очередь {self.queue_size}")
+
+    def shutdown(self):
+        """Останавливает пул, отменяя задачи из очереди"""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    @property
+    def queue_depth(self):
+        """Количество задач, ожидающих свободного воркера"""
+        return max(0, self._pending - self.workers)
+
+    def _release(self):
+        self._pending -= 1
+
+    async def submit(self, func, *args):
+        """Выполняет func(*args) в пуле; при переполнении очереди сразу отказывает"""
+        if self._pending >= self.workers + self.queue_size:
+            self._rejected += 1
+            logger.warning(f"Очередь рендеринга переполнена ({self.queue_depth}/{self.queue_size}), задача отклонена")
+            raise RenderBusyError("Очередь рендеринга переполнена")
+
+        self.start()
+        loop = asyncio.get_running_loop()
+
+        # Слот освобождается, только когда воркер действительно закончил задачу,
+        # даже если ожидающий её обработчик уже отвалился по таймауту
+        self._pending += 1
+        queued_at = time.perf_counter()
+        try:
+            job = self._executor.submit(_timed_call, func, *args)
+        except Exception:
+            self._pending -= 1
+            raise
+
+        def on_done(_):
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                # Event loop уже закрыт при остановке бота
+                pass
+
+        job.add_done_callback(on_done)
+
+        try:
+            result, render_time = await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            job.cancel()
+            self._timeouts += 1
+            logger.warning(f"Рендеринг не уложился в {self.timeout} с, очередь: {self.queue_depth}")
+            raise RenderTimeoutError(f"Рендеринг не уложился в {self.timeout} с")
+
+        wait_time = time.perf_counter() - queued_at - render_time
+        self._completed += 1
+        self._render_time_total += render_time
+        self._render_time_max = max(self._render_time_max, render_time)
+
+        logger.info(
+            f"Рендеринг: {render_time * 1000:.1f} мс, ожидание в очереди: {max(wait_time, 0) * 1000:.1f} мс, "
+            f"очередь: {self.queue_depth}/{self.queue_size}"
+        )
+        return result
+
+    def get_stats(self):
+        """Возвращает метрики пула рендеринга"""
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "in_flight": min(self._pending, self.workers),
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "timeouts": self._timeouts,
+            "avg_render_ms": self._render_time_total / self._completed * 1000 if self._completed else 0.0,
+            "max_render_ms": self._render_time_max * 1000,
+        }
+
+
+# Общий пул рендеринга бота
+render_service = RenderService(
+    mode=RENDER_MODE,
+    workers=RENDER_WORKERS,
+    queue_size=RENDER_QUEUE_SIZE,
+    timeout=RENDER_TIMEOUT
+)
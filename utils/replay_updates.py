@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import aiohttp
+
+from config import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+
+def load_updates(path):
+    """Читает записанные обновления: JSON-массив, ответ getUpdates или по одному обновлению в строке"""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    if isinstance(data, list):
+        return data
+    return data["result"] if "result" in data else [data]
+
+
+async def replay(updates, url, secret, concurrency):
+    """Отправляет обновления на webhook и возвращает коды ответов и задержки"""
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    statuses = Counter()
+    latencies = []
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=update) as response:
+                        await response.read()
+                        statuses[response.status] += 1
+                except aiohttp.ClientError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(post(update) for update in updates))
+
+    return statuses, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка записанных обновлений Telegram на webhook бота")
+    parser.add_argument("path", help="Файл с обновлениями в JSON")
+    parser.add_argument("--url", default=f"http://localhost:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET, help="Секретный токен webhook")
+    parser.add_argument("--concurrency", type=int, default=10, help="Одновременных запросов")
+    parser.add_argument("--repeat", type=int, default=1, help="Сколько раз отправить каждое обновление")
+    args = parser.parse_args()
+
+    updates = load_updates(args.path) * args.repeat
+    started = time.perf_counter()
+    statuses, latencies = asyncio.run(replay(updates, args.url, args.secret, args.concurrency))
+    elapsed = time.perf_counter() - started
+
+    print(f"Отправлено обновлений: {len(updates)} за {elapsed:.2f} с ({len(updates) / elapsed:.1f} в секунду)")
+    print("Ответы: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+    if latencies:
+        print(
+            f"Время ответа: медиана {latencies[len(latencies) // 2] * 1000:.1f} мс, "
+            f"95% {latencies[int(len(latencies) * 0.95)] * 1000:.1f} мс, максимум {latencies[-1] * 1000:.1f} мс"
+        )
+
+
+if __name__ == "__main__":
+    main()
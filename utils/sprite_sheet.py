@@ -0,0 +1,40 @@
+import io
+
+from PIL import Image
+
+# Фон листа - тот же оранжевый, что задуман для карточки маскота
+SHEET_BACKGROUND = (0xFD, 0xBA, 0x74, 255)
+
+
+def compose_grid(images, columns=5, cell_size=(227, 240), padding=8, background=SHEET_BACKGROUND):
+    """Собирает PNG-картинки в одну сетку за один проход и возвращает PNG листа"""
+    rows = max(1, (len(images) + columns - 1) // columns)
+    cell_width, cell_height = cell_size
+    sheet = Image.new(
+        "RGBA",
+        (columns * cell_width + (columns + 1) * padding, rows * cell_height + (rows + 1) * padding),
+        background
+    )
+
+    for index, png_data in enumerate(images):
+        image = Image.open(io.BytesIO(png_data)).convert("RGBA")
+        image.thumbnail(cell_size)
+
+        row, column = divmod(index, columns)
+        x = padding + column * (cell_width + padding) + (cell_width - image.width) // 2
+        y = padding + row * (cell_height + padding) + (cell_height - image.height) // 2
+        sheet.alpha_composite(image, dest=(x, y))
+
+    buffer = io.BytesIO()
+    sheet.convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_thumbnail(png_data, size):
+    """Уменьшает PNG до миниатюры, сохраняя пропорции"""
+    image = Image.open(io.BytesIO(png_data)).convert("RGBA")
+    image.thumbnail(size)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -1,10 +1,196 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from config import STATE_BACKEND, STATE_REDIS_URL, STATE_TTL, STATE_MAX_BYTES, configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Как часто память процесса очищается от истекших состояний, секунд
+SWEEP_INTERVAL = 60
+
+
+def _size(key, value):
+    """Размер ключа и значения в байтах UTF-8, как их хранил бы Redis"""
+    return len(key.encode()) + len(value.encode())
+
+
+class MemoryStateBackend:
+    """Состояния в памяти процесса: истекают через ttl без обращений, при превышении лимита вытесняются давние"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+
+        self.expired = 0
+        self.evicted = 0
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= _size(key, value)
+
+    def _sweep(self, now):
+        self._last_sweep = now
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            self._drop(key)
+            self.expired += 1
+
+    async def get(self, key, ttl):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            self._drop(key)
+            self.expired += 1
+            return None
+        # Обращение продлевает жизнь состояния
+        self._entries[key] = (now + ttl, value)
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        now = time.monotonic()
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (now + ttl, value)
+        self._bytes += _size(key, value)
+
+        if now - self._last_sweep >= SWEEP_INTERVAL:
+            self._sweep(now)
+        while self._bytes > self.max_bytes:
+            # Первым вытесняется состояние, к которому дольше всех не обращались
+            self._drop(next(iter(self._entries)))
+            self.evicted += 1
+
+    async def delete(self, key):
+        if key in self._entries:
+            self._drop(key)
+
+    async def close(self):
+        pass
+
+    def get_stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+class RedisStateBackend:
+    """Состояния в Redis: общие для нескольких процессов бота и переживают перезапуск"""
+
+    def __init__(self, url):
+        import redis.asyncio as redis
+
+        self.url = url
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key, ttl):
+        # GETEX продлевает срок жизни ключа тем же запросом, что и читает его
+        return await self._redis.getex(key, ex=ttl)
+
+    async def set(self, key, value, ttl):
+        await self._redis.set(key, value, ex=ttl)
+
+    async def delete(self, key):
+        await self._redis.delete(key)
+
+    async def close(self):
+        await self._redis.aclose()
+
+    def get_stats(self):
+        return {"url": self.url}
+
+
+def create_backend(kind=STATE_BACKEND):
+    """Создает хранилище состояний по названию: memory или redis"""
+    if kind == "redis":
+        return RedisStateBackend(STATE_REDIS_URL)
+    return MemoryStateBackend(STATE_MAX_BYTES)
+
+
+class StateStore:
+    """Состояния пользователей одного вида; значения хранятся в JSON под ключом namespace:user_id"""
+
+    def __init__(self, namespace, backend, ttl=STATE_TTL):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+
+    def _key(self, user_id):
+        return f"{self.namespace}:{user_id}"
+
+    async def get(self, user_id, default=None):
+        """Возвращает состояние пользователя или default"""
+        value = await self.backend.get(self._key(user_id), self.ttl)
+        return default if value is None else json.loads(value)
+
+    async def set(self, user_id, value):
+        """Сохраняет состояние пользователя; значение должно сериализоваться в JSON"""
+        await self.backend.set(self._key(user_id), json.dumps(value, ensure_ascii=False), self.ttl)
+
+    async def delete(self, user_id):
+        """Удаляет состояние пользователя"""
+        await self.backend.delete(self._key(user_id))
+
+    async def contains(self, user_id):
+        """Проверяет, есть ли у пользователя состояние"""
+        return await self.get(user_id) is not None
+
+
+# Общее хранилище всех состояний
+state_backend = create_backend()
+
 # Хранилища состояний пользователей
-user_sessions = {}  # История сообщений
-psychologist_active = {}  # Статус режима ассистента
-professions = {}  # Выбранная профессия
-lectures = {}  # Выбранная лекция
-current_lecture = {}  # Текущая лекция
-course_progress = {}  # Прогресс курса
-test_state = {}  # Состояние теста
-test_answers = {}  # Ответы теста
-user_mascots = {}  # Коллекция маскотов пользователей
\ No newline at end of file
+user_sessions = StateStore("user_sessions", state_backend)  # История сообщений
+conversation_summaries = StateStore("conversation_summaries", state_backend)  # Заметки о ранней части диалога с ассистентом
+psychologist_active = StateStore("psychologist_active", state_backend)  # Статус режима ассистента
+professions = StateStore("professions", state_backend)  # Выбранная профессия
+lectures = StateStore("lectures", state_backend)  # Выбранная лекция
+current_lecture = StateStore("current_lecture", state_backend)  # Текущая лекция
+course_progress = StateStore("course_progress", state_backend)  # Прогресс курса
+test_state = StateStore("test_state", state_backend)  # Состояние теста
+test_answers = StateStore("test_answers", state_backend)  # Ответы теста
+user_mascots = StateStore("user_mascots", state_backend)  # Коллекция маскотов пользователей
+
+
+def _expect(condition, error):
+    if not condition:
+        raise SystemExit(error)
+
+
+async def _check():
+    """Проверяет хранилище: запись, чтение, продление, удаление и истечение состояния"""
+    store = StateStore("state_check", state_backend, ttl=3)
+    value = {"history": [{"role": "user", "text": "Привет"}], "step": 1}
+
+    await store.set(0, value)
+    _expect(await store.get(0) == value, "Прочитано не то, что записано")
+
+    await asyncio.sleep(2)
+    _expect(await store.get(0) == value, "Состояние истекло раньше срока")
+    await asyncio.sleep(2)
+    _expect(await store.get(0) == value, "Чтение не продлило жизнь состояния")
+
+    await store.delete(0)
+    _expect(await store.get(0, "нет") == "нет", "Состояние не удалилось")
+
+    await store.set(0, value)
+    await asyncio.sleep(3.5)
+    _expect(await store.get(0) is None, "Состояние не истекло")
+
+    print(f"Хранилище {type(state_backend).__name__} работает: {state_backend.get_stats()}")
+    await state_backend.close()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(_check())
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from config import ASSISTANT_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина текста одного сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+PLACEHOLDER_TEXT = "✍️ Думаю над ответом..."
+TYPING_SUFFIX = " ▌"
+# Сколько секунд итоговая правка может ждать снятия ограничения Telegram, прежде чем уйти новым сообщением
+MAX_FINAL_EDIT_DELAY = 5.0
+
+
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Делит длинный текст на части, которые помещаются в одно сообщение, по возможности по переносам строк"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    parts.append(text)
+    return parts
+
+
+class StreamMetrics:
+    """Время до первого видимого текста у потоковых ответов"""
+
+    def __init__(self):
+        self._streamed = 0
+        self._fallbacks = 0
+        self._first_text_total = 0.0
+        self._first_text_max = 0.0
+
+    def record_first_text(self, seconds):
+        self._streamed += 1
+        self._first_text_total += seconds
+        self._first_text_max = max(self._first_text_max, seconds)
+
+    def record_fallback(self):
+        self._fallbacks += 1
+
+    def get_stats(self):
+        """Возвращает метрики потоковых ответов"""
+        return {
+            "streamed": self._streamed,
+            "fallbacks": self._fallbacks,
+            "avg_first_text_s": self._first_text_total / self._streamed if self._streamed else 0.0,
+            "max_first_text_s": self._first_text_max,
+        }
+
+
+stream_metrics = StreamMetrics()
+
+
+class ProgressiveReply:
+    """Сообщение, которое правится по мере генерации ответа, не чаще раза в interval секунд"""
+
+    def __init__(self, message, interval=ASSISTANT_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+
+        self._sent = None
+        self._shown_text = PLACEHOLDER_TEXT
+        self._next_edit_at = 0.0
+
+    async def start(self):
+        """Отправляет сообщение-заглушку"""
+        self._sent = await self.message.answer(PLACEHOLDER_TEXT)
+
+    async def _edit(self, text):
+        """Правит сообщение; возвращает True, если текст на экране обновился"""
+        try:
+            await self._sent.edit_text(text)
+        except TelegramRetryAfter as e:
+            # Telegram ограничил частоту правок: пропускаем промежуточные версии
+            self._next_edit_at = time.monotonic() + e.retry_after
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        self._shown_text = text
+        return True
+
+    async def _wait_and_edit(self, delay, text):
+        await asyncio.sleep(max(delay, 0))
+        return await self._edit(text)
+
+    async def update(self, text):
+        """Показывает промежуточный текст, если с прошлой правки прошло достаточно времени"""
+        now = time.monotonic()
+        preview = split_message(text)[0]
+        if not preview.strip() or preview == self._shown_text or now < self._next_edit_at:
+            return False
+
+        if len(preview) + len(TYPING_SUFFIX) <= TELEGRAM_MESSAGE_LIMIT:
+            preview += TYPING_SUFFIX
+        self._next_edit_at = now + self.interval
+        return await self._edit(preview)
+
+    async def finish(self, text):
+        """Показывает итоговый текст; то, что не поместилось, досылает отдельными сообщениями"""
+        first, *rest = split_message(text)
+        if first != self._shown_text and not await self._edit(first):
+            # Telegram ограничил частоту правок: итог дожидается разрешения, а не теряется
+            delay = self._next_edit_at - time.monotonic()
+            if delay > MAX_FINAL_EDIT_DELAY or not await self._wait_and_edit(delay, first):
+                await self.message.answer(first)
+        for part in rest:
+            await self.message.answer(part)
+
+
+async def answer_streamed(message, chunks, fallback):
+    """Отвечает на сообщение, показывая ответ модели по мере генерации.
+
+    chunks - асинхронный итератор накопленного текста ответа, fallback - корутина-функция,
+    возвращающая ответ целиком, если потоковая генерация недоступна. Возвращает показанный
+    текст и признак того, что поток дошел до конца: прерванный ответ и ответ fallback его не имеют.
+    """
+    started = time.perf_counter()
+    reply = ProgressiveReply(message)
+    await reply.start()
+
+    text = ""
+    completed = False
+    first_text_at = None
+    try:
+        async with aclosing(chunks) as stream:
+            async for text in stream:
+                if await reply.update(text) and first_text_at is None:
+                    first_text_at = time.perf_counter() - started
+                    stream_metrics.record_first_text(first_text_at)
+                    logger.info(f"Первый текст ответа показан через {first_text_at:.2f} с")
+        completed = bool(text.strip())
+    except Exception as e:
+        logger.warning(f"Потоковый ответ прерван: {e}")
+
+    if not text.strip():
+        # Потоковая генерация не дала текста: получаем ответ обычным запросом
+        stream_metrics.record_fallback()
+        text = await fallback()
+
+    await reply.finish(text)
+    if first_text_at is None:
+        # Ответ пришел одним куском (или через fallback) - он же и первый видимый текст
+        first_text_at = time.perf_counter() - started
+        stream_metrics.record_first_text(first_text_at)
+        logger.info(f"Ответ показан целиком через {first_text_at:.2f} с")
+    return text, completed
@@ -0,0 +1,69 @@
+import hashlib
+import re
+
+from config import MASCOT_SVG_TEMPLATE_PATH
+from utils.generate_blin import (
+    load_svg, build_hat_group, HAT_BY_NAME, HAT_COLORS, TEMPLATE_HAT_PATTERN
+)
+
+# Места шаблона, которые меняются от маскота к маскоту
+_SLOT_PATTERN = re.compile(
+    r'(?<=<stop offset="1" stop-color=")(?P<body>#E39D3A)(?="/>)'
+    r'|(?<=stroke=")(?P<stroke>#8A5C1E)(?=")'
+    rf'|(?P<hat>{TEMPLATE_HAT_PATTERN.pattern})'
+)
+
+
+class CompiledSvgTemplate:
+    """SVG-шаблон, один раз разобранный на статичные куски и именованные слоты"""
+
+    def __init__(self, svg_content):
+        # Фон вставляется сразу после открывающего тега <svg>
+        position = svg_content.index(">", svg_content.index("<svg")) + 1
+        self._parts = [svg_content[:position], None]
+        self._slots = [(1, "background")]
+
+        for match in _SLOT_PATTERN.finditer(svg_content, position):
+            self._parts.append(svg_content[position:match.start()])
+            self._slots.append((len(self._parts), match.lastgroup))
+            self._parts.append(None)
+            position = match.end()
+        self._parts.append(svg_content[position:])
+
+        self.slot_names = {name for _, name in self._slots}
+        self.digest = hashlib.sha256(svg_content.encode("utf-8")).hexdigest()[:12]
+
+    def render(self, **values):
+        """Заполняет слоты значениями и склеивает документ"""
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            parts[index] = values[name]
+        return "".join(parts)
+
+
+# Шаблон маскота, разобранный при импорте
+mascot_template = CompiledSvgTemplate(load_svg(MASCOT_SVG_TEMPLATE_PATH))
+
+# Готовые группы шапок для каждого варианта и цвета
+HAT_FRAGMENTS = {
+    (hat_name, hat_color): build_hat_group(hat_variant, hat_color)
+    for hat_name, hat_variant in HAT_BY_NAME.items()
+    for colors in HAT_COLORS[hat_name].values()
+    for hat_color in colors
+}
+
+
+def render_mascot_svg(key, background=""):
+    """Собирает SVG маскота по ключу изображения из скомпилированного шаблона"""
+    hat_name, hat_color, body_color, stroke_color = key
+
+    hat_fragment = HAT_FRAGMENTS.get((hat_name, hat_color))
+    if hat_fragment is None:
+        hat_fragment = build_hat_group(HAT_BY_NAME[hat_name], hat_color)
+
+    return mascot_template.render(
+        background=background,
+        body=body_color,
+        stroke=stroke_color,
+        hat=hat_fragment
+    )
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+
+from config import MASCOT_WRITE_MODE, WRITE_BUFFER_FLUSH_INTERVAL, WRITE_BUFFER_BATCH_SIZE, WRITE_BUFFER_MAX_SIZE
+from models.database import get_session_ctx
+from models.repository import write_mascots
+
+logger = logging.getLogger(__name__)
+
+# Паузы между повторами записи пачки, если БД недоступна, секунд; после последней пачка не записывается
+RETRY_DELAYS = (0.1, 0.5, 1, 2, 5)
+# Сколько раз повторять запись при остановке, прежде чем сдаться
+SHUTDOWN_ATTEMPTS = 3
+# Ошибки Postgres, после которых та же пачка может записаться: сбой сериализации и взаимоблокировка
+TRANSIENT_SQLSTATES = ("40001", "40P01")
+
+
+def is_transient_error(error):
+    """Можно ли повторить запись после этой ошибки: БД недоступна или транзакция проиграла гонку"""
+    if isinstance(error, (OSError, PoolTimeoutError, OperationalError)):
+        return True
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or getattr(error.orig, "sqlstate", None) in TRANSIENT_SQLSTATES
+    return False
+
+
+class MascotWriteBuffer:
+    """Буфер бросков: копит маскотов в памяти и пишет их в БД пачками одной транзакцией.
+
+    Пачка уходит раз в flush_interval секунд или по накоплении batch_size маскотов; рейтинг
+    каждого пользователя пачки обновляется один раз. Если БД не успевает, буфер заполняется
+    до max_size бросков и submit ждет места. Запись повторяется только после временных ошибок
+    и не дольше RETRY_DELAYS; пачка, которую записать нельзя, отбрасывается с ошибкой в логе,
+    чтобы не задерживать следующие. При остановке буфер записывает все, что принял.
+    """
+
+    def __init__(self, flush_interval=0.05, batch_size=500, max_size=5000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_size = max_size
+
+        self._queue = None
+        self._task = None
+
+        # Метрики
+        self._flushes = 0
+        self._written = 0
+        self._failures = 0
+        self._lost = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        """Запускает фоновую запись"""
+        if self._task is None:
+            self._queue = asyncio.Queue(self.max_size)
+            self._task = asyncio.create_task(self._writer())
+            logger.info(
+                f"Буфер записи маскотов запущен: раз в {self.flush_interval * 1000:.0f} мс "
+                f"или по {self.batch_size} маскотов"
+            )
+
+    async def shutdown(self):
+        """Записывает все принятые броски и останавливает запись"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        # Метка конца встает в очередь после всех принятых бросков
+        await self._queue.put(None)
+        await task
+        logger.info(f"Буфер записи маскотов остановлен: {self.get_stats()}")
+
+    async def submit(self, user_id, mascots_data):
+        """Принимает броски пользователя; ждет, пока в буфере освободится место.
+
+        Возвращает future с id новых маскотов, который завершается после записи в БД.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((user_id, mascots_data, future))
+        return future
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await self._queue.get()
+            if entry is None:
+                break
+            batch = [entry]
+            rows = len(entry[1])
+
+            # Добираем пачку до batch_size маскотов, но ждем не дольше flush_interval
+            deadline = loop.time() + self.flush_interval
+            while rows < self.batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    entry = self._queue.get_nowait()
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+                rows += len(entry[1])
+
+            await self._flush(batch, stopping)
+
+    async def _flush(self, batch, stopping):
+        rolls = [(user_id, mascot_data) for user_id, mascots_data, _ in batch for mascot_data in mascots_data]
+        attempt = 0
+        while True:
+            try:
+                async with await get_session_ctx() as session:
+                    mascot_ids = await write_mascots(session, rolls)
+                    await session.commit()
+                break
+            except Exception as e:
+                self._failures += 1
+                attempt += 1
+                attempts = SHUTDOWN_ATTEMPTS if stopping else len(RETRY_DELAYS) + 1
+                if not is_transient_error(e) or attempt >= attempts:
+                    self._fail(batch, len(rolls), e)
+                    return
+                delay = RETRY_DELAYS[attempt - 1]
+                logger.warning(f"Не удалось записать пачку из {len(rolls)} маскотов, повтор через {delay} с: {e}")
+                await asyncio.sleep(delay)
+
+        self._flushes += 1
+        self._written += len(rolls)
+        # id пользователя выданы в порядке его бросков в пачке
+        offsets = {}
+        for user_id, mascots_data, future in batch:
+            start = offsets.get(user_id, 0)
+            offsets[user_id] = start + len(mascots_data)
+            if not future.done():
+                future.set_result(mascot_ids[user_id][start:start + len(mascots_data)])
+
+    def _fail(self, batch, rows, error):
+        self._lost += rows
+        logger.error(f"Пачка из {rows} маскотов не записана и отброшена: {error!r}")
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+                # store_mascots не ждет записи: ошибка уже в логе, и asyncio не должен
+                # жаловаться на исключение, которое никто не забрал
+                future.exception()
+
+    def get_stats(self):
+        """Возвращает метрики буфера"""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "flushes": self._flushes,
+            "written": self._written,
+            "failures": self._failures,
+            "lost": self._lost,
+            "average_batch": round(self._written / self._flushes, 1) if self._flushes else 0.0,
+        }
+
+
+mascot_writer = MascotWriteBuffer(WRITE_BUFFER_FLUSH_INTERVAL, WRITE_BUFFER_BATCH_SIZE, WRITE_BUFFER_MAX_SIZE)
+
+
+def start_mascot_writer():
+    """Запускает буфер, если маскоты пишутся в режиме buffered"""
+    if MASCOT_WRITE_MODE == "buffered":
+        mascot_writer.start()
+
+
+async def store_mascots(user_id, mascots_data, session=None):
+    """Сохраняет выпавших маскотов: через буфер, если он запущен, иначе сразу в session или своей сессии.
+
+    Переданную session фиксирует вызывающий (DbSessionMiddleware), свою - эта функция.
+    """
+    if mascot_writer.running:
+        await mascot_writer.submit(user_id, mascots_data)
+        return
+    rolls = [(user_id, mascot_data) for mascot_data in mascots_data]
+    if session is not None:
+        await write_mascots(session, rolls)
+        return
+    async with await get_session_ctx() as session:
+        await write_mascots(session, rolls)
+        await session.commit()